@@ -0,0 +1,469 @@
+"""Gateway de adquirência: autorização, captura e estorno de cartões
+
+O gateway padrão simula o adquirente (95% de aprovação). Definindo
+ACQUIRER_URL, as chamadas vão para um adquirente HTTP (ou para o
+acquirer_standin.py local) com conexões keep-alive reutilizadas, prazo
+por chamada, circuit breaker e requisições hedge em respostas lentas.
+
+authorize_async() é a mesma autorização para o modo ASGI: roda no loop
+asyncio (streams próprios, pool de conexões por loop), com o mesmo
+circuit breaker, sem ocupar uma thread enquanto espera o adquirente.
+"""
+import io
+import os
+import json
+import time
+import uuid
+import queue
+import random
+import asyncio
+import functools
+import threading
+import http.client
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from src.routes.tracing import propagation_headers
+
+
+class AcquirerError(Exception):
+    """Falha de comunicação com o adquirente"""
+
+
+class AcquirerTimeout(AcquirerError):
+    """Prazo da chamada ao adquirente excedido"""
+
+
+class CircuitOpenError(AcquirerError):
+    """Circuit breaker aberto: adquirente considerado indisponível"""
+
+
+class CircuitBreaker:
+    """Circuit breaker simples (fechado -> aberto -> meio-aberto)"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Indica se uma chamada pode ser feita agora"""
+        with self._lock:
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                # Deixa passar uma chamada de teste
+                self.state = 'half_open'
+                return True
+            # Em meio-aberto só a chamada de teste passa
+            return self.state == 'closed'
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = 'closed'
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class _DeadlineReader(io.RawIOBase):
+    """Leitura do socket com o tempo restante até o prazo a cada recv"""
+
+    def __init__(self, sock, deadline):
+        self.sock = sock
+        self.deadline = deadline
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError('Prazo do adquirente excedido')
+        self.sock.settimeout(remaining)
+        return self.sock.recv_into(buffer)
+
+
+class DeadlineResponse(http.client.HTTPResponse):
+    """Resposta cuja leitura inteira (status, cabeçalhos e corpo) respeita o prazo da chamada
+
+    O timeout do socket vale por operação: sem isso, uma resposta pingada
+    byte a byte passaria do prazo total.
+    """
+
+    def __init__(self, sock, debuglevel=0, method=None, url=None, deadline=None):
+        super().__init__(sock, debuglevel, method, url)
+        self.fp.close()
+        self.fp = io.BufferedReader(_DeadlineReader(sock, deadline))
+
+
+class ConnectionPool:
+    """Pool de conexões HTTP keep-alive para um host"""
+
+    def __init__(self, base_url, size=32):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.prefix = parts.path.rstrip('/')
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self, timeout):
+        """Retorna (conexão, reutilizada)"""
+        try:
+            conn = self._idle.get_nowait()
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        except queue.Empty:
+            connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            return connection_class(self.host, self.port, timeout=timeout), False
+
+    def release(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def discard(self, conn):
+        conn.close()
+
+
+class AsyncConnectionPool:
+    """Pool de conexões keep-alive (asyncio streams) para um host, por loop"""
+
+    def __init__(self, base_url, size=32):
+        parts = urlsplit(base_url)
+        self.ssl = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.ssl else 80)
+        self.prefix = parts.path.rstrip('/')
+        self.size = size
+        self._idle = []
+        self._loop = None
+
+    async def acquire(self):
+        """Retorna ((reader, writer), reutilizada)"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Conexões de outro loop (ex.: asyncio.run repetido) não servem aqui
+            self._idle = []
+            self._loop = loop
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return (reader, writer), True
+            writer.close()
+        return await asyncio.open_connection(self.host, self.port, ssl=self.ssl or None), False
+
+    def release(self, conn):
+        if len(self._idle) < self.size and asyncio.get_running_loop() is self._loop:
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+
+    def discard(self, conn):
+        conn[1].close()
+
+
+class SimulatedAcquirerGateway:
+    """Adquirente simulado (sandbox)"""
+
+    def __init__(self, approval_rate=0.95):
+        self.approval_rate = approval_rate
+
+    def authorize(self, payload, deadline=None):
+        if random.random() < self.approval_rate:
+            return {
+                'approved': True,
+                'authorization_code': f"AUTH_{uuid.uuid4().hex[:8].upper()}"
+            }
+        return {
+            'approved': False,
+            'decline_reason': 'Cartão recusado pelo banco emissor'
+        }
+
+    def capture(self, payload, deadline=None):
+        return {'approved': True}
+
+    def refund(self, payload, deadline=None):
+        return {'approved': True}
+
+    async def authorize_async(self, payload, deadline=None):
+        return self.authorize(payload, deadline)
+
+
+class HttpAcquirerGateway:
+    """Adquirente HTTP com pool de conexões, prazos, circuit breaker e hedge"""
+
+    def __init__(self, base_url, timeout=2.0, hedge_after=None, pool_size=32,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.pool = ConnectionPool(base_url, size=pool_size)
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.async_pool = AsyncConnectionPool(base_url, size=pool_size)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size * 2, thread_name_prefix='acquirer')
+
+    def authorize(self, payload, deadline=None):
+        return self._call('/authorize', payload, deadline)
+
+    def capture(self, payload, deadline=None):
+        return self._call('/capture', payload, deadline)
+
+    def refund(self, payload, deadline=None):
+        return self._call('/refund', payload, deadline)
+
+    async def authorize_async(self, payload, deadline=None):
+        """Autorização no loop asyncio: a espera pelo adquirente não ocupa thread"""
+        return await self._call_async('/authorize', payload, deadline)
+
+    def _call(self, path, payload, deadline=None):
+        if not self.breaker.allow():
+            raise CircuitOpenError('Adquirente indisponível (circuit breaker aberto)')
+
+        deadline = deadline or time.monotonic() + self.timeout
+        # A mesma chave de idempotência permite repetir a chamada com segurança
+        idempotency_key = payload.get('idempotency_key') or uuid.uuid4().hex
+        body = json.dumps(payload).encode('utf-8')
+        # Contexto do trace da requisição (as tentativas hedge rodam em outras threads)
+        headers = propagation_headers()
+
+        try:
+            if self.hedge_after is None:
+                result = self._post(path, body, idempotency_key, deadline, headers)
+            else:
+                result = self._hedged_post(path, body, idempotency_key, deadline, headers)
+        except AcquirerError:
+            self.breaker.record_failure()
+            raise
+        except Exception as e:
+            # Qualquer falha encerra a chamada de teste do meio-aberto
+            self.breaker.record_failure()
+            raise AcquirerError(f'Falha na chamada ao adquirente: {e}') from e
+
+        self.breaker.record_success()
+        return result
+
+    def _hedged_post(self, path, body, idempotency_key, deadline, headers=None):
+        """Dispara uma segunda requisição se a primeira demorar mais que hedge_after"""
+        first = self._executor.submit(self._post, path, body, idempotency_key, deadline, headers)
+        done, _ = wait([first], timeout=min(self.hedge_after, max(deadline - time.monotonic(), 0)))
+        if done:
+            return first.result()
+
+        second = self._executor.submit(self._post, path, body, idempotency_key, deadline, headers)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    return future.result()
+                except AcquirerError as e:
+                    error = e
+        raise error or AcquirerTimeout('Prazo do adquirente excedido')
+
+    def _post(self, path, body, idempotency_key, deadline, headers=None):
+        while True:
+            # Prazo restante recalculado a cada tentativa e a cada operação
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise AcquirerTimeout('Prazo do adquirente excedido')
+
+            conn, reused = self.pool.acquire(remaining)
+            conn.response_class = functools.partial(DeadlineResponse, deadline=deadline)
+            try:
+                conn.request('POST', self.pool.prefix + path, body=body, headers={
+                    'Content-Type': 'application/json',
+                    'Idempotency-Key': idempotency_key,
+                    'Connection': 'keep-alive',
+                    **(headers or {})
+                })
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except TimeoutError as e:
+                self.pool.discard(conn)
+                raise AcquirerTimeout('Prazo do adquirente excedido') from e
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                self.pool.discard(conn)
+                # Conexão ociosa fechada pelo servidor: tenta uma conexão nova
+                if not reused:
+                    raise AcquirerError(f'Falha na comunicação com o adquirente: {e}') from e
+            except (OSError, http.client.HTTPException) as e:
+                self.pool.discard(conn)
+                raise AcquirerError(f'Falha na comunicação com o adquirente: {e}') from e
+
+        if response.will_close:
+            self.pool.discard(conn)
+        else:
+            self.pool.release(conn)
+
+        return _parse_result(response.status, data)
+
+    async def _call_async(self, path, payload, deadline=None):
+        if not self.breaker.allow():
+            raise CircuitOpenError('Adquirente indisponível (circuit breaker aberto)')
+
+        deadline = deadline or time.monotonic() + self.timeout
+        idempotency_key = payload.get('idempotency_key') or uuid.uuid4().hex
+        request = self._request_bytes(path, json.dumps(payload).encode('utf-8'), idempotency_key,
+                                      propagation_headers())
+
+        try:
+            if self.hedge_after is None:
+                result = await self._await_deadline(self._post_async(request), deadline)
+            else:
+                result = await self._hedged_post_async(request, deadline)
+        except AcquirerError:
+            self.breaker.record_failure()
+            raise
+        except Exception as e:
+            self.breaker.record_failure()
+            raise AcquirerError(f'Falha na chamada ao adquirente: {e}') from e
+
+        self.breaker.record_success()
+        return result
+
+    @staticmethod
+    async def _await_deadline(coroutine, deadline):
+        """Prazo total da chamada (conexão, envio e resposta inteira)"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            coroutine.close()
+            raise AcquirerTimeout('Prazo do adquirente excedido')
+        try:
+            return await asyncio.wait_for(coroutine, remaining)
+        except asyncio.TimeoutError as e:
+            raise AcquirerTimeout('Prazo do adquirente excedido') from e
+
+    async def _hedged_post_async(self, request, deadline):
+        first = asyncio.ensure_future(self._await_deadline(self._post_async(request), deadline))
+        done, _ = await asyncio.wait([first], timeout=min(self.hedge_after, max(deadline - time.monotonic(), 0)))
+        if done:
+            return first.result()
+
+        second = asyncio.ensure_future(self._await_deadline(self._post_async(request), deadline))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        return future.result()
+                    except AcquirerError as e:
+                        error = e
+        finally:
+            for future in pending:
+                future.cancel()
+        raise error or AcquirerTimeout('Prazo do adquirente excedido')
+
+    def _request_bytes(self, path, body, idempotency_key, headers):
+        lines = [
+            f'POST {self.async_pool.prefix}{path} HTTP/1.1',
+            f'Host: {self.async_pool.host}:{self.async_pool.port}',
+            'Content-Type: application/json',
+            f'Content-Length: {len(body)}',
+            f'Idempotency-Key: {idempotency_key}',
+            'Connection: keep-alive'
+        ] + [f'{name}: {value}' for name, value in headers.items()]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+    async def _post_async(self, request):
+        while True:
+            conn, reused = await self.async_pool.acquire()
+            reader, writer = conn
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, headers = await _read_head(reader)
+                length = int(headers.get('content-length', 0))
+                data = await reader.readexactly(length) if length else b''
+                break
+            except asyncio.CancelledError:
+                # Prazo excedido ou hedge vencedor: a conexão fica em estado indefinido
+                self.async_pool.discard(conn)
+                raise
+            except (asyncio.IncompleteReadError, ConnectionResetError, BrokenPipeError) as e:
+                self.async_pool.discard(conn)
+                # Conexão ociosa fechada pelo servidor: tenta uma conexão nova
+                if not reused:
+                    raise AcquirerError(f'Falha na comunicação com o adquirente: {e}') from e
+            except (OSError, ValueError, asyncio.LimitOverrunError) as e:
+                self.async_pool.discard(conn)
+                raise AcquirerError(f'Falha na comunicação com o adquirente: {e}') from e
+
+        if headers.get('connection', '').lower() == 'close':
+            self.async_pool.discard(conn)
+        else:
+            self.async_pool.release(conn)
+        return _parse_result(status, data)
+
+
+async def _read_head(reader):
+    """(status, cabeçalhos em minúsculas) de uma resposta HTTP/1.1"""
+    status_line = await reader.readuntil(b'\r\n')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readuntil(b'\r\n')
+        if line == b'\r\n':
+            return status, headers
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+def _parse_result(status, data):
+    """Resultado do adquirente a partir do status HTTP e do corpo JSON"""
+    if not 200 <= status < 300:
+        raise AcquirerError(f'Adquirente retornou HTTP {status}')
+
+    try:
+        result = json.loads(data)
+    except ValueError as e:
+        raise AcquirerError('Resposta inválida do adquirente') from e
+    if not isinstance(result, dict) or 'approved' not in result:
+        raise AcquirerError('Resposta inválida do adquirente')
+    return result
+
+
+def create_acquirer_from_env():
+    """Cria o gateway a partir das variáveis de ambiente"""
+    base_url = os.environ.get('ACQUIRER_URL')
+    if not base_url:
+        return SimulatedAcquirerGateway()
+
+    hedge_after_ms = os.environ.get('ACQUIRER_HEDGE_AFTER_MS')
+    return HttpAcquirerGateway(
+        base_url,
+        timeout=float(os.environ.get('ACQUIRER_TIMEOUT_MS', '2000')) / 1000,
+        hedge_after=float(hedge_after_ms) / 1000 if hedge_after_ms else None,
+        pool_size=int(os.environ.get('ACQUIRER_POOL_SIZE', '32'))
+    )
+
+
+_acquirer = create_acquirer_from_env()
+
+
+def get_acquirer():
+    """Retorna o gateway de adquirência configurado"""
+    return _acquirer
+
+
+def set_acquirer(gateway):
+    """Substitui o gateway de adquirência (ex.: testes e benchmarks)"""
+    global _acquirer
+    _acquirer = gateway
@@ -0,0 +1,126 @@
+"""Adquirente HTTP local para desenvolvimento e benchmarks
+
+Uso: python acquirer_standin.py --port 8099 --latency-ms 20 --tail-ms 800 --tail-rate 0.01
+
+Endpoints: POST /authorize, /capture, /refund (JSON). Respostas repetidas
+com o mesmo Idempotency-Key devolvem o mesmo resultado.
+"""
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class AcquirerProfile:
+    """Perfil de latência e falhas do adquirente simulado"""
+
+    def __init__(self, latency_ms=20.0, jitter_ms=5.0, tail_ms=0.0, tail_rate=0.0,
+                 error_rate=0.0, decline_rate=0.05):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tail_ms = tail_ms
+        self.tail_rate = tail_rate
+        self.error_rate = error_rate
+        self.decline_rate = decline_rate
+
+    def delay(self):
+        """Latência sorteada para uma requisição, em segundos"""
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if self.tail_rate and random.random() < self.tail_rate:
+            delay += self.tail_ms
+        return max(delay, 0) / 1000
+
+
+class AcquirerHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        profile = self.server.profile
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+
+        time.sleep(profile.delay())
+
+        if random.random() < profile.error_rate:
+            self._send(500, {'error': 'internal_error'})
+            return
+
+        if not self.path.endswith(('/authorize', '/capture', '/refund')):
+            self._send(404, {'error': 'not_found'})
+            return
+
+        key = self.headers.get('Idempotency-Key')
+        # Consulta e gravação juntas: requisições hedge com a mesma chave veem o mesmo resultado
+        with self.server.lock:
+            result = self.server.responses.get(key) if key else None
+            if result is None:
+                result = self._result(profile, payload)
+                if key:
+                    self.server.responses[key] = result
+        self._send(200, result)
+
+    def _result(self, profile, payload):
+        if self.path.endswith('/authorize'):
+            if random.random() < profile.decline_rate:
+                return {'approved': False, 'decline_reason': 'Cartão recusado pelo banco emissor'}
+            return {'approved': True, 'authorization_code': f"AUTH_{uuid.uuid4().hex[:8].upper()}"}
+        return {'approved': True, 'reference': uuid.uuid4().hex[:12], 'amount': payload.get('amount')}
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AcquirerServer(ThreadingHTTPServer):
+    # Fila de conexões para rajadas de centenas de chamadas simultâneas (benchmarks)
+    request_queue_size = 1024
+
+
+def create_server(port=0, profile=None):
+    """Cria o servidor HTTP do adquirente local"""
+    server = AcquirerServer(('127.0.0.1', port), AcquirerHandler)
+    server.daemon_threads = True
+    server.profile = profile or AcquirerProfile()
+    server.responses = {}
+    server.lock = threading.Lock()
+    return server
+
+
+def start_standin(port=0, profile=None):
+    """Inicia o adquirente em uma thread e retorna o servidor"""
+    server = create_server(port, profile)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Adquirente HTTP local')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--jitter-ms', type=float, default=5.0)
+    parser.add_argument('--tail-ms', type=float, default=0.0)
+    parser.add_argument('--tail-rate', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--decline-rate', type=float, default=0.05)
+    args = parser.parse_args()
+
+    profile = AcquirerProfile(args.latency_ms, args.jitter_ms, args.tail_ms, args.tail_rate,
+                              args.error_rate, args.decline_rate)
+    server = create_server(args.port, profile)
+    print(f'Adquirente local em http://127.0.0.1:{args.port}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
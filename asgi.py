@@ -0,0 +1,92 @@
+"""Modo de execução ASGI da API Valora
+
+Uso (produção):
+    uvicorn src.asgi:asgi_app --host 0.0.0.0 --port 5000 --workers 4
+
+As mesmas rotas e formatos de resposta do main.py são servidos.
+
+Atendidas direto no loop asyncio, sem thread por requisição:
+    POST /api/v1/payment/create (cartão)  espera o adquirente com
+        authorize_async(); só as etapas síncronas curtas usam o pool
+        (payment_async.py)
+    GET /api/v1/payment/<id>/stream        SSE/long-poll (status_stream.py)
+
+As demais rotas Flask (inclusive as de autenticação, limitadas por CPU
+no bcrypt) continuam síncronas e passam pelo WsgiToAsgi do asgiref: cada
+requisição ocupa uma thread do início ao fim, com no máximo
+VALORA_ASGI_THREADS em andamento por processo (as seguintes aguardam no
+loop). Handlers `async def` do Flask também rodam nessa thread.
+"""
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+
+from src.routes.status_stream import STREAM_PATH, handle_stream
+from src.routes.payment_async import CREATE_PATH, handle_create_payment
+
+# Requisições síncronas (Flask) simultâneas por processo; também o tamanho
+# do pool das etapas síncronas das rotas nativas
+ASGI_THREADS = int(os.environ.get('VALORA_ASGI_THREADS', '256'))
+
+
+class ValoraASGI:
+    """Aplicação ASGI que encapsula o app Flask"""
+
+    def __init__(self, wsgi_application, threads=ASGI_THREADS):
+        self.wsgi_application = WsgiToAsgi(wsgi_application)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='valora-asgi')
+        self.slots = asyncio.Semaphore(threads)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if scope['type'] == 'http' and STREAM_PATH.match(scope['path']):
+                await handle_stream(scope, receive, send)
+            elif scope['type'] == 'http' and scope['path'] == CREATE_PATH:
+                await handle_create_payment(scope, receive, send, self.run_wsgi)
+            else:
+                await self.run_wsgi(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+    async def run_wsgi(self, scope, receive, send):
+        """App Flask com thread própria por requisição (o WsgiToAsgi padrão usa uma única thread)"""
+        async with self.slots, ThreadSensitiveContext():
+            await self.wsgi_application(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Etapas síncronas das rotas nativas (asyncio.to_thread) usam o pool
+                asyncio.get_running_loop().set_default_executor(self.executor)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(wsgi_application, threads=ASGI_THREADS):
+    """Cria a aplicação ASGI para um app Flask"""
+    return ValoraASGI(wsgi_application, threads=threads)
+
+
+def __getattr__(name):
+    # `src.asgi:asgi_app` é criado sob demanda para não importar o main.py
+    # (e o banco de dados) quando apenas create_asgi_app é usado
+    if name == 'asgi_app':
+        from src.main import app
+        globals()['asgi_app'] = create_asgi_app(app)
+        return globals()['asgi_app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,272 @@
+"""Trilha de auditoria (PCI): eventos de segurança e tentativas de login
+
+As threads de requisição apenas enfileiram o evento; uma thread de
+gravação esvazia a fila em lotes e anexa as linhas a segmentos NDJSON
+somente-anexação, rotacionados por tamanho (o nome leva o pid, então
+vários processos podem gravar no mesmo diretório). Com a fila cheia,
+quem emite espera até EMIT_TIMEOUT (backpressure); depois disso, ou com
+a trilha encerrada, o evento é descartado. Falhas de gravação são
+contadas em `write_errors` e a thread segue com um segmento novo.
+
+Descartes nunca são silenciosos: entram em `dropped`, geram um aviso no
+logger `valora.audit` (no máximo um a cada DROP_WARNING_INTERVAL) e a
+próxima gravação anexa à trilha um registro `audit_gap` com a quantidade
+perdida desde o último, para que a lacuna apareça na própria trilha.
+
+Variáveis: VALORA_AUDIT_DIR (ativa a trilha), VALORA_AUDIT_FLUSH_MS,
+VALORA_AUDIT_FSYNC (1 para fsync a cada lote).
+
+Uso: python audit.py query /var/log/valora/audit --type account_locked --user-id user_001 --since 2025-01-01
+"""
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import atexit
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+from src.routes.worker_pool import is_pool_worker
+
+DEFAULT_QUEUE_SIZE = 65536
+DEFAULT_FLUSH_INTERVAL = 0.2
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+MAX_BATCH = 4096
+EMIT_TIMEOUT = 1.0
+CLOSE_TIMEOUT = 5.0
+DROP_WARNING_INTERVAL = 10.0
+
+logger = logging.getLogger('valora.audit')
+
+_STOP = object()
+_encoder = json.JSONEncoder(ensure_ascii=False, default=str)
+
+
+class NullAuditLog:
+    """Trilha desativada"""
+
+    enabled = False
+
+    def emit(self, kind, event):
+        pass
+
+    def close(self):
+        pass
+
+
+class AuditLog:
+    """Gravação assíncrona e em lotes de eventos de auditoria"""
+
+    enabled = True
+
+    def __init__(self, directory, flush_interval=DEFAULT_FLUSH_INTERVAL, queue_size=DEFAULT_QUEUE_SIZE,
+                 segment_bytes=DEFAULT_SEGMENT_BYTES, fsync=False):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stats = {'written': 0, 'batches': 0, 'segments': 0, 'blocked': 0, 'dropped': 0,
+                      'write_errors': 0, 'last_error': None}
+        self._file = None
+        self._sequence = 0
+        self._closed = False
+        # Contadores alterados por várias threads; `_gap` = descartes ainda não registrados na trilha
+        self._stats_lock = threading.Lock()
+        self._gap = 0
+        self._last_warning = 0.0
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+
+    def emit(self, kind, event):
+        """Enfileira o evento (com a fila cheia espera até EMIT_TIMEOUT e depois descarta)"""
+        if self._closed:
+            self._dropped(1, 'trilha encerrada')
+            return
+        record = dict(event, kind=kind)
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self.stats['blocked'] += 1
+            try:
+                self.queue.put(record, timeout=EMIT_TIMEOUT)
+            except queue.Full:
+                self._dropped(1, 'fila cheia')
+
+    def _dropped(self, count, reason, carried=0):
+        """Conta eventos perdidos e avisa no log (com limite de frequência)
+
+        `carried` são descartes já contados cujo registro `audit_gap` também se perdeu.
+        """
+        now = time.monotonic()
+        with self._stats_lock:
+            self.stats['dropped'] += count
+            self._gap += count + carried
+            warn = now - self._last_warning >= DROP_WARNING_INTERVAL
+            if warn:
+                self._last_warning = now
+            total = self.stats['dropped']
+        if warn:
+            logger.warning('Trilha de auditoria descartou eventos (%s); %d descartados no total', reason, total)
+
+    def _take_gap(self):
+        """Registro `audit_gap` com os descartes desde o último (ou None)"""
+        with self._stats_lock:
+            gap, self._gap = self._gap, 0
+        if not gap:
+            return None
+        return {'kind': 'audit_gap', 'dropped': gap, 'pid': os.getpid(),
+                'timestamp': datetime.utcnow().isoformat()}
+
+    def _open_segment(self):
+        if self._file is not None:
+            file, self._file = self._file, None
+            file.close()
+        self._sequence += 1
+        name = f"audit-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self._sequence:06d}.ndjson"
+        # Segmentos nunca são reescritos: só anexação
+        self._file = open(os.path.join(self.directory, name), 'a', encoding='utf-8')
+        self.stats['segments'] += 1
+
+    def _run(self):
+        while True:
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            if _STOP in batch:
+                stop = True
+                batch = [record for record in batch if record is not _STOP]
+
+            gap = self._take_gap()
+            if gap is not None:
+                batch.insert(0, gap)
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    # Disco cheio, diretório removido...: conta, descarta o lote e segue
+                    with self._stats_lock:
+                        self.stats['write_errors'] += 1
+                        self.stats['last_error'] = str(e)
+                    if gap is None:
+                        self._dropped(len(batch), f'falha de gravação: {e}')
+                    else:
+                        self._dropped(len(batch) - 1, f'falha de gravação: {e}', gap['dropped'])
+                    self._discard_segment()
+            if stop:
+                self._discard_segment()
+                return
+
+    def _discard_segment(self):
+        """Fecha o segmento atual; o próximo lote abre um novo"""
+        file, self._file = self._file, None
+        if file is not None:
+            try:
+                file.close()
+            except OSError:
+                pass
+
+    def _write(self, batch):
+        if self._file is None:
+            self._open_segment()
+        encode = _encoder.encode
+        self._file.write(''.join([encode(record) + '\n' for record in batch]))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.stats['written'] += len(batch)
+        self.stats['batches'] += 1
+        if self._file.tell() >= self.segment_bytes:
+            self._open_segment()
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Grava o que está na fila e encerra a thread de gravação (espera no máximo `timeout`)"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+def open_audit_log_from_env():
+    """Trilha configurada em VALORA_AUDIT_DIR (ou desativada)"""
+    directory = os.environ.get('VALORA_AUDIT_DIR')
+    if not directory or is_pool_worker():
+        return NullAuditLog()
+    audit = AuditLog(
+        directory,
+        flush_interval=int(os.environ.get('VALORA_AUDIT_FLUSH_MS', DEFAULT_FLUSH_INTERVAL * 1000)) / 1000,
+        fsync=os.environ.get('VALORA_AUDIT_FSYNC') == '1'
+    )
+    # Eventos ainda na fila são gravados no encerramento do processo
+    atexit.register(audit.close)
+    return audit
+
+
+audit_log = open_audit_log_from_env()
+
+
+def query(directory, kind=None, event_type=None, user_id=None, email=None, since=None, until=None):
+    """Percorre os segmentos em ordem e gera os eventos que atendem aos filtros"""
+    for path in sorted(glob.glob(os.path.join(directory, 'audit-*.ndjson'))):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if kind and record.get('kind') != kind:
+                    continue
+                if event_type and record.get('type') != event_type:
+                    continue
+                if user_id and record.get('user_id') != user_id:
+                    continue
+                if email and record.get('email') != email:
+                    continue
+                timestamp = record.get('timestamp') or ''
+                if since and timestamp < since:
+                    continue
+                if until and timestamp >= until:
+                    continue
+                yield record
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Trilha de auditoria')
+    commands = parser.add_subparsers(dest='command', required=True)
+    search = commands.add_parser('query', help='Filtra eventos gravados (NDJSON na saída)')
+    search.add_argument('directory')
+    search.add_argument('--kind', choices=['security_event', 'login_attempt'])
+    search.add_argument('--type', dest='event_type')
+    search.add_argument('--user-id')
+    search.add_argument('--email')
+    search.add_argument('--since', help='Timestamp ISO (inclusive)')
+    search.add_argument('--until', help='Timestamp ISO (exclusivo)')
+    args = parser.parse_args()
+
+    for record in query(args.directory, args.kind, args.event_type, args.user_id, args.email,
+                        args.since, args.until):
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    main()
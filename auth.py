@@ -1,15 +1,28 @@
-from flask import Blueprint, request, jsonify, session
-from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
+from datetime import datetime, timedelta, timezone
 import uuid
 import hashlib
 import hmac
 import secrets
-import re
 import jwt
 import pyotp
 from functools import wraps
 import bcrypt
+import io
 import json
+import time
+from src.routes.risk import risk_store, record_login, login_risk_factors
+from src.routes.persistence import durable_store
+from src.routes.audit import audit_log
+from src.routes.expiry import expiry_wheel
+from src.routes.revocation import revoked_tokens
+from src.routes.mfa import MFAEngine, MFAChallenge, MFAError, open_sms_sender_from_env
+from src.routes.tracing import span, traced_route
+from src.routes.user_import import UserImporter, read_rows, get_hash_pool
+from src.routes.validators import (
+    field, compile_schema, validation_error, validate_email, validate_phone,
+    validate_country, password_errors, BUSINESS_TYPES, MFA_METHODS
+)
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -49,6 +62,86 @@ users_db['admin@valorapay.com'] = {
     'timezone': 'America/Sao_Paulo'
 }
 
+# Estado recuperado do WAL/snapshot sobrescreve os dados de exemplo
+durable_store.register('users', users_db)
+durable_store.register('sessions', sessions_db)
+durable_store.register('mfa_challenges', mfa_challenges_db)
+
+# Índice id -> usuário (evita varrer a base a cada requisição autenticada)
+users_by_id = {user['id']: user for user in users_db.values()}
+
+
+def purge_mfa_challenge(challenge_id):
+    """Desafio MFA expirado: removido da base"""
+    if mfa_challenges_db.pop(challenge_id, None) is not None:
+        durable_store.delete('mfa_challenges', challenge_id)
+
+
+def schedule_mfa_expiry(challenge):
+    expiry_wheel.schedule('mfa', challenge.id, challenge.expires_at)
+
+
+def on_mfa_challenge_change(challenge, removed):
+    """Tentativas, OTP de SMS e consumo do desafio vão para o WAL"""
+    if removed:
+        expiry_wheel.cancel('mfa', challenge.id)
+        durable_store.delete('mfa_challenges', challenge.id)
+    else:
+        durable_store.put('mfa_challenges', challenge.id, challenge)
+
+
+mfa_engine = MFAEngine(mfa_challenges_db, open_sms_sender_from_env(), MFA_SECRET_KEY,
+                       on_change=on_mfa_challenge_change)
+
+expiry_wheel.on_expire('mfa', purge_mfa_challenge)
+for _challenge in list(mfa_challenges_db.values()):
+    if isinstance(_challenge, MFAChallenge):
+        schedule_mfa_expiry(_challenge)
+    else:
+        # Formato antigo (dict, sem contagem de tentativas): o login é refeito
+        purge_mfa_challenge(_challenge['id'])
+
+# Esquemas dos corpos (RegisterRequest, LoginRequest, MFAVerificationRequest)
+validate_register_body = compile_schema({
+    'email': field(max_length=255, test=validate_email, message='E-mail inválido'),
+    'password': field(explain=password_errors, message='Senha não atende aos critérios de segurança'),
+    'first_name': field(max_length=50),
+    'last_name': field(max_length=50),
+    'phone': field(test=validate_phone, message='Telefone inválido'),
+    'country': field(test=validate_country, message='Código de país inválido'),
+    'business_type': field(choices=BUSINESS_TYPES, message='Tipo de negócio inválido'),
+    'accept_terms': field('boolean', required=False),
+    'accept_privacy': field('boolean', required=False),
+    'marketing_consent': field('boolean', required=False),
+    'preferred_language': field(required=False, max_length=10),
+    'timezone': field(required=False, max_length=64),
+})
+
+validate_login_body = compile_schema({
+    'email': field(max_length=255),
+    'password': field(),
+    'country': field(required=False),
+    'user_agent': field(required=False),
+    'timestamp': field(required=False),
+    'device_fingerprint': field(required=False),
+}, required_message='E-mail e senha são obrigatórios')
+
+validate_mfa_body = compile_schema({
+    'session_token': field(),
+    'code': field(max_length=16),
+    'method': field(choices=MFA_METHODS, message='Método MFA não suportado'),
+    'challenge_id': field(required=False, max_length=64),
+})
+
+validate_mfa_sms_body = compile_schema({
+    'session_token': field(),
+    'challenge_id': field(required=False, max_length=64),
+})
+
+validate_refresh_body = compile_schema({
+    'refresh_token': field(required_message='Refresh token é obrigatório'),
+})
+
 def require_auth(f):
     """Decorator para rotas que requerem autenticação"""
     @wraps(f)
@@ -64,11 +157,16 @@ def require_auth(f):
             payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
             user_id = payload['user_id']
             
-            if user_id not in [user['id'] for user in users_db.values()]:
+            if (revoked_tokens.is_revoked(payload.get('jti'), payload['exp'])
+                    or revoked_tokens.is_user_revoked(user_id, issued_at_ms(payload))):
+                return jsonify({'error': 'Token revogado'}), 401
+            
+            if user_id not in users_by_id:
                 return jsonify({'error': 'Usuário não encontrado'}), 401
             
             # Adicionar usuário ao contexto da requisição
-            request.current_user = next(user for user in users_db.values() if user['id'] == user_id)
+            request.current_user = users_by_id[user_id]
+            request.token_payload = payload
             
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token expirado'}), 401
@@ -85,21 +183,10 @@ def register():
     try:
         data = request.get_json()
         
-        # Validação dos dados obrigatórios
-        required_fields = ['email', 'password', 'first_name', 'last_name', 'phone', 'country', 'business_type']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    'success': False,
-                    'error': f'Campo obrigatório: {field}'
-                }), 400
-        
-        # Validar e-mail
-        if not validate_email(data['email']):
-            return jsonify({
-                'success': False,
-                'error': 'E-mail inválido'
-            }), 400
+        # Validação do corpo (todos os erros de uma vez)
+        errors = validate_register_body(data)
+        if errors:
+            return jsonify(validation_error(errors)), 400
         
         # Verificar se usuário já existe
         if data['email'] in users_db:
@@ -108,57 +195,11 @@ def register():
                 'error': 'E-mail já cadastrado'
             }), 409
         
-        # Validar senha
-        password_validation = validate_password(data['password'])
-        if not password_validation['valid']:
-            return jsonify({
-                'success': False,
-                'error': 'Senha não atende aos critérios de segurança',
-                'details': password_validation['errors']
-            }), 400
-        
-        # Validar telefone
-        if not validate_phone(data['phone']):
-            return jsonify({
-                'success': False,
-                'error': 'Telefone inválido'
-            }), 400
-        
-        # Validar país
-        if not validate_country(data['country']):
-            return jsonify({
-                'success': False,
-                'error': 'Código de país inválido'
-            }), 400
-        
         # Criar usuário
-        user_id = f"user_{uuid.uuid4().hex[:12]}"
         password_hash = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        
-        user = {
-            'id': user_id,
-            'email': data['email'],
-            'password_hash': password_hash,
-            'first_name': data['first_name'],
-            'last_name': data['last_name'],
-            'phone': data['phone'],
-            'country': data['country'],
-            'business_type': data['business_type'],
-            'email_verified': False,
-            'phone_verified': False,
-            'mfa_enabled': False,
-            'mfa_secret': pyotp.random_base32(),
-            'role': 'user',
-            'permissions': ['read_profile', 'write_profile', 'read_transactions'],
-            'created_at': datetime.utcnow().isoformat(),
-            'last_login_at': None,
-            'login_attempts': 0,
-            'is_blocked': False,
-            'preferred_language': data.get('preferred_language', 'pt-BR'),
-            'timezone': data.get('timezone', 'America/Sao_Paulo')
-        }
-        
-        users_db[data['email']] = user
+        user = new_user(data, password_hash)
+        user_id = user['id']
+        insert_users([user])
         
         # Log evento de segurança
         log_security_event(user_id, 'user_registered', 'Usuário registrado com sucesso')
@@ -182,18 +223,44 @@ def register():
             'error': f'Erro interno: {str(e)}'
         }), 500
 
+@auth_bp.route('/api/v1/auth/users/import', methods=['POST'])
+@require_auth
+def import_users():
+    """Importação em massa de usuários (CSV ou NDJSON), com relatório por linha"""
+    if 'admin_access' not in request.current_user['permissions']:
+        return jsonify({'success': False, 'error': 'Acesso negado'}), 403
+    
+    file_format = request.args.get('format') or ('csv' if 'csv' in (request.content_type or '') else 'ndjson')
+    if file_format not in ('csv', 'ndjson'):
+        return jsonify({
+            'success': False,
+            'error': 'Formato não suportado (use csv ou ndjson)'
+        }), 400
+    
+    admin_id = request.current_user['id']
+    lines = io.TextIOWrapper(io.BufferedReader(request.stream), encoding='utf-8', newline='')
+    importer = UserImporter(users_db, validate_register_body, new_user, insert_users, get_hash_pool())
+    
+    def report():
+        for result in importer.run(read_rows(lines, file_format)):
+            yield json.dumps(result) + '\n'
+        log_security_event(admin_id, 'users_imported', f"{importer.summary['created']} usuários importados")
+        yield json.dumps({'summary': importer.summary}) + '\n'
+    
+    return Response(stream_with_context(report()), mimetype='application/x-ndjson')
+
 @auth_bp.route('/api/v1/auth/login', methods=['POST'])
+@traced_route('login')
 def login():
     """Login do usuário"""
     try:
         data = request.get_json()
         
-        # Validação dos dados obrigatórios
-        if 'email' not in data or 'password' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'E-mail e senha são obrigatórios'
-            }), 400
+        # Validação do corpo
+        with span('login.validate'):
+            errors = validate_login_body(data)
+        if errors:
+            return jsonify(validation_error(errors)), 400
         
         email = data['email'].lower()
         password = data['password']
@@ -219,6 +286,7 @@ def login():
         # Verificar limite de tentativas
         if user['login_attempts'] >= 5:
             user['is_blocked'] = True
+            durable_store.put('users', email, user)
             log_security_event(user['id'], 'account_locked', 'Conta bloqueada por excesso de tentativas')
             return jsonify({
                 'success': False,
@@ -226,8 +294,11 @@ def login():
             }), 423
         
         # Verificar senha
-        if not bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+        with span('bcrypt.check'):
+            password_ok = bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8'))
+        if not password_ok:
             user['login_attempts'] += 1
+            durable_store.put('users', email, user)
             log_login_attempt(email, False, 'Senha incorreta')
             return jsonify({
                 'success': False,
@@ -235,23 +306,27 @@ def login():
             }), 401
         
         # Análise de risco
-        risk_assessment = assess_login_risk(user, data)
+        with span('risk.assess'):
+            risk_assessment = assess_login_risk(user, data)
         
         # Reset tentativas de login
-        user['login_attempts'] = 0
-        user['last_login_at'] = datetime.utcnow().isoformat()
-        
-        # Log login bem-sucedido
-        log_login_attempt(email, True, 'Login realizado com sucesso')
-        log_security_event(user['id'], 'login_success', f'Login de {data.get("country", "unknown")}')
+        with span('store.write'):
+            user['login_attempts'] = 0
+            user['last_login_at'] = datetime.utcnow().isoformat()
+            durable_store.put('users', email, user)
+            
+            # Log login bem-sucedido
+            log_login_attempt(email, True, 'Login realizado com sucesso')
+            log_security_event(user['id'], 'login_success', f'Login de {data.get("country", "unknown")}')
         
         # Verificar se MFA é necessário
         if user['mfa_enabled'] or risk_assessment['require_mfa']:
             # Gerar desafio MFA
-            challenge_id = generate_mfa_challenge(user['id'])
-            
-            # Gerar token de sessão temporário
-            session_token = generate_session_token(user['id'], temporary=True)
+            with span('mfa.challenge'):
+                challenge_id = generate_mfa_challenge(user['id'])
+                
+                # Gerar token de sessão temporário
+                session_token = generate_session_token(user['id'], temporary=True, challenge_id=challenge_id)
             
             return jsonify({
                 'success': True,
@@ -262,11 +337,13 @@ def login():
             })
         
         # Gerar tokens de acesso
-        access_token = generate_access_token(user['id'])
-        refresh_token = generate_refresh_token(user['id'])
+        with span('tokens.issue'):
+            access_token = generate_access_token(user['id'])
+            refresh_token = generate_refresh_token(user['id'])
         
         # Criar sessão
-        session_id = create_user_session(user['id'], data)
+        with span('session.create'):
+            session_id = create_user_session(user['id'], data, refresh_token)
         
         return jsonify({
             'success': True,
@@ -291,75 +368,90 @@ def login():
             'error': f'Erro interno: {str(e)}'
         }), 500
 
+def decode_mfa_session(data):
+    """Usuário e desafio do token de sessão temporário emitido no login"""
+    try:
+        payload = jwt.decode(data['session_token'], JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.InvalidTokenError:
+        raise MFAError('Token de sessão inválido')
+    if not payload.get('temporary'):
+        raise MFAError('Token de sessão inválido')
+
+    user = users_by_id.get(payload['user_id'])
+    if not user:
+        raise MFAError('Usuário não encontrado', 404)
+    return user, payload.get('challenge_id') or data.get('challenge_id')
+
+@auth_bp.route('/api/v1/auth/mfa/sms', methods=['POST'])
+def send_mfa_sms():
+    """Envia o código MFA por SMS"""
+    try:
+        data = request.get_json()
+
+        errors = validate_mfa_sms_body(data)
+        if errors:
+            return jsonify(validation_error(errors)), 400
+
+        user, challenge_id = decode_mfa_session(data)
+        if not user['phone_verified']:
+            raise MFAError('Telefone não verificado', 400)
+
+        expires_at = mfa_engine.send_sms(challenge_id, user['id'], user['phone'])
+        log_security_event(user['id'], 'mfa_sms_sent', 'Código MFA enviado por SMS')
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'challenge_id': challenge_id,
+                'expires_at': datetime.utcfromtimestamp(expires_at).isoformat()
+            }
+        })
+
+    except MFAError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Erro interno: {str(e)}'
+        }), 500
+
 @auth_bp.route('/api/v1/auth/mfa/verify', methods=['POST'])
+@traced_route('verify_mfa')
 def verify_mfa():
     """Verificação de MFA"""
     try:
         data = request.get_json()
         
-        required_fields = ['session_token', 'code', 'method']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    'success': False,
-                    'error': f'Campo obrigatório: {field}'
-                }), 400
+        errors = validate_mfa_body(data)
+        if errors:
+            return jsonify(validation_error(errors)), 400
         
-        # Verificar token de sessão temporário
+        # Verificar token de sessão temporário e consumir o desafio do login
+        with span('mfa.session'):
+            user, challenge_id = decode_mfa_session(data)
+        user_id = user['id']
         try:
-            payload = jwt.decode(data['session_token'], JWT_SECRET, algorithms=[JWT_ALGORITHM])
-            user_id = payload['user_id']
-            
-            if not payload.get('temporary'):
-                return jsonify({
-                    'success': False,
-                    'error': 'Token de sessão inválido'
-                }), 401
-                
-        except jwt.InvalidTokenError:
-            return jsonify({
-                'success': False,
-                'error': 'Token de sessão inválido'
-            }), 401
-        
-        # Buscar usuário
-        user = next((u for u in users_db.values() if u['id'] == user_id), None)
-        if not user:
-            return jsonify({
-                'success': False,
-                'error': 'Usuário não encontrado'
-            }), 404
-        
-        # Verificar código MFA
-        if data['method'] == 'authenticator':
-            totp = pyotp.TOTP(user['mfa_secret'])
-            if not totp.verify(data['code'], valid_window=1):
-                return jsonify({
-                    'success': False,
-                    'error': 'Código inválido'
-                }), 401
-        elif data['method'] == 'sms':
-            # Simular verificação SMS (em produção, verificar código enviado)
-            if data['code'] != '123456':  # Código fixo para simulação
-                return jsonify({
-                    'success': False,
-                    'error': 'Código inválido'
-                }), 401
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Método MFA não suportado'
-            }), 400
+            with span('mfa.verify', **{'mfa.method': data['method']}):
+                mfa_engine.verify(challenge_id, user_id, data['method'], data['code'],
+                                  totp_secret=user.get('mfa_secret'))
+        except MFAError as e:
+            log_security_event(user_id, 'mfa_failed', f'MFA recusado via {data["method"]}: {e}')
+            raise
         
         # Log evento de segurança
         log_security_event(user_id, 'mfa_verified', f'MFA verificado via {data["method"]}')
         
         # Gerar tokens de acesso
-        access_token = generate_access_token(user_id)
-        refresh_token = generate_refresh_token(user_id)
+        with span('tokens.issue'):
+            access_token = generate_access_token(user_id)
+            refresh_token = generate_refresh_token(user_id)
         
         # Criar sessão
-        session_id = create_user_session(user_id, data)
+        with span('session.create'):
+            session_id = create_user_session(user_id, data, refresh_token)
         
         return jsonify({
             'success': True,
@@ -378,6 +470,11 @@ def verify_mfa():
             }
         })
         
+    except MFAError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status
     except Exception as e:
         return jsonify({
             'success': False,
@@ -391,10 +488,18 @@ def logout():
     try:
         user = request.current_user
         
-        # Invalidar todas as sessões do usuário
+        # Token usado no logout deixa de valer imediatamente
+        payload = request.token_payload
+        revoked_tokens.revoke(payload.get('jti'), payload['exp'])
+        # Todos os tokens já emitidos para o usuário (outras sessões, /refresh, outros workers)
+        revoked_tokens.revoke_user(user['id'])
+        
+        # Invalidar todas as sessões do usuário (e seus refresh tokens)
         sessions_to_remove = [sid for sid, session in sessions_db.items() if session['user_id'] == user['id']]
         for session_id in sessions_to_remove:
-            del sessions_db[session_id]
+            session = sessions_db.pop(session_id)
+            revoked_tokens.revoke(session.get('refresh_jti'), session.get('refresh_expires_at', 0))
+            durable_store.delete('sessions', session_id)
         
         # Log evento de segurança
         log_security_event(user['id'], 'logout', 'Usuário fez logout')
@@ -416,11 +521,9 @@ def refresh_token():
     try:
         data = request.get_json()
         
-        if 'refresh_token' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Refresh token é obrigatório'
-            }), 400
+        errors = validate_refresh_body(data)
+        if errors:
+            return jsonify(validation_error(errors)), 400
         
         try:
             payload = jwt.decode(data['refresh_token'], JWT_SECRET, algorithms=[JWT_ALGORITHM])
@@ -431,6 +534,13 @@ def refresh_token():
                     'success': False,
                     'error': 'Token inválido'
                 }), 401
+            
+            if (revoked_tokens.is_revoked(payload.get('jti'), payload['exp'])
+                    or revoked_tokens.is_user_revoked(user_id, issued_at_ms(payload))):
+                return jsonify({
+                    'success': False,
+                    'error': 'Refresh token revogado'
+                }), 401
                 
         except jwt.InvalidTokenError:
             return jsonify({
@@ -503,56 +613,50 @@ def get_security_events():
 
 # Funções auxiliares
 
-def validate_email(email):
-    """Valida formato do e-mail"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
-
-def validate_password(password):
-    """Valida força da senha"""
-    errors = []
-    
-    if len(password) < 12:
-        errors.append('Senha deve ter pelo menos 12 caracteres')
-    
-    if not re.search(r'[a-z]', password):
-        errors.append('Senha deve conter pelo menos uma letra minúscula')
-    
-    if not re.search(r'[A-Z]', password):
-        errors.append('Senha deve conter pelo menos uma letra maiúscula')
-    
-    if not re.search(r'\d', password):
-        errors.append('Senha deve conter pelo menos um número')
-    
-    if not re.search(r'[@$!%*?&]', password):
-        errors.append('Senha deve conter pelo menos um caractere especial')
-    
-    # Verificar senhas comuns
-    common_passwords = ['password', '123456789', 'qwerty123', 'admin123']
-    if password.lower() in common_passwords:
-        errors.append('Senha muito comum')
-    
+def new_user(data, password_hash):
+    """Monta o registro de um novo usuário a partir do corpo validado"""
     return {
-        'valid': len(errors) == 0,
-        'errors': errors,
-        'strength': 'strong' if len(errors) == 0 else 'weak'
+        'id': f"user_{uuid.uuid4().hex[:12]}",
+        'email': data['email'],
+        'password_hash': password_hash,
+        'first_name': data['first_name'],
+        'last_name': data['last_name'],
+        'phone': data['phone'],
+        'country': data['country'],
+        'business_type': data['business_type'],
+        'email_verified': False,
+        'phone_verified': False,
+        'mfa_enabled': False,
+        'mfa_secret': pyotp.random_base32(),
+        'role': 'user',
+        'permissions': ['read_profile', 'write_profile', 'read_transactions'],
+        'created_at': datetime.utcnow().isoformat(),
+        'last_login_at': None,
+        'login_attempts': 0,
+        'is_blocked': False,
+        'preferred_language': data.get('preferred_language', 'pt-BR'),
+        'timezone': data.get('timezone', 'America/Sao_Paulo')
     }
 
-def validate_phone(phone):
-    """Valida formato do telefone"""
-    pattern = r'^\+?[1-9]\d{1,14}$'
-    return re.match(pattern, phone) is not None
+def insert_users(users):
+    """Insere usuários na base e no índice por id (uma espera de fsync por lote)"""
+    with durable_store.batch():
+        for user in users:
+            users_db[user['email']] = user
+            users_by_id[user['id']] = user
+            durable_store.put('users', user['email'], user)
 
-def validate_country(country):
-    """Valida código do país"""
-    valid_countries = ['BR', 'US', 'CA', 'MX', 'AR', 'CL', 'CO', 'PE', 'UY']
-    return country in valid_countries
+def issued_at_ms(payload):
+    """Emissão do token em ms (tokens sem `iat_ms`: o `iat` em segundos)"""
+    return payload.get('iat_ms', payload.get('iat', 0) * 1000)
 
 def generate_access_token(user_id):
     """Gera token de acesso JWT"""
     payload = {
         'user_id': user_id,
         'type': 'access',
+        'jti': uuid.uuid4().hex,
+        'iat_ms': int(time.time() * 1000),
         'exp': datetime.utcnow() + timedelta(hours=1),
         'iat': datetime.utcnow()
     }
@@ -563,17 +667,20 @@ def generate_refresh_token(user_id):
     payload = {
         'user_id': user_id,
         'type': 'refresh',
+        'jti': uuid.uuid4().hex,
+        'iat_ms': int(time.time() * 1000),
         'exp': datetime.utcnow() + timedelta(days=30),
         'iat': datetime.utcnow()
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-def generate_session_token(user_id, temporary=False):
-    """Gera token de sessão temporário"""
+def generate_session_token(user_id, temporary=False, challenge_id=None):
+    """Gera token de sessão temporário (vinculado ao desafio MFA do login)"""
     payload = {
         'user_id': user_id,
         'type': 'session',
         'temporary': temporary,
+        'challenge_id': challenge_id,
         'exp': datetime.utcnow() + timedelta(minutes=10 if temporary else 60),
         'iat': datetime.utcnow()
     }
@@ -591,22 +698,12 @@ def generate_verification_token(user_id, verification_type):
 
 def generate_mfa_challenge(user_id):
     """Gera desafio MFA"""
-    challenge_id = f"mfa_{uuid.uuid4().hex[:16]}"
-    
-    challenge = {
-        'id': challenge_id,
-        'user_id': user_id,
-        'created_at': datetime.utcnow().isoformat(),
-        'expires_at': (datetime.utcnow() + timedelta(minutes=5)).isoformat(),
-        'attempts': 0,
-        'verified': False
-    }
-    
-    mfa_challenges_db[challenge_id] = challenge
-    return challenge_id
+    challenge = mfa_engine.create_challenge(user_id)
+    schedule_mfa_expiry(challenge)
+    return challenge.id
 
-def create_user_session(user_id, request_data):
-    """Cria sessão do usuário"""
+def create_user_session(user_id, request_data, refresh_token=None):
+    """Cria sessão do usuário (guarda o jti do refresh token para revogá-lo no logout)"""
     session_id = f"sess_{uuid.uuid4().hex[:16]}"
     
     session = {
@@ -619,8 +716,13 @@ def create_user_session(user_id, request_data):
         'country': request_data.get('country', 'unknown'),
         'is_active': True
     }
+    if refresh_token:
+        claims = jwt.decode(refresh_token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        session['refresh_jti'] = claims['jti']
+        session['refresh_expires_at'] = claims['exp']
     
     sessions_db[session_id] = session
+    durable_store.put('sessions', session_id, session)
     return session_id
 
 def assess_login_risk(user, request_data):
@@ -640,6 +742,9 @@ def assess_login_risk(user, request_data):
     if user['login_attempts'] > 0:
         risk_factors.append('recent_failures')
     
+    # Verificar velocidade de logins por usuário e por IP
+    risk_factors.extend(login_risk_factors(risk_store, user['email'], request.remote_addr or 'unknown'))
+    
     risk_score = len(risk_factors)
     require_mfa = risk_score >= 2 or not user['mfa_enabled']
     
@@ -664,6 +769,8 @@ def log_login_attempt(email, success, reason):
     }
     
     login_attempts_db[attempt_id] = attempt
+    audit_log.emit('login_attempt', attempt)
+    record_login(risk_store, email, attempt['ip_address'])
 
 def log_security_event(user_id, event_type, description):
     """Log evento de segurança"""
@@ -680,4 +787,5 @@ def log_security_event(user_id, event_type, description):
     }
     
     security_events_db[event_id] = event
+    audit_log.emit('security_event', event)
 
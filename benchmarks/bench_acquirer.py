@@ -0,0 +1,73 @@
+"""Benchmark: p99 de autorização com latência de cauda induzida no adquirente
+
+Sobe o acquirer_standin.py local e compara o gateway HTTP sem e com hedge.
+
+Uso: python benchmarks/bench_acquirer.py [--requests 2000] [--tail-rate 0.02]
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes.acquirer import HttpAcquirerGateway, AcquirerError
+from src.routes.acquirer_standin import AcquirerProfile, start_standin
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def run(gateway, requests, concurrency):
+    def authorize(i):
+        start = time.perf_counter()
+        try:
+            gateway.authorize({'idempotency_key': f'bench_{id(gateway)}_{i}', 'amount': 100.0})
+            ok = True
+        except AcquirerError:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(authorize, range(requests)))
+
+    latencies = [latency * 1000 for latency, _ in results]
+    errors = sum(1 for _, ok in results if not ok)
+    return percentile(latencies, 0.50), percentile(latencies, 0.99), max(latencies), errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency-ms', type=float, default=10.0)
+    parser.add_argument('--tail-ms', type=float, default=500.0)
+    parser.add_argument('--tail-rate', type=float, default=0.02)
+    parser.add_argument('--hedge-after-ms', type=float, default=50.0)
+    parser.add_argument('--timeout-ms', type=float, default=2000.0)
+    args = parser.parse_args()
+
+    profile = AcquirerProfile(latency_ms=args.latency_ms, jitter_ms=2.0, tail_ms=args.tail_ms,
+                              tail_rate=args.tail_rate, decline_rate=0.0)
+    server = start_standin(profile=profile)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    variants = (
+        ('sem hedge', HttpAcquirerGateway(base_url, timeout=args.timeout_ms / 1000)),
+        (f'hedge após {args.hedge_after_ms:.0f}ms', HttpAcquirerGateway(
+            base_url, timeout=args.timeout_ms / 1000, hedge_after=args.hedge_after_ms / 1000)),
+    )
+
+    print(f'cauda: {args.tail_rate:.1%} das chamadas +{args.tail_ms:.0f}ms')
+    for name, gateway in variants:
+        p50, p99, worst, errors = run(gateway, args.requests, args.concurrency)
+        print(f'{name:20s} p50 {p50:7.1f}ms  p99 {p99:7.1f}ms  max {worst:7.1f}ms  erros {errors}')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Benchmark: requisições simultâneas em andamento por processo no modo ASGI
+
+Cada requisição autoriza no adquirente local (acquirer_standin.py) com a
+latência configurada, pelo gateway HTTP do sistema, antes de responder.
+Compara uma rota Flask síncrona no WsgiToAsgi padrão do asgiref e no
+src.asgi (uma thread por requisição) com `POST /api/v1/payment/create`
+(cartão) atendida no loop pelo src.asgi, com poucas threads.
+
+Uso: python benchmarks/bench_asgi_inflight.py [--concurrency 500] [--latency 0.2]
+"""
+import os
+import sys
+import time
+import json
+import uuid
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import Flask, jsonify
+from src.asgi import create_asgi_app
+from src.routes.payment_async import CREATE_PATH
+
+SANDBOX_KEY = 'sk_test_valora_12345'
+from src.routes.acquirer import HttpAcquirerGateway, set_acquirer
+from src.routes.acquirer_standin import start_standin, AcquirerProfile
+from src.routes.payment import payment_bp
+from src.routes.auth import auth_bp
+
+
+def build_app(gateway):
+    app = Flask(__name__)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(payment_bp)
+
+    @app.route('/bench/slow-acquirer', methods=['POST'])
+    def slow_acquirer():
+        # Chamada HTTP real ao adquirente local: bloqueia a thread até a resposta
+        result = gateway.authorize({'idempotency_key': uuid.uuid4().hex, 'amount': 100})
+        return jsonify({'success': True, 'data': {'status': 'approved' if result['approved'] else 'declined'}})
+
+    return app
+
+
+def card_payment():
+    return json.dumps({
+        'amount': 100.0,
+        'currency': 'BRL',
+        'payment_method': 'credit_card',
+        'customer': {'id': uuid.uuid4().hex, 'email': 'bench@example.com'},
+        'card': {'number': '4111111111111111', 'exp_month': 12, 'exp_year': 2030,
+                 'cvc': 123, 'holder_name': 'BENCH'}
+    }).encode()
+
+
+async def call(asgi_app, path, body):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'POST', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'root_path': '',
+        'headers': [(b'content-type', b'application/json'), (b'x-api-key', SANDBOX_KEY.encode())],
+        'client': ('127.0.0.1', 1234), 'server': ('127.0.0.1', 5000),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    status = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await asgi_app(scope, receive, send)
+    return status[0]
+
+
+async def run(asgi_app, path, concurrency):
+    if hasattr(asgi_app, 'executor'):
+        # O que o lifespan.startup do src.asgi faz
+        asyncio.get_running_loop().set_default_executor(asgi_app.executor)
+    start = time.perf_counter()
+    statuses = await asyncio.gather(*(
+        call(asgi_app, path, card_payment() if path == CREATE_PATH else b'{}') for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(1 for s in statuses if s == 200)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('VALORA_ASGI_THREADS', '256')))
+    parser.add_argument('--native-threads', type=int, default=8)
+    args = parser.parse_args()
+
+    standin = start_standin(profile=AcquirerProfile(latency_ms=args.latency * 1000, jitter_ms=0))
+    gateway = HttpAcquirerGateway(f'http://127.0.0.1:{standin.server_port}', timeout=max(30.0, args.latency * 10),
+                                  pool_size=args.threads, failure_threshold=args.concurrency)
+    set_acquirer(gateway)
+    app = build_app(gateway)
+    variants = (
+        ('asgiref WsgiToAsgi', WsgiToAsgi(app), '/bench/slow-acquirer'),
+        (f'src.asgi Flask ({args.threads} thr)', create_asgi_app(app, threads=args.threads), '/bench/slow-acquirer'),
+        (f'src.asgi nativo ({args.native_threads} thr)', create_asgi_app(app, threads=args.native_threads),
+         CREATE_PATH),
+    )
+
+    for name, asgi_app, path in variants:
+        elapsed, ok = asyncio.run(run(asgi_app, path, args.concurrency))
+        in_flight = args.latency * ok / elapsed
+        print(f'{name:28s} {ok} ok em {elapsed:7.2f}s  '
+              f'{ok / elapsed:8.1f} req/s  ~{in_flight:6.1f} em andamento')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark: latência adicionada por evento e vazão sustentada da trilha de auditoria
+
+Uso: python benchmarks/bench_audit.py [--events 200000] [--threads 8]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes.audit import AuditLog
+
+
+def event(i):
+    return {
+        'id': f'event_{i:016x}',
+        'user_id': f'user_{i % 1000:012d}',
+        'type': 'login_success',
+        'description': 'Login de BR',
+        'timestamp': '2025-01-01T00:00:00',
+        'ip_address': '203.0.113.10',
+        'user_agent': 'Mozilla/5.0'
+    }
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(emit, events, threads):
+    per_thread = events // threads
+    latencies = []
+
+    def worker(offset):
+        local = []
+        for i in range(offset, offset + per_thread):
+            start = time.perf_counter()
+            emit(event(i))
+            local.append(time.perf_counter() - start)
+        latencies.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+
+    for fsync in (False, True):
+        events = args.events if not fsync else min(args.events, 5000)
+        suffix = ' + fsync' if fsync else ''
+
+        # Referência: gravação síncrona de cada evento na thread da requisição
+        lock = threading.Lock()
+        with open(os.path.join(directory, 'sync.ndjson'), 'a') as f:
+            def emit_sync(record):
+                with lock:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    f.flush()
+                    if fsync:
+                        os.fsync(f.fileno())
+            start, latencies = run(emit_sync, events, args.threads)
+            elapsed = time.perf_counter() - start
+        print(f'síncrono{suffix}: p50 {percentile(latencies, 0.5) * 1e6:.1f} µs, '
+              f'p99 {percentile(latencies, 0.99) * 1e6:.1f} µs, {len(latencies) / elapsed:,.0f} eventos/s')
+
+        audit = AuditLog(os.path.join(directory, f'audit{int(fsync)}'), flush_interval=0.05, fsync=fsync)
+        start, latencies = run(lambda record: audit.emit('security_event', record), events, args.threads)
+        audit.close()
+        elapsed = time.perf_counter() - start
+        print(f'assíncrono{suffix}: p50 {percentile(latencies, 0.5) * 1e6:.1f} µs, '
+              f'p99 {percentile(latencies, 0.99) * 1e6:.1f} µs, '
+              f'{audit.stats["written"] / elapsed:,.0f} eventos/s gravados '
+              f'({audit.stats["batches"]} lotes, {audit.stats["blocked"]} esperas por fila cheia)')
+
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark: PIX BR Code (vetores de conformidade e payloads por segundo)
+
+Uso: python benchmarks/bench_brcode.py [--payloads 200000]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes.brcode import MerchantTemplate, BRCodeError, crc16, parse_payload
+
+# Exemplo do Manual de Padrões para Iniciação do PIX (BCB)
+BCB_STATIC = ('00020126580014br.gov.bcb.pix0136123e4567-e12b-12d1-a456-426655440000'
+              '5204000053039865802BR5913Fulano de Tal6008BRASILIA62070503***63041D3D')
+
+
+def check_conformance():
+    # Valor de verificação do CRC-16/CCITT-FALSE
+    assert crc16(b'123456789') == 0x29B1
+
+    template = MerchantTemplate('123e4567-e12b-12d1-a456-426655440000', 'Fulano de Tal', 'BRASILIA')
+    assert template.payload() == BCB_STATIC, template.payload()
+
+    parsed = parse_payload(BCB_STATIC)
+    assert parsed['pix_key'] == '123e4567-e12b-12d1-a456-426655440000'
+    assert parsed['merchant_name'] == 'Fulano de Tal' and parsed['txid'] == '***'
+
+    payload = template.payload(1234.5, 'tx_0123abcd')
+    parsed = parse_payload(payload)
+    assert parsed['amount'] == 1234.5 and parsed['txid'] == 'tx0123abcd'
+    # Template incremental == CRC do payload inteiro
+    assert int(payload[-4:], 16) == crc16(payload[:-4].encode('ascii'))
+
+    for corrupted in (BCB_STATIC[:-1] + 'E', BCB_STATIC.replace('Fulano', 'Fulana')):
+        try:
+            parse_payload(corrupted)
+        except BRCodeError:
+            continue
+        raise AssertionError('CRC inválido aceito')
+
+    accented = MerchantTemplate('pix@valorapay.com', 'Padaria São João Ltda. e Filhos', 'São José dos Campos')
+    parsed = parse_payload(accented.payload(1.0, 'x'))
+    assert parsed['merchant_name'] == 'Padaria Sao Joao Ltda. e' and parsed['merchant_city'] == 'Sao Jose dos Ca'
+    print('vetores de conformidade: ok')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--payloads', type=int, default=200000)
+    args = parser.parse_args()
+
+    check_conformance()
+
+    template = MerchantTemplate('pix@valorapay.com', 'Valora Pay', 'Sao Paulo')
+    start = time.perf_counter()
+    for i in range(args.payloads):
+        template.payload(10 + i % 1000, f'tx_{i:016x}')
+    elapsed = time.perf_counter() - start
+    print(f'geração (template): {args.payloads / elapsed:,.0f} payloads/s ({elapsed / args.payloads * 1e6:.2f} µs)')
+
+    start = time.perf_counter()
+    for i in range(args.payloads):
+        MerchantTemplate('pix@valorapay.com', 'Valora Pay', 'Sao Paulo').payload(10 + i % 1000, f'tx_{i:016x}')
+    elapsed = time.perf_counter() - start
+    print(f'geração (sem template): {args.payloads / elapsed:,.0f} payloads/s ({elapsed / args.payloads * 1e6:.2f} µs)')
+
+    payload = template.payload(99.9, 'tx_0123456789abcdef')
+    start = time.perf_counter()
+    for _ in range(args.payloads):
+        parse_payload(payload)
+    elapsed = time.perf_counter() - start
+    print(f'leitura: {args.payloads / elapsed:,.0f} payloads/s ({elapsed / args.payloads * 1e6:.2f} µs)')
+
+
+if __name__ == '__main__':
+    main()
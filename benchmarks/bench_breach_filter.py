@@ -0,0 +1,63 @@
+"""Benchmark: filtro de senhas vazadas (taxa de falso positivo, tamanho e latência)
+
+Uso: python benchmarks/bench_breach_filter.py [--items 1000000] [--fp-rate 0.001] [--probes 200000]
+"""
+import os
+import sys
+import time
+import hashlib
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes.breach_filter import BreachFilter, build_filter
+
+
+def digests(prefix, count):
+    for i in range(count):
+        yield hashlib.sha1(f'{prefix}{i}'.encode('utf-8')).digest()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--fp-rate', type=float, default=0.001)
+    parser.add_argument('--probes', type=int, default=200000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.bloom')
+    start = time.perf_counter()
+    bits, hashes, inserted = build_filter(digests('vazada', args.items), path, args.items, args.fp_rate)
+    build_elapsed = time.perf_counter() - start
+
+    breach_filter = BreachFilter(path)
+    size = os.path.getsize(path)
+    print(f'{inserted} hashes, k={hashes}: {size / 1e6:.2f} MB '
+          f'({size * 8 / inserted:.1f} bits/hash), construção {build_elapsed:.1f}s')
+    print(f'projeção para 850M hashes: {size / inserted * 850e6 / 1e9:.2f} GB')
+
+    # Sem falsos negativos
+    assert all(breach_filter.contains_password(f'vazada{i}') for i in range(0, args.items, max(1, args.items // 1000)))
+
+    false_positives = 0
+    start = time.perf_counter()
+    for i in range(args.probes):
+        if breach_filter.contains_password(f'inedita{i}'):
+            false_positives += 1
+    elapsed = time.perf_counter() - start
+    print(f'falsos positivos: {false_positives / args.probes:.4%} (alvo {args.fp_rate:.4%})')
+    print(f'consulta (senha ausente): {elapsed / args.probes * 1e6:.2f} µs')
+
+    start = time.perf_counter()
+    for i in range(args.probes):
+        breach_filter.contains_password(f'vazada{i % args.items}')
+    elapsed = time.perf_counter() - start
+    print(f'consulta (senha vazada, k leituras): {elapsed / args.probes * 1e6:.2f} µs')
+
+    breach_filter.close()
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Benchmark: conversão de moedas e troca da tabela de câmbio
+
+Mede conversões/s na criação de pagamentos (Decimal, arredondada), a
+conversão em lote para relatórios (numpy se instalado), o custo de montar
+e publicar uma nova tabela e a vazão de leitura com trocas concorrentes.
+
+Uso: python benchmarks/bench_currency.py [--conversions 200000] [--batch 1000000] [--swaps 1000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes import currency
+from src.routes.currency import FXRates, RateTable, BUILTIN_RATES, CURRENCIES
+
+
+def jittered_rates(rng):
+    return {code: f'{float(rate) * rng.uniform(0.98, 1.02):.6f}' if code != 'USD' else '1'
+            for code, rate in BUILTIN_RATES.items()}
+
+
+def bench_single(rates, count, rng):
+    codes = list(CURRENCIES)
+    amounts = [round(rng.uniform(1, 5000), 2) for _ in range(count)]
+    sources = [rng.choice(codes) for _ in range(count)]
+    start = time.perf_counter()
+    for amount, source in zip(amounts, sources):
+        rates.settlement(amount, source)
+    elapsed = time.perf_counter() - start
+    print(f'settlement() na criação (Decimal, arredondado): {count / elapsed:,.0f} conversões/s '
+          f'({elapsed / count * 1e6:.2f} us)')
+
+
+def bench_batch(rates, count, rng):
+    codes = list(CURRENCIES)
+    amounts = [rng.uniform(1, 5000) for _ in range(count)]
+    sources = [rng.choice(codes) for _ in range(count)]
+
+    start = time.perf_counter()
+    rates.convert_many(amounts, 'USD', 'BRL', 2)
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    converted = rates.convert_many(amounts, sources, 'BRL', 2)
+    mixed = time.perf_counter() - start
+
+    table = rates.table
+    for i in range(0, count, max(count // 1000, 1)):
+        expected = float(table.convert(amounts[i], sources[i], 'BRL'))
+        assert abs(converted[i] - expected) <= 0.011, (amounts[i], sources[i], converted[i], expected)
+    backend = 'numpy' if currency.numpy is not None else 'array/listas'
+    print(f'convert_many ({backend}): uma moeda {count / single:,.0f} valores/s, '
+          f'moedas mistas {count / mixed:,.0f} valores/s')
+
+
+def bench_swaps(rates, count, rng):
+    tables = [RateTable(jittered_rates(rng)) for _ in range(min(count, 100))]
+    start = time.perf_counter()
+    for _ in range(count):
+        RateTable(jittered_rates(rng))
+    build = (time.perf_counter() - start) / count
+    start = time.perf_counter()
+    for i in range(count):
+        rates.swap(tables[i % len(tables)])
+    swap = (time.perf_counter() - start) / count
+    print(f'nova tabela ({len(BUILTIN_RATES)} moedas, {len(BUILTIN_RATES) ** 2} pares): montagem {build * 1e6:.0f} us, '
+          f'publicação {swap * 1e6:.2f} us')
+
+
+def bench_concurrent(rates, seconds, rng):
+    """Leitores convertendo enquanto um escritor troca a tabela 100 vezes/s"""
+    stop = threading.Event()
+    reads = [0, 0]
+    inconsistent = [0]
+
+    def reader(slot):
+        while not stop.is_set():
+            table = rates.table
+            # Ida e volta na mesma tabela: fatores sempre consistentes entre si
+            if abs(float(table.factor('USD', 'BRL') * table.factor('BRL', 'USD')) - 1) > 1e-9:
+                inconsistent[0] += 1
+            rates.convert(100, 'USD')
+            reads[slot] += 1
+
+    def writer():
+        local = random.Random(5)
+        while not stop.is_set():
+            rates.swap(RateTable(jittered_rates(local)))
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=reader, args=(slot,)) for slot in range(2)] + [threading.Thread(target=writer)]
+    before = rates.stats['swaps']
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    print(f'{sum(reads) / seconds:,.0f} conversões/s com {(rates.stats["swaps"] - before) / seconds:.0f} trocas/s '
+          f'concorrentes, {inconsistent[0]} leituras inconsistentes')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--conversions', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=1000000)
+    parser.add_argument('--swaps', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    rates = FXRates()
+    bench_single(rates, args.conversions, rng)
+    bench_batch(rates, args.batch, rng)
+    bench_swaps(rates, args.swaps, rng)
+    bench_concurrent(rates, args.seconds, rng)
+
+
+if __name__ == '__main__':
+    main()
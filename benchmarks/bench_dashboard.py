@@ -0,0 +1,71 @@
+"""Benchmark: ingestão de transições nos agregados do dashboard
+
+Uso: python benchmarks/bench_dashboard.py [--transitions 10000000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes.dashboard import DashboardAggregates
+
+METHODS = ('credit_card', 'debit_card', 'pix', 'boleto')
+BRANDS = ('visa', 'mastercard', 'elo', 'amex')
+# Caminhos típicos de status por método
+FLOWS = {
+    'credit_card': ('approved', 'captured', 'partially_refunded'),
+    'debit_card': ('approved', 'captured'),
+    'pix': ('waiting_payment', 'paid'),
+    'boleto': ('waiting_payment', 'paid'),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transitions', type=int, default=10000000)
+    parser.add_argument('--span-days', type=float, default=30.0)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    aggregates = DashboardAggregates()
+    now = time.time()
+    start_ts = now - args.span_days * 86400
+    step = args.span_days * 86400 / args.transitions
+
+    ingested = 0
+    timestamp = start_ts
+    start = time.perf_counter()
+    while ingested < args.transitions:
+        method = METHODS[rng.randrange(4)]
+        amount_cents = rng.randint(100, 500000)
+        transaction = {
+            'id': f'tx_{ingested:016x}',
+            'amount': amount_cents / 100,
+            'payment_method': method,
+            'card_brand': BRANDS[rng.randrange(4)] if method.endswith('card') else None,
+            # Usado só em partially_refunded (volume líquido)
+            'refunded_cents': amount_cents // 2,
+        }
+        previous = None
+        for status in FLOWS[method]:
+            aggregates.record_transition(transaction, previous, status, timestamp=timestamp)
+            previous = status
+            timestamp += step
+            ingested += 1
+    elapsed = time.perf_counter() - start
+    print(f'{ingested:,} transições em {elapsed:.2f}s ({ingested / elapsed:,.0f}/s)')
+
+    for granularity, buckets in (('minute', 60), ('hour', 24), ('day', 30)):
+        reads = 1000
+        start = time.perf_counter()
+        for _ in range(reads):
+            aggregates.snapshot(granularity, buckets, now=timestamp)
+        elapsed = time.perf_counter() - start
+        print(f'snapshot {granularity:6s} x{buckets:<3d} {elapsed / reads * 1e6:8.1f} µs')
+
+
+if __name__ == '__main__':
+    main()
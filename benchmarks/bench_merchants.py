@@ -0,0 +1,105 @@
+"""Benchmark: autenticação por chave de API com 1M de comerciantes
+
+Cadastra N comerciantes e mede authenticate() com o contexto em cache
+(conjunto quente), sem cache (comerciantes aleatórios entre todos),
+chaves erradas (prefixo existente e inexistente: o custo deve ser o
+mesmo) e o acréscimo por requisição numa rota Flask com
+@require_merchant.
+
+Uso: python benchmarks/bench_merchants.py [--merchants 1000000] [--requests 200000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+from src.routes import merchants
+from src.routes.merchants import MerchantRegistry, require_merchant
+
+
+def timed(function, keys):
+    start = time.perf_counter()
+    for key in keys:
+        function(key)
+    return (time.perf_counter() - start) / len(keys)
+
+
+def build_app(decorated):
+    app = Flask(__name__)
+
+    def handler():
+        return jsonify({'success': True})
+
+    if decorated:
+        handler = require_merchant(handler)
+    app.add_url_rule('/bench', 'bench', handler)
+    return app
+
+
+def bench_route(client, keys):
+    start = time.perf_counter()
+    for key in keys:
+        client.get('/bench', headers={'X-Api-Key': key})
+    return (time.perf_counter() - start) / len(keys)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--merchants', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--hot', type=int, default=10000, help='comerciantes no conjunto quente')
+    parser.add_argument('--cache-size', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    registry = MerchantRegistry(cache_size=args.cache_size)
+    keys = []
+    start = time.perf_counter()
+    for i in range(args.merchants):
+        _, api_key = registry.register(f'merchant_{i:07d}', f'Loja {i}', 'Sao Paulo', f'pix{i}@loja.com.br')
+        keys.append(api_key)
+    elapsed = time.perf_counter() - start
+    print(f'{args.merchants:,} comerciantes cadastrados em {elapsed:.1f} s ({elapsed / args.merchants * 1e6:.1f} us cada)')
+
+    hot = [rng.choice(keys[:args.hot]) for _ in range(args.requests)]
+    # Amostra nova a cada rodada: comerciantes fora do cache
+    cold_rounds = [[rng.choice(keys) for _ in range(args.requests // 10)] for _ in range(args.rounds)]
+    wrong_secret = [key[:-4] + 'AAAA' for key in hot[:args.requests // 10]]
+    unknown_prefix = ['sk_test_ffffffffffff' + key[20:] for key in hot[:args.requests // 10]]
+
+    for key in keys[:args.hot]:
+        registry.authenticate(key)
+    assert all(registry.authenticate(key) is not None for key in hot[:1000])
+    assert not any(registry.authenticate(key) for key in wrong_secret[:1000] + unknown_prefix[:1000])
+
+    results = {}
+    for cold in cold_rounds:
+        for label, sample in (('cache quente', hot), ('sem cache (aleatórios)', cold),
+                              ('segredo errado', wrong_secret), ('prefixo inexistente', unknown_prefix)):
+            elapsed = timed(registry.authenticate, sample)
+            results[label] = min(results.get(label, elapsed), elapsed)
+    for label, elapsed in results.items():
+        print(f'authenticate() {label}: {elapsed * 1e6:.2f} us ({1 / elapsed:,.0f}/s)')
+    print(f'cache: {registry.stats}')
+
+    merchants.merchant_registry = registry
+    route_keys = hot[:args.requests // 10]
+    clients = {decorated: build_app(decorated).test_client() for decorated in (False, True)}
+    best = {}
+    # Rodadas intercaladas, melhor de cada: reduz o ruído da máquina
+    for _ in range(args.rounds):
+        for decorated, client in clients.items():
+            elapsed = bench_route(client, route_keys)
+            best[decorated] = min(best.get(decorated, elapsed), elapsed)
+    plain, guarded = best[False], best[True]
+    print(f'rota Flask: {plain * 1e6:.1f} us sem autenticação, {guarded * 1e6:.1f} us com @require_merchant '
+          f'(+{(guarded - plain) * 1e6:.1f} us, {(guarded / plain - 1) * 100:+.1f}%)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Benchmark: verificação MFA (TOTP em cache x pyotp) e memória dos desafios ativos
+
+Mede verificações/s do caminho antigo (pyotp.TOTP novo por tentativa) e
+do MFAEngine (verificador em cache + controle de replay + consumo do
+desafio), confere que os códigos batem com o pyotp, e a memória de 1M de
+desafios ativos no formato compacto e no dict antigo.
+
+Uso: python benchmarks/bench_mfa.py [--users 10000] [--verifications 200000] [--challenges 1000000]
+"""
+import os
+import sys
+import time
+import pickle
+import argparse
+from datetime import datetime, timedelta
+
+import pyotp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes.mfa import MFAEngine, LocalSMSSender, TOTPVerifier, TOTP_INTERVAL
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+
+
+def check_conformance(secrets_):
+    now = time.time()
+    step = int(now // TOTP_INTERVAL)
+    for secret in secrets_[:1000]:
+        verifier = TOTPVerifier(secret)
+        totp = pyotp.TOTP(secret)
+        for offset in (-1, 0, 1):
+            assert verifier.code(step + offset) == totp.at(now + offset * TOTP_INTERVAL)
+    # Vetor da RFC 6238 (SHA-1, T = 59 s -> 94287082, 8 dígitos; 6 dígitos = 287082)
+    rfc = TOTPVerifier('GEZDGNBVGY3TQOJQGEZDGNBVGY3TQOJQ')
+    assert rfc.code(1) == '287082'
+    print('códigos conferem com pyotp e com o vetor da RFC 6238')
+
+
+def bench_pyotp(users, verifications):
+    now = time.time()
+    codes = [pyotp.TOTP(secret).at(now) for secret in users]
+    start = time.perf_counter()
+    for i in range(verifications):
+        j = i % len(users)
+        assert pyotp.TOTP(users[j]).verify(codes[j], valid_window=1)
+    return verifications / (time.perf_counter() - start)
+
+
+def bench_engine(users, verifications):
+    engine = MFAEngine({}, LocalSMSSender(), 'bench')
+    now = time.time()
+    codes = [pyotp.TOTP(secret).at(now) for secret in users]
+    user_ids = [f'user_{j}' for j in range(len(users))]
+    challenges = [engine.create_challenge(user_ids[i % len(users)], now).id for i in range(verifications)]
+    start = time.perf_counter()
+    for i in range(verifications):
+        j = i % len(users)
+        # Cada verificação é um login novo no mesmo passo: só o primeiro uso do código passa
+        try:
+            engine.verify(challenges[i], user_ids[j], 'authenticator', codes[j], users[j], now)
+        except Exception:
+            pass
+    elapsed = time.perf_counter() - start
+    assert engine.stats['verified'] == len(users)
+    assert engine.stats['replayed'] == verifications - len(users)
+    return verifications / elapsed, engine
+
+
+def bench_used_codes(users, steps):
+    engine = MFAEngine({}, LocalSMSSender(), 'bench')
+    now = time.time()
+    peak = 0
+    for s in range(steps):
+        at = now + s * TOTP_INTERVAL
+        for j, secret in enumerate(users):
+            challenge = engine.create_challenge(f'user_{j}', at)
+            engine.verify(challenge.id, f'user_{j}', 'authenticator', pyotp.TOTP(secret).at(at), secret, at)
+        peak = max(peak, len(engine.used_codes))
+    print(f'{steps * len(users)} logins em {steps} passos de {TOTP_INTERVAL}s: '
+          f'no máximo {peak} códigos usados em memória ({len(engine.used_codes.steps)} passos)')
+
+
+def bench_memory(count):
+    engine = MFAEngine({}, LocalSMSSender(), 'bench')
+    base = rss_mb()
+    for i in range(count):
+        engine.create_challenge(f'user_{i % 100000:06d}')
+    compact = rss_mb() - base
+    sample = next(iter(engine.challenges.values()))
+    print(f'{count} desafios ativos (MFAChallenge): +{compact:.0f} MB '
+          f'({compact * 1e6 / count:.0f} bytes/desafio), WAL {len(pickle.dumps(sample, protocol=pickle.HIGHEST_PROTOCOL))} bytes/registro')
+    engine.challenges.clear()
+
+    legacy = {}
+    base = rss_mb()
+    for i in range(count):
+        challenge_id = f'mfa_{i:016x}'
+        legacy[challenge_id] = {
+            'id': challenge_id,
+            'user_id': f'user_{i % 100000:06d}',
+            'created_at': datetime.utcnow().isoformat(),
+            'expires_at': (datetime.utcnow() + timedelta(minutes=5)).isoformat(),
+            'attempts': 0,
+            'verified': False
+        }
+    old = rss_mb() - base
+    print(f'{count} desafios ativos (dict antigo): +{old:.0f} MB ({old * 1e6 / count:.0f} bytes/desafio), '
+          f'WAL {len(pickle.dumps(next(iter(legacy.values())), protocol=pickle.HIGHEST_PROTOCOL))} bytes/registro')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--verifications', type=int, default=200000)
+    parser.add_argument('--challenges', type=int, default=1000000)
+    args = parser.parse_args()
+
+    users = [pyotp.random_base32() for _ in range(args.users)]
+    check_conformance(users)
+
+    old = bench_pyotp(users, min(args.verifications, 50000))
+    print(f'pyotp.TOTP por tentativa: {old:,.0f} verificações/s')
+    new, engine = bench_engine(users, args.verifications)
+    print(f'MFAEngine: {new:,.0f} verificações/s ({new / old:.1f}x), '
+          f'{len(engine.verifiers)} verificadores em cache, {engine.stats["replayed"]} replays recusados')
+
+    bench_used_codes(users[:1000], 10)
+    bench_memory(args.challenges)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark: conciliação de um retorno CNAB 240 grande com memória limitada
+
+Gera um arquivo com --lines linhas (pares de segmentos T/U) e concilia
+contra --transactions transações em aberto. Parte dos registros é
+duplicada, com valor divergente ou sem correspondência.
+
+Uso: python benchmarks/bench_reconciliation.py [--lines 10000000] [--transactions 1000000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import resource
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes.reconciliation import reconcile
+
+
+def segment_t(transaction_id):
+    line = '001' + '0001' + '3' + '00001' + 'T' + ' ' * 91
+    line += transaction_id.ljust(25)
+    return line.ljust(240)
+
+
+def segment_u(amount_cents):
+    line = '001' + '0001' + '3' + '00002' + 'U' + ' ' * 63
+    line += f'{amount_cents:015d}'
+    line = line.ljust(145) + '19102026'
+    return line.ljust(240)
+
+
+def build_file(path, records, transaction_ids, amounts, rng):
+    with open(path, 'w', newline='') as f:
+        for i in range(records):
+            roll = rng.random()
+            index = i % len(transaction_ids)
+            if roll < 0.02:
+                transaction_id, amount = f'tx_unknown{i:09d}', 1000
+            elif roll < 0.04:
+                transaction_id, amount = transaction_ids[index], amounts[index] + 1
+            else:
+                transaction_id, amount = transaction_ids[index], amounts[index]
+            f.write(segment_t(transaction_id) + '\r\n')
+            f.write(segment_u(amount) + '\r\n')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=10000000)
+    parser.add_argument('--transactions', type=int, default=1000000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    transactions = {}
+    transaction_ids = []
+    amounts = []
+    for i in range(args.transactions):
+        transaction_id = f'tx_{i:016x}'
+        cents = rng.randint(500, 500000)
+        transactions[transaction_id] = {
+            'id': transaction_id, 'amount': cents / 100,
+            'payment_method': 'boleto', 'status': 'waiting_payment'
+        }
+        transaction_ids.append(transaction_id)
+        amounts.append(cents)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'retorno.ret')
+        start = time.perf_counter()
+        build_file(path, args.lines // 2, transaction_ids, amounts, rng)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f'arquivo: {args.lines:,} linhas, {size_mb:,.0f} MB (gerado em {time.perf_counter() - start:.1f}s)')
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        with open(path, encoding='latin-1', newline='') as f, open(os.devnull, 'w') as exceptions:
+            result = reconcile(f, transactions, exceptions_output=exceptions)
+        elapsed = time.perf_counter() - start
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(f'conciliação: {elapsed:.2f}s ({args.lines / elapsed:,.0f} linhas/s)')
+    print(f'resumo: {result["summary"]}')
+    print(f'pico de memória (RSS): {rss_after / 1024:,.0f} MB, '
+          f'acréscimo durante a conciliação: {(rss_after - rss_before) / 1024:,.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
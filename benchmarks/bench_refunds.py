@@ -0,0 +1,81 @@
+"""Benchmark: livro de estornos com 1M estornos em 100k transações
+
+Uso: python benchmarks/bench_refunds.py [--transactions 100000] [--refunds 1000000] [--threads 8]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes import refunds
+from src.routes.refunds import RefundError, reserve_refund, confirm_refund, to_cents
+
+
+def build_transactions(count):
+    return [
+        {'id': f'tx_{i:016x}', 'amount': 1000.00, 'status': 'captured'}
+        for i in range(count)
+    ]
+
+
+def worker(transactions, operations, seed, counters):
+    rng = random.Random(seed)
+    ok = rejected = 0
+    for _ in range(operations):
+        transaction = transactions[rng.randrange(len(transactions))]
+        cents = rng.randint(1, 20000)
+        try:
+            reserve_refund(transaction, cents)
+        except RefundError:
+            rejected += 1
+            continue
+        confirm_refund(transaction, cents)
+        ok += 1
+    counters.append((ok, rejected))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transactions', type=int, default=100000)
+    parser.add_argument('--refunds', type=int, default=1000000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    for threads in (1, args.threads):
+        refunds.refunds_db.clear()
+        refunds.refunds_by_transaction.clear()
+        transactions = build_transactions(args.transactions)
+        counters = []
+
+        per_thread = args.refunds // threads
+        workers = [
+            threading.Thread(target=worker, args=(transactions, per_thread, seed, counters))
+            for seed in range(threads)
+        ]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        ok = sum(c[0] for c in counters)
+        rejected = sum(c[1] for c in counters)
+        # Nenhuma transação pode ter estornado mais que o seu valor
+        overdrawn = sum(1 for tx in transactions if tx.get('refunded_cents', 0) > to_cents(tx['amount']))
+        ledger_ok = all(
+            sum(to_cents(refunds.refunds_db[r]['amount']) for r in refunds.refunds_by_transaction.get(tx['id'], []))
+            == tx.get('refunded_cents', 0)
+            for tx in transactions
+        )
+        print(f'{threads:2d} thread(s): {ok + rejected:,} operações em {elapsed:6.2f}s '
+              f'({(ok + rejected) / elapsed:,.0f} op/s)  aceitos {ok:,}  recusados {rejected:,}  '
+              f'excedidos {overdrawn}  livro consistente {ledger_ok}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Benchmark: lote de liquidação (repasse) com pool de processos
+
+Soma 20M transações de 100k comerciantes com 1, 2, 4... processos (até
+os núcleos da máquina) e grava os arquivos de repasse. As colunas de cada
+partição são geradas dentro do processo (um bloco sintético repetido), o
+que mede a soma e a gravação sem copiar 20M linhas entre processos. A
+varredura das transações e a marcação no processo principal são medidas
+à parte, com dicionários reais.
+
+Uso: python benchmarks/bench_settlement.py [--transactions 20000000] [--merchants 100000] [--scan 200000]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from array import array
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes.settlement import SettlementEngine, settle_partition
+
+CHUNK_ROWS = 1 << 18
+
+
+class SyntheticChunks:
+    """Colunas de uma partição: um bloco de CHUNK_ROWS linhas repetido até `count`"""
+
+    def __init__(self, merchants, count, seed):
+        self.merchants = merchants
+        self.count = count
+        self.seed = seed
+
+    def __iter__(self):
+        rng = random.Random(self.seed)
+        rows = min(self.count, CHUNK_ROWS)
+        merchants = [i % self.merchants for i in range(rows)]
+        rng.shuffle(merchants)
+        chunk = (array('l', merchants),
+                 array('b', [rng.randrange(4) for _ in range(rows)]),
+                 array('q', [rng.randrange(100, 500000) for _ in range(rows)]),
+                 array('q', [-1 if rng.random() < 0.9 else rng.randrange(10, 5000) for _ in range(rows)]),
+                 array('q', [0 if rng.random() < 0.97 else rng.randrange(100, 5000) for _ in range(rows)]))
+        remaining = self.count
+        while remaining > 0:
+            if remaining >= rows:
+                yield chunk
+            else:
+                yield tuple(column[:remaining] for column in chunk)
+            remaining -= rows
+
+
+def bench_pool(transactions, merchants, workers, directory):
+    tasks = []
+    for part in range(workers):
+        ids = [f'merchant_{m:07d}' for m in range(part, merchants, workers)]
+        tasks.append((os.path.join(directory, f'payouts-{part:03d}.csv'), ids,
+                      SyntheticChunks(len(ids), transactions // workers, part)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(len, [[]] * workers))    # processos prontos antes de medir
+        start = time.perf_counter()
+        files = list(pool.map(settle_partition, tasks))
+        elapsed = time.perf_counter() - start
+    return elapsed, sum(part['merchants'] for part in files)
+
+
+def bench_scan(count, merchants, directory):
+    """Varredura + pool (1 processo) + marcação com dicionários de transação reais"""
+    rng = random.Random(7)
+    methods = ('credit_card', 'debit_card', 'pix', 'boleto')
+    transactions = {}
+    for i in range(count):
+        amount = round(rng.uniform(1, 5000), 2)
+        transactions[f'tx_{i:016x}'] = {
+            'id': f'tx_{i:016x}', 'merchant_id': f'merchant_{rng.randrange(merchants):07d}',
+            'status': 'paid', 'amount': amount, 'payment_method': rng.choice(methods),
+            'created_at': '2026-01-01T00:00:00', 'settlement': {'amount': amount},
+            'refunded_cents': 0 if rng.random() < 0.97 else 100,
+        }
+    engine = SettlementEngine(directory, workers=1, batches={})
+    cutoff = datetime(2026, 1, 2)
+
+    start = time.perf_counter()
+    parts, marks = engine.collect(transactions, 'stl_bench', cutoff, 1)
+    collect = time.perf_counter() - start
+    start = time.perf_counter()
+    engine.mark(marks, 'stl_bench', cutoff.isoformat())
+    mark = time.perf_counter() - start
+    engine.batches.clear()
+    start = time.perf_counter()
+    engine.run(transactions, cutoff, 'stl_bench')
+    total = time.perf_counter() - start
+    print(f'processo principal ({count:,} transações): varredura {count / collect:,.0f}/s, '
+          f'marcação {count / mark:,.0f}/s, lote completo {total:.2f} s')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transactions', type=int, default=20000000)
+    parser.add_argument('--merchants', type=int, default=100000)
+    parser.add_argument('--scan', type=int, default=200000)
+    parser.add_argument('--workers', default=None, help='lista, ex.: 1,2,4 (padrão: potências de 2 até os núcleos)')
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        counts = [int(value) for value in args.workers.split(',')]
+    else:
+        counts = [1]
+        while counts[-1] * 2 <= cores:
+            counts.append(counts[-1] * 2)
+
+    directory = tempfile.mkdtemp(prefix='valora-payouts-')
+    try:
+        print(f'{args.transactions:,} transações, {args.merchants:,} comerciantes, {cores} núcleos')
+        base = None
+        for workers in counts:
+            elapsed, written = bench_pool(args.transactions, args.merchants, workers, directory)
+            base = base or elapsed
+            print(f'{workers} processo(s): {elapsed:.2f} s ({args.transactions / elapsed:,.0f} transações/s, '
+                  f'aceleração {base / elapsed:.2f}x, {written:,} linhas de repasse)')
+        bench_scan(args.scan, min(args.merchants, args.scan), directory)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark: requisições/s do serve() com manifesto vs. send_from_directory
+
+Uso: python benchmarks/bench_static_assets.py [--requests 20000]
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, send_from_directory
+from src.static_assets import StaticAssetManifest, asset_response
+
+
+def build_static_folder(root):
+    """Cria uma pasta parecida com o export do Next.js"""
+    os.makedirs(os.path.join(root, '_next', 'static', 'chunks'), exist_ok=True)
+    with open(os.path.join(root, 'index.html'), 'w') as f:
+        f.write('<!doctype html><html><body>' + '<div>valora</div>' * 400 + '</body></html>')
+    for i in range(50):
+        path = os.path.join(root, '_next', 'static', 'chunks', f'chunk-{i:04d}.js')
+        with open(path, 'w') as f:
+            f.write(f'/* chunk {i} */' + 'function f(){return 42}' * 2000)
+    with open(os.path.join(root, 'favicon.ico'), 'wb') as f:
+        f.write(os.urandom(4096))
+
+
+def legacy_app(root):
+    app = Flask(__name__, static_folder=root)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        if path != "" and os.path.exists(os.path.join(root, path)):
+            return send_from_directory(root, path)
+        return send_from_directory(root, 'index.html')
+
+    return app
+
+
+def manifest_app(root):
+    app = Flask(__name__, static_folder=root)
+    manifest = StaticAssetManifest(root)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        asset = manifest.lookup(path) or manifest.index
+        return asset_response(asset)
+
+    return app
+
+
+def run(app, paths, total, headers):
+    client = app.test_client()
+    start = time.perf_counter()
+    sent = 0
+    for i in range(total):
+        response = client.get('/' + paths[i % len(paths)], headers=headers)
+        sent += len(response.data)
+    elapsed = time.perf_counter() - start
+    return total / elapsed, sent / total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        build_static_folder(root)
+        paths = [f'_next/static/chunks/chunk-{i:04d}.js' for i in range(50)] + ['', 'favicon.ico', 'dashboard']
+        headers = {'Accept-Encoding': 'gzip, deflate, br'}
+
+        for name, factory in (('send_from_directory', legacy_app), ('manifest', manifest_app)):
+            rps, avg_bytes = run(factory(root), paths, args.requests, headers)
+            print(f'{name:20s} {rps:10.0f} req/s  {avg_bytes:10.0f} bytes/resp')
+
+
+if __name__ == '__main__':
+    main()
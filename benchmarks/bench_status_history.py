@@ -0,0 +1,75 @@
+"""Benchmark: histórico de status (gravação, replay e materialização)
+
+Uso: python benchmarks/bench_status_history.py [--events 10000000] [--transitions 4]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes.status_history import EVENT, StatusHistory
+
+FLOW = [
+    (None, 'pending', 'create'),
+    ('pending', 'approved', 'create'),
+    ('approved', 'captured', 'capture'),
+    ('captured', 'refunded', 'refund'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=10000000)
+    parser.add_argument('--transitions', type=int, default=4, help='Eventos por transação (1-4)')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'status.events')
+    flow = FLOW[:max(1, min(args.transitions, len(FLOW)))]
+    transactions = [{'id': f'tx_{i:016x}'} for i in range(args.events // len(flow))]
+
+    history = StatusHistory(path)
+    start = time.perf_counter()
+    # Transições intercaladas, como em produção (eventos de uma transação espalhados no log)
+    for step, (previous, status, source) in enumerate(flow):
+        timestamp = 1.7e9 + step
+        for transaction in transactions:
+            history.record(transaction, previous, status, source, timestamp)
+    elapsed = time.perf_counter() - start
+    events = history.event_count
+    history.close()
+    print(f'gravação: {events} eventos em {elapsed:.1f}s ({elapsed / events * 1e6:.2f} µs/evento), '
+          f'{os.path.getsize(path) / 1e6:.0f} MB ({EVENT.size} bytes/evento)')
+    del history, transactions
+
+    start = time.perf_counter()
+    history = StatusHistory()
+    history.path = path
+    replayed = history.replay()
+    replay_elapsed = time.perf_counter() - start
+    print(f'replay: {replayed} eventos, {len(history.heads)} transações em {replay_elapsed:.2f}s '
+          f'({replayed / replay_elapsed / 1e6:.1f} M eventos/s)')
+    print(f'projeção para 100M eventos: {replay_elapsed / replayed * 100e6:.0f}s')
+
+    start = time.perf_counter()
+    states = history.materialize()
+    elapsed = time.perf_counter() - start
+    print(f'materialização: {len(states)} transações em {elapsed:.2f}s')
+    assert all(status == flow[-1][1] for status, _ in states.values())
+
+    start = time.perf_counter()
+    lookups = min(100000, len(states))
+    for transaction_id in list(states)[:lookups]:
+        history.history(transaction_id)
+    elapsed = time.perf_counter() - start
+    print(f'history(): {elapsed / lookups * 1e6:.2f} µs ({len(flow)} eventos por transação)')
+
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
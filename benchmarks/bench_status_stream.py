@@ -0,0 +1,117 @@
+"""Benchmark: checkouts esperando no stream de status (long-poll via ASGI, em processo)
+
+Abre N esperas simultâneas em GET /api/v1/payment/<id>/stream, publica as
+transições a partir de uma thread (como o webhook PIX no pool WSGI) e
+mede memória, threads e a latência de entrega.
+
+Uso: python benchmarks/bench_status_stream.py [--clients 50000] [--publishers 4] [--rate 2000]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes.status_stream import StatusBroker, handle_stream
+from src.routes.merchants import SANDBOX_MERCHANT
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+
+
+def set_paid(broker, transaction):
+    # Equivalente a set_transaction_status(transaction, 'paid', 'webhook')
+    transaction['status'] = 'paid'
+    transaction['version'] += 1
+    transaction['published_at'] = time.perf_counter()
+    broker.publish(transaction, 'waiting_payment', 'paid', 'webhook')
+
+
+async def run(clients, publishers, rate):
+    broker = StatusBroker()
+    for i in range(clients):
+        transaction_id = f'tx_{i:016x}'
+        broker.transactions[transaction_id] = {
+            'id': transaction_id, 'status': 'waiting_payment', 'version': 1,
+            'updated_at': '2025-01-01T00:00:00'
+        }
+
+    delivered = {}
+
+    async def client(transaction_id):
+        scope = {'type': 'http', 'method': 'GET', 'path': f'/api/v1/payment/{transaction_id}/stream',
+                 'query_string': b'version=1&timeout=30',
+                 'headers': [(b'x-api-key', SANDBOX_MERCHANT['api_key'].encode())]}
+
+        async def receive():
+            # Cliente nunca desconecta
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                delivered[transaction_id] = time.perf_counter()
+
+        await handle_stream(scope, receive, send, broker)
+
+    base_rss = rss_mb()
+    base_threads = threading.active_count()
+    start = time.perf_counter()
+    tasks = [asyncio.ensure_future(client(transaction_id)) for transaction_id in broker.transactions]
+    while broker.waiting < clients:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    print(f'{clients} checkouts esperando em {elapsed:.2f}s: +{rss_mb() - base_rss:.0f} MB '
+          f'({(rss_mb() - base_rss) * 1e6 / clients:.0f} bytes/espera), '
+          f'{threading.active_count() - base_threads} threads extras')
+
+    transactions = list(broker.transactions.values())
+    # Primeiro trecho em ritmo constante (latência), o resto em rajada (vazão)
+    paced = min(len(transactions), int(rate * 5))
+
+    def publisher(part):
+        start = time.perf_counter()
+        for i, transaction in enumerate(transactions[part:paced:publishers]):
+            delay = start + i * publishers / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            set_paid(broker, transaction)
+        burst_started[part] = time.perf_counter()
+        for transaction in transactions[paced + part::publishers]:
+            set_paid(broker, transaction)
+
+    burst_started = {}
+
+    threads = [threading.Thread(target=publisher, args=(part,)) for part in range(publishers)]
+    for thread in threads:
+        thread.start()
+    await asyncio.gather(*tasks)
+    for thread in threads:
+        thread.join()
+
+    latencies = sorted(delivered[t['id']] - t['published_at'] for t in transactions[:paced])
+    print(f'{paced} transições a {rate}/s: latência publicação -> resposta '
+          f'p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms')
+    burst = len(transactions) - paced
+    if burst:
+        burst_elapsed = max(delivered[t['id']] for t in transactions[paced:]) - min(burst_started.values())
+        print(f'{burst} transições em rajada entregues em {burst_elapsed:.2f}s ({burst / burst_elapsed:,.0f}/s), '
+              f'{broker.stats["wakeups"]} despertares do loop para {broker.stats["delivered"]} entregas')
+    print(f'polling equivalente (a cada 2 s): {clients / 2:,.0f} requisições/s só para consultar status')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=50000)
+    parser.add_argument('--publishers', type=int, default=4)
+    parser.add_argument('--rate', type=int, default=2000, help='Transições/s no trecho de latência')
+    args = parser.parse_args()
+    asyncio.run(run(args.clients, args.publishers, args.rate))
+
+
+if __name__ == '__main__':
+    main()
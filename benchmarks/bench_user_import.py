@@ -0,0 +1,61 @@
+"""Benchmark: usuários importados por segundo com 1, 4 e 8 processos de bcrypt
+
+Uso: python benchmarks/bench_user_import.py [--users 400] [--rounds 10] [--workers 1 4 8]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes.auth import validate_register_body, new_user
+from src.routes.user_import import UserImporter, read_rows
+
+
+def ndjson_lines(count, prefix):
+    for i in range(count):
+        yield json.dumps({
+            'email': f'{prefix}{i}@parceiro.com.br',
+            'password': f'Parceiro@Senha{i:06d}',
+            'first_name': 'Usuario',
+            'last_name': f'Parceiro {i}',
+            'phone': f'+55119{i:08d}',
+            'country': 'BR',
+            'business_type': 'small_business'
+        }) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=400)
+    parser.add_argument('--rounds', type=int, default=10, help='custo bcrypt (produção usa 12)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    args = parser.parse_args()
+    print(f'CPUs disponíveis: {os.cpu_count()}')
+
+    for workers in args.workers:
+        users = {}
+
+        def insert_batch(batch):
+            for user in batch:
+                users[user['email']] = user
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Aquecer os processos antes de medir
+            list(executor.map(abs, range(workers)))
+            importer = UserImporter(users, validate_register_body, new_user, insert_batch,
+                                    executor, rounds=args.rounds)
+            start = time.perf_counter()
+            for _ in importer.run(read_rows(ndjson_lines(args.users, f'w{workers}_'), 'ndjson')):
+                pass
+            elapsed = time.perf_counter() - start
+
+        assert importer.summary['created'] == args.users
+        print(f'{workers} processo(s): {args.users / elapsed:,.0f} usuários/s ({elapsed:.2f}s)')
+
+
+if __name__ == '__main__':
+    main()
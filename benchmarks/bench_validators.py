@@ -0,0 +1,96 @@
+"""Benchmark: custo de validação por requisição (esquemas compilados x checagens ad hoc)
+
+Uso: python benchmarks/bench_validators.py [--iterations 200000]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes.validators import compile_schema, field, validate_email, validate_phone, validate_country, \
+    password_errors, BUSINESS_TYPES
+
+REGISTER_BODY = {
+    'email': 'cliente@exemplo.com.br',
+    'password': 'Senha@Forte2025!',
+    'first_name': 'Maria',
+    'last_name': 'Silva',
+    'phone': '+5511988887777',
+    'country': 'BR',
+    'business_type': 'small_business',
+    'accept_terms': True,
+}
+
+validate_register_body = compile_schema({
+    'email': field(max_length=255, test=validate_email, message='E-mail inválido'),
+    'password': field(explain=password_errors, message='Senha não atende aos critérios de segurança'),
+    'first_name': field(max_length=50),
+    'last_name': field(max_length=50),
+    'phone': field(test=validate_phone, message='Telefone inválido'),
+    'country': field(test=validate_country, message='Código de país inválido'),
+    'business_type': field(choices=BUSINESS_TYPES, message='Tipo de negócio inválido'),
+    'accept_terms': field('boolean', required=False),
+})
+
+
+def adhoc_register(data):
+    """Validação como era feita nos handlers (padrões recompilados/consultados a cada chamada)"""
+    for name in ['email', 'password', 'first_name', 'last_name', 'phone', 'country', 'business_type']:
+        if name not in data:
+            return f'Campo obrigatório: {name}'
+    if re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', data['email']) is None:
+        return 'E-mail inválido'
+    password = data['password']
+    errors = []
+    if len(password) < 12:
+        errors.append('Senha deve ter pelo menos 12 caracteres')
+    if not re.search(r'[a-z]', password):
+        errors.append('Senha deve conter pelo menos uma letra minúscula')
+    if not re.search(r'[A-Z]', password):
+        errors.append('Senha deve conter pelo menos uma letra maiúscula')
+    if not re.search(r'\d', password):
+        errors.append('Senha deve conter pelo menos um número')
+    if not re.search(r'[@$!%*?&]', password):
+        errors.append('Senha deve conter pelo menos um caractere especial')
+    if password.lower() in ['password', '123456789', 'qwerty123', 'admin123']:
+        errors.append('Senha muito comum')
+    if errors:
+        return errors
+    if re.match(r'^\+?[1-9]\d{1,14}$', data['phone']) is None:
+        return 'Telefone inválido'
+    if data['country'] not in ['BR', 'US', 'CA', 'MX', 'AR', 'CL', 'CO', 'PE', 'UY']:
+        return 'Código de país inválido'
+    return None
+
+
+def timed(label, function, body, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function(body)
+    elapsed = time.perf_counter() - start
+    print(f'{label:>28}: {elapsed / iterations * 1e6:.2f} µs/requisição')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    invalid = dict(REGISTER_BODY, email='invalido', password='fraca', phone='abc')
+    print('todos os erros de uma vez:', [e['message'] for e in validate_register_body(invalid)])
+
+    timed('ad hoc (válido)', adhoc_register, REGISTER_BODY, args.iterations)
+    timed('compilado (válido)', validate_register_body, REGISTER_BODY, args.iterations)
+    timed('compilado (3 erros)', validate_register_body, invalid, args.iterations)
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        password_errors(REGISTER_BODY['password'])
+    print(f'{"senha (passada única)":>28}: {(time.perf_counter() - start) / args.iterations * 1e6:.2f} µs')
+
+
+if __name__ == '__main__':
+    main()
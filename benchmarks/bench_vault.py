@@ -0,0 +1,100 @@
+"""Benchmark: cofre de tokens (tokens/s unitário e em lote, latência de lookup)
+
+O lookup é medido com o cofre populado com --cards cartões. Para 50M,
+use --cards 50000000 (requer dezenas de GB de RAM).
+
+Uso: python benchmarks/bench_vault.py [--cards 1000000] [--batch 1000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.routes.vault import CardVault
+
+
+def luhn_complete(prefix):
+    digits = [int(d) for d in prefix]
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        if i % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return prefix + str((10 - total % 10) % 10)
+
+
+def make_card(i):
+    return {
+        'number': luhn_complete(f'411111{i:09d}'),
+        'exp_month': 1 + i % 12,
+        'exp_year': 2027 + i % 5,
+        'holder_name': 'CLIENTE TESTE'
+    }
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cards', type=int, default=1000000)
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--samples', type=int, default=100000)
+    args = parser.parse_args()
+
+    vault = CardVault(cache_size=10000)
+    sample = [make_card(i) for i in range(min(args.samples, args.cards))]
+
+    start = time.perf_counter()
+    for card in sample:
+        vault.tokenize(card)
+    elapsed = time.perf_counter() - start
+    print(f'tokenize unitário: {len(sample) / elapsed:,.0f} tokens/s')
+
+    vault = CardVault(cache_size=10000)
+    start = time.perf_counter()
+    for offset in range(0, len(sample), args.batch):
+        vault.tokenize_many(sample[offset:offset + args.batch])
+    elapsed = time.perf_counter() - start
+    print(f'tokenize em lote ({args.batch}): {len(sample) / elapsed:,.0f} tokens/s')
+
+    start = time.perf_counter()
+    for card in sample:
+        vault.token_for(card)
+    elapsed = time.perf_counter() - start
+    print(f'token_for (cartão já no cofre): {len(sample) / elapsed:,.0f} tokens/s')
+
+    # Popula o cofre até --cards
+    start = time.perf_counter()
+    for i in range(len(sample), args.cards):
+        vault.tokenize(make_card(i))
+    print(f'cofre populado com {len(vault.records):,} cartões em {time.perf_counter() - start:.1f}s')
+
+    rng = random.Random(3)
+    tokens = [vault.token_for(make_card(rng.randrange(args.cards))) for _ in range(args.samples)]
+
+    for name, token_list in (('frio (aleatório)', tokens), ('quente (LRU)', tokens[:1000] * (args.samples // 1000))):
+        latencies = []
+        for token in token_list:
+            start = time.perf_counter()
+            vault.detokenize(token)
+            latencies.append(time.perf_counter() - start)
+        print(f'detokenize {name:18s} p50 {percentile(latencies, 0.5) * 1e6:6.1f} µs  '
+              f'p99 {percentile(latencies, 0.99) * 1e6:6.1f} µs')
+
+    start = time.perf_counter()
+    for offset in range(0, len(tokens), args.batch):
+        vault.detokenize_many(tokens[offset:offset + args.batch])
+    elapsed = time.perf_counter() - start
+    print(f'detokenize em lote ({args.batch}): {len(tokens) / elapsed:,.0f} tokens/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,447 @@
+"""Gerador de carga da API Valora (cenários roteirizados, chegadas em malha aberta)
+
+Cenários:
+    checkout     criação de pagamentos (mistura cartão / PIX / boleto)
+    status_poll  consultas de status de cobranças PIX em aberto
+    login_mfa    login + verificação MFA (TOTP)
+    webhook      webhooks PIX assinados para cobranças em aberto
+    dashboard    leituras do relatório do comerciante
+
+As chegadas seguem um processo de Poisson (ou intervalo constante) na
+taxa pedida, independentemente das respostas: uma requisição atrasada
+não adia as próximas, e a latência é medida a partir do instante
+previsto de chegada (inclui a fila), evitando a omissão coordenada de um
+gerador em malha fechada.
+
+Por padrão a aplicação roda no próprio processo (cliente de teste do
+Flask, com as mesmas rotas do main.py); com --url as requisições vão
+por HTTP a um servidor local (python main.py, uvicorn src.asgi:asgi_app).
+O relatório JSON traz vazão, p50/p99/p999 e taxa de erros por cenário;
+com --baseline a execução falha (código 1) se houver regressão.
+
+Uso: python benchmarks/loadgen.py [--scenario checkout=200,status_poll=500] [--duration 30]
+         [--url http://127.0.0.1:5000] [--output relatorio.json]
+         [--baseline base.json --tolerance 0.2] [--save-baseline base.json]
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import heapq
+import random
+import itertools
+import hashlib
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_RATES = {'checkout': 20, 'status_poll': 100, 'login_mfa': 1, 'webhook': 20, 'dashboard': 5}
+DEFAULT_MIX = {'credit_card': 60, 'pix': 30, 'boleto': 10}
+TEST_CARD = {'number': '4111111111111111', 'exp_month': 12, 'exp_year': 2030, 'cvc': 123,
+             'holder_name': 'CLIENTE CARGA'}
+PASSWORD = 'Carga@123456'
+
+
+def parse_weights(text, defaults):
+    """'a=1,b=2' -> {'a': 1.0, 'b': 2.0} (chaves conhecidas apenas)"""
+    if not text:
+        return dict(defaults)
+    weights = {}
+    for part in text.split(','):
+        name, _, value = part.partition('=')
+        name = name.strip()
+        if name not in defaults:
+            raise SystemExit(f'desconhecido: {name} (opções: {", ".join(defaults)})')
+        weights[name] = float(value) if value else defaults[name]
+    return weights
+
+
+class InProcessDriver:
+    """Chama a aplicação WSGI no próprio processo (um cliente de teste por thread)"""
+
+    mode = 'in-process'
+
+    def __init__(self, app, headers=None):
+        self.app = app
+        self.headers = headers or {}
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, data=body, headers={**self.headers, **(headers or {})},
+                               content_type='application/json' if body is not None else None)
+        return response.status_code, response.get_data()
+
+
+class HttpDriver:
+    """Requisições HTTP a um servidor local (uma conexão keep-alive por thread)"""
+
+    mode = 'http'
+
+    def __init__(self, url, timeout=30, headers=None):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.headers = headers or {}
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        headers = {**self.headers, **(headers or {})}
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # Conexão keep-alive fechada pelo servidor: reabre uma vez
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+
+def build_app():
+    """App Flask com as rotas da API (mesmos blueprints do main.py)"""
+    from flask import Flask
+    from src.routes.auth import auth_bp
+    from src.routes.payment import payment_bp
+    app = Flask(__name__)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(payment_bp)
+    return app
+
+
+class Scenario:
+    """Um tipo de chegada; run() faz as requisições de uma chegada e devolve o status final"""
+
+    name = None
+
+    def setup(self, driver, args):
+        pass
+
+    def run(self, driver, rng):
+        raise NotImplementedError
+
+
+def payment_body(method, rng, sequence):
+    body = {
+        'amount': round(rng.uniform(5, 500), 2),
+        'currency': 'BRL',
+        'payment_method': method,
+        'customer': {'id': f'cust_carga_{sequence % 5000}', 'email': f'cliente{sequence % 5000}@carga.test',
+                     'document': f'{sequence % 5000:011d}'},
+        'description': 'Carga'
+    }
+    if method == 'credit_card':
+        body['card'] = TEST_CARD
+    return body
+
+
+def create_open_pix(driver, count):
+    """Cobranças PIX em aberto para os cenários de consulta e webhook"""
+    rng = random.Random(7)
+    ids = []
+    for i in range(count):
+        status, data = driver.request('POST', '/api/v1/payment/create',
+                                      json.dumps(payment_body('pix', rng, i)).encode())
+        if status == 200:
+            ids.append(json.loads(data)['data']['transaction_id'])
+    if not ids:
+        raise SystemExit('não foi possível criar cobranças PIX para o cenário')
+    return ids
+
+
+class Checkout(Scenario):
+    name = 'checkout'
+
+    def setup(self, driver, args):
+        mix = parse_weights(args.checkout_mix, DEFAULT_MIX)
+        self.methods = list(mix)
+        self.weights = [mix[method] for method in self.methods]
+        self.sequence = itertools.count()
+
+    def run(self, driver, rng):
+        method = rng.choices(self.methods, self.weights)[0]
+        body = json.dumps(payment_body(method, rng, next(self.sequence))).encode()
+        return driver.request('POST', '/api/v1/payment/create', body)[0]
+
+
+class StatusPoll(Scenario):
+    name = 'status_poll'
+
+    def setup(self, driver, args):
+        self.ids = create_open_pix(driver, args.open_charges)
+
+    def run(self, driver, rng):
+        return driver.request('GET', f'/api/v1/payment/{rng.choice(self.ids)}')[0]
+
+
+class Webhook(Scenario):
+    name = 'webhook'
+
+    def setup(self, driver, args):
+        self.ids = create_open_pix(driver, args.open_charges)
+        self.secret = args.webhook_secret.encode()
+
+    def run(self, driver, rng):
+        body = json.dumps({'transaction_id': rng.choice(self.ids), 'status': 'paid'}).encode()
+        signature = hmac.new(self.secret, body, hashlib.sha256).hexdigest()
+        return driver.request('POST', '/api/v1/webhook/pix', body, {'X-Webhook-Signature': signature})[0]
+
+
+class Dashboard(Scenario):
+    name = 'dashboard'
+
+    def run(self, driver, rng):
+        granularity = rng.choice(('minute', 'hour', 'day'))
+        return driver.request('GET', f'/api/v1/merchant/dashboard?granularity={granularity}&buckets=24')[0]
+
+
+class LoginMFA(Scenario):
+    """Login seguido da verificação TOTP
+
+    Cada código TOTP vale uma vez por usuário e passo de 30 s, então as
+    contas são usadas em rodízio (com --users >= 60 x taxa nenhuma repete
+    o passo); no modo em processo elas são criadas na base, via HTTP vêm
+    de --accounts (NDJSON email/password/mfa_secret). Sem segredo
+    conhecido, a chegada faz só o login.
+    """
+
+    name = 'login_mfa'
+
+    def setup(self, driver, args):
+        if args.accounts:
+            with open(args.accounts, encoding='utf-8') as f:
+                self.accounts = [json.loads(line) for line in f if line.strip()]
+        elif driver.mode == 'in-process':
+            self.accounts = create_accounts(args.users)
+        else:
+            self.accounts = [{'email': 'admin@valorapay.com', 'password': 'Admin@123456', 'mfa_secret': None}]
+        self._turn = itertools.count()
+
+    def run(self, driver, rng):
+        import pyotp
+        account = self.accounts[next(self._turn) % len(self.accounts)]
+        body = json.dumps({'email': account['email'], 'password': account['password']}).encode()
+        status, data = driver.request('POST', '/api/v1/auth/login', body)
+        if status != 200 or not account.get('mfa_secret'):
+            return status
+        session_token = json.loads(data)['session_token']
+        body = json.dumps({'session_token': session_token, 'method': 'authenticator',
+                           'code': pyotp.TOTP(account['mfa_secret']).now()}).encode()
+        return driver.request('POST', '/api/v1/auth/mfa/verify', body)[0]
+
+
+def create_accounts(count):
+    """Contas de carga direto na base (um único hash bcrypt para todas)"""
+    import bcrypt
+    from src.routes.auth import new_user, insert_users
+    password_hash = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    users = []
+    for i in range(count):
+        user = new_user({'email': f'carga{i}@valorapay.test', 'first_name': 'Carga', 'last_name': str(i),
+                         'phone': '+5511900000000', 'country': 'BR', 'business_type': 'small_business'},
+                        password_hash)
+        user['mfa_enabled'] = True
+        users.append(user)
+    insert_users(users)
+    return [{'email': user['email'], 'password': PASSWORD, 'mfa_secret': user['mfa_secret']} for user in users]
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (Checkout, StatusPoll, LoginMFA, Webhook, Dashboard)}
+
+
+class Recorder:
+    """Latências e resultados de um cenário"""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, latency, status):
+        with self._lock:
+            self.latencies.append(latency)
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+            # 304 (ETag da consulta de status) é sucesso
+            if not isinstance(status, int) or status >= 400:
+                self.errors += 1
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run_load(driver, scenarios, rates, duration, concurrency, arrivals, seed):
+    """Dispara as chegadas em malha aberta e devolve os registros por cenário"""
+    recorders = {name: Recorder() for name in scenarios}
+    rngs = {name: random.Random(f'{seed}:{name}') for name in scenarios}
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='loadgen')
+
+    def arrival(name, scheduled):
+        try:
+            status = scenarios[name].run(driver, rngs[name])
+        except Exception as e:
+            status = type(e).__name__
+        recorders[name].add(time.perf_counter() - scheduled, status)
+
+    def gap(name):
+        rate = rates[name]
+        return rngs[name].expovariate(rate) if arrivals == 'poisson' else 1 / rate
+
+    start = time.perf_counter()
+    pending = [(start + gap(name), name) for name in scenarios if rates[name] > 0]
+    heapq.heapify(pending)
+    late = 0
+    while pending:
+        scheduled, name = heapq.heappop(pending)
+        if scheduled - start >= duration:
+            continue
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -0.01:
+            late += 1
+        executor.submit(arrival, name, scheduled)
+        heapq.heappush(pending, (scheduled + gap(name), name))
+    executor.shutdown(wait=True)
+    elapsed = time.perf_counter() - start
+    return recorders, elapsed, late
+
+
+def build_report(driver, recorders, rates, duration, elapsed, late, concurrency):
+    report = {
+        'mode': driver.mode,
+        'duration': duration,
+        'elapsed': round(elapsed, 3),
+        'concurrency': concurrency,
+        'late_dispatches': late,
+        'scenarios': {}
+    }
+    for name, recorder in recorders.items():
+        latencies = sorted(recorder.latencies)
+        count = len(latencies)
+        report['scenarios'][name] = {
+            'target_rate': rates[name],
+            'requests': count,
+            'throughput': round(count / elapsed, 2),
+            'errors': recorder.errors,
+            'error_rate': round(recorder.errors / count, 4) if count else 0.0,
+            'latency_ms': {
+                key: round(value * 1000, 3) if value is not None else None
+                for key, value in (('p50', percentile(latencies, 0.5)), ('p99', percentile(latencies, 0.99)),
+                                   ('p999', percentile(latencies, 0.999)), ('max', latencies[-1] if latencies else None))
+            },
+            'statuses': recorder.statuses
+        }
+    return report
+
+
+def compare(report, baseline, tolerance, min_delta_ms=1.0, error_margin=0.01):
+    """Regressões em relação à linha de base (lista vazia se nenhuma)
+
+    Latência: piora relativa acima da tolerância e de pelo menos
+    `min_delta_ms` (ruído de submilissegundo não conta). Vazão: fração da
+    taxa pedida que foi atendida, comparável entre taxas diferentes.
+    """
+    problems = []
+    for name, current in report['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base or not current['requests']:
+            continue
+        for key in ('p50', 'p99', 'p999'):
+            before, after = base['latency_ms'].get(key), current['latency_ms'].get(key)
+            if before and after > before * (1 + tolerance) and after - before >= min_delta_ms:
+                problems.append(f'{name}: {key} {before:.2f} -> {after:.2f} ms')
+        before = base['throughput'] / base['target_rate']
+        after = current['throughput'] / current['target_rate']
+        if after < before * (1 - tolerance):
+            problems.append(f'{name}: vazão {before:.0%} -> {after:.0%} da taxa pedida')
+        if current['error_rate'] > base['error_rate'] + error_margin:
+            problems.append(f'{name}: taxa de erros {base["error_rate"]:.2%} -> {current["error_rate"]:.2%}')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', help='cenário=taxa/s separados por vírgula (padrão: todos)')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--url', help='servidor local (padrão: aplicação no próprio processo)')
+    parser.add_argument('--concurrency', type=int, default=64, help='requisições simultâneas no máximo')
+    parser.add_argument('--arrivals', choices=('poisson', 'constant'), default='poisson')
+    parser.add_argument('--checkout-mix', help='ex.: credit_card=60,pix=30,boleto=10')
+    parser.add_argument('--open-charges', type=int, default=500, help='cobranças PIX criadas para consulta/webhook')
+    parser.add_argument('--users', type=int, default=200, help='contas de login (modo em processo)')
+    parser.add_argument('--accounts', help='NDJSON com email/password/mfa_secret para login_mfa via HTTP')
+    parser.add_argument('--api-key', help='chave de API do comerciante (padrão: a do comerciante de desenvolvimento)')
+    parser.add_argument('--webhook-secret', help='padrão: webhook_secret do comerciante de desenvolvimento')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='arquivo do relatório JSON (padrão: saída padrão)')
+    parser.add_argument('--baseline', help='relatório de referência; regressão encerra com código 1')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='piora relativa aceita em latência e vazão')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='piora mínima de latência considerada')
+    parser.add_argument('--save-baseline', help='grava este relatório como linha de base')
+    args = parser.parse_args()
+
+    rates = parse_weights(args.scenario, DEFAULT_RATES)
+    if args.api_key is None or args.webhook_secret is None:
+        from src.routes.merchants import SANDBOX_MERCHANT
+        args.api_key = args.api_key or SANDBOX_MERCHANT['api_key']
+        args.webhook_secret = args.webhook_secret or SANDBOX_MERCHANT['webhook_secret']
+
+    headers = {'X-Api-Key': args.api_key}
+    driver = HttpDriver(args.url, headers=headers) if args.url else InProcessDriver(build_app(), headers)
+    scenarios = {}
+    for name in rates:
+        scenario = SCENARIOS[name]()
+        scenario.setup(driver, args)
+        scenarios[name] = scenario
+
+    recorders, elapsed, late = run_load(driver, scenarios, rates, args.duration, args.concurrency,
+                                        args.arrivals, args.seed)
+    report = build_report(driver, recorders, rates, args.duration, elapsed, late, args.concurrency)
+
+    failed = False
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            problems = compare(report, json.load(f), args.tolerance, args.min_delta_ms)
+        report['regressions'] = problems
+        failed = bool(problems)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+    for name, result in report['scenarios'].items():
+        latency = result['latency_ms']
+        print(f'{name}: {result["throughput"]:.1f}/s, p50 {latency["p50"]} ms, p99 {latency["p99"]} ms, '
+              f'p999 {latency["p999"]} ms, erros {result["error_rate"]:.2%}', file=sys.stderr)
+    if failed:
+        print('REGRESSÃO:\n  ' + '\n  '.join(report['regressions']), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""PIX BR Code (EMV QRCPS-MPM): geração e leitura do payload "copia e cola"
+
+O payload é uma sequência de campos TLV (`ID` de 2 dígitos, tamanho de 2
+dígitos, valor), terminada pelo campo 63 com o CRC16-CCITT (polinômio
+0x1021, valor inicial 0xFFFF) de todo o texto anterior, inclusive `6304`.
+O CRC usa binascii.crc_hqx, a implementação por tabela do próprio CPython.
+
+Tudo o que é fixo para um recebedor (conta PIX, MCC, moeda, país, nome e
+cidade) é montado uma vez em um MerchantTemplate, junto com o estado do
+CRC até o fim do prefixo; cada cobrança só anexa valor e txid e continua
+o CRC de onde parou.
+
+Uso: python brcode.py generate pix@valorapay.com 'Valora Pay' 'Sao Paulo' --amount 10.50 --txid PEDIDO123
+     python brcode.py parse '00020126...6304ABCD'
+"""
+import re
+import sys
+import json
+import argparse
+import binascii
+import unicodedata
+from functools import lru_cache
+
+PIX_GUI = 'br.gov.bcb.pix'
+CURRENCY_BRL = '986'
+CRC_FIELD = '6304'
+
+# Campos com subcampos TLV
+TEMPLATE_FIELDS = {'26', '62', '80'}
+FIELD_NAMES = {
+    '00': 'payload_format',
+    '01': 'point_of_initiation',
+    '26': 'merchant_account',
+    '52': 'merchant_category_code',
+    '53': 'currency',
+    '54': 'amount',
+    '58': 'country',
+    '59': 'merchant_name',
+    '60': 'merchant_city',
+    '61': 'postal_code',
+    '62': 'additional_data',
+    '63': 'crc',
+}
+MAX_MERCHANT_NAME = 25
+MAX_MERCHANT_CITY = 15
+MAX_TXID = 25
+TXID_INVALID = re.compile(r'[^A-Za-z0-9]')
+
+
+class BRCodeError(ValueError):
+    """Payload BR Code inválido"""
+
+
+def crc16(data, crc=0xFFFF):
+    """CRC16-CCITT (FALSE); `crc` permite continuar um cálculo parcial"""
+    return binascii.crc_hqx(data, crc)
+
+
+def _tlv(field_id, value):
+    if len(value) > 99:
+        raise BRCodeError(f'Campo {field_id} excede 99 caracteres')
+    return f'{field_id}{len(value):02d}{value}'
+
+
+def _ascii(value, limit):
+    """Remove acentos e caracteres fora do ASCII imprimível (nome/cidade)"""
+    value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(value.split())[:limit].rstrip()
+
+
+def normalize_txid(value):
+    """txid aceito pelo BR Code: só alfanuméricos, até 25 caracteres ('***' se vazio)"""
+    return TXID_INVALID.sub('', value or '')[:MAX_TXID] or '***'
+
+
+class MerchantTemplate:
+    """Prefixo e sufixo fixos de um recebedor, com o CRC do prefixo pré-calculado"""
+
+    def __init__(self, pix_key, merchant_name, merchant_city, category_code='0000',
+                 currency=CURRENCY_BRL, country='BR', single_use=False):
+        account = _tlv('00', PIX_GUI) + _tlv('01', pix_key)
+        self.prefix = (
+            _tlv('00', '01')
+            + (_tlv('01', '12') if single_use else '')
+            + _tlv('26', account)
+            + _tlv('52', category_code)
+            + _tlv('53', currency)
+        )
+        # Campos 58-60 vêm depois do valor (54), na ordem crescente de ID
+        self.middle = (
+            _tlv('58', country)
+            + _tlv('59', _ascii(merchant_name, MAX_MERCHANT_NAME))
+            + _tlv('60', _ascii(merchant_city, MAX_MERCHANT_CITY))
+        )
+        self.prefix_crc = crc16(self.prefix.encode('ascii'))
+
+    def payload(self, amount=None, txid=None):
+        """Payload completo para uma cobrança (valor em reais; sem valor = o pagador informa)"""
+        amount_field = _tlv('54', f'{amount:.2f}') if amount else ''
+        additional = _tlv('62', _tlv('05', normalize_txid(txid)))
+        tail = amount_field + self.middle + additional + CRC_FIELD
+        # Continua o CRC do prefixo: só os bytes variáveis são processados
+        return f'{self.prefix}{tail}{crc16(tail.encode("ascii"), self.prefix_crc):04X}'
+
+
+@lru_cache(maxsize=1024)
+def merchant_template(pix_key, merchant_name, merchant_city):
+    """Template compartilhado por recebedor"""
+    return MerchantTemplate(pix_key, merchant_name, merchant_city)
+
+
+def _fields(data):
+    fields = []
+    position = 0
+    while position < len(data):
+        field_id = data[position:position + 2]
+        length = data[position + 2:position + 4]
+        if len(field_id) < 2 or not length.isdigit() or not field_id.isdigit():
+            raise BRCodeError(f'Campo malformado na posição {position}')
+        value = data[position + 4:position + 4 + int(length)]
+        if len(value) != int(length):
+            raise BRCodeError(f'Campo {field_id} truncado')
+        fields.append((field_id, value))
+        position += 4 + int(length)
+    return fields
+
+
+def parse_payload(payload):
+    """Valida o CRC e decodifica o payload em um dicionário"""
+    payload = payload.strip()
+    if len(payload) < 8 or payload[-8:-4] != CRC_FIELD:
+        raise BRCodeError('Payload sem campo CRC (63)')
+    try:
+        expected = int(payload[-4:], 16)
+        computed = crc16(payload[:-4].encode('ascii'))
+    except (ValueError, UnicodeEncodeError):
+        raise BRCodeError('Payload com caracteres inválidos')
+    if computed != expected:
+        raise BRCodeError(f'CRC inválido: esperado {computed:04X}, recebido {payload[-4:].upper()}')
+
+    result = {}
+    for field_id, value in _fields(payload):
+        name = FIELD_NAMES.get(field_id, field_id)
+        if field_id in TEMPLATE_FIELDS or '26' <= field_id <= '51':
+            value = dict(_fields(value))
+        result[name] = value
+
+    if result.get('payload_format') != '01':
+        raise BRCodeError('Formato de payload não suportado')
+
+    account = result.get('merchant_account') or {}
+    if isinstance(account, dict) and account.get('00', '').lower() == PIX_GUI:
+        result['pix_key'] = account.get('01')
+    additional = result.get('additional_data')
+    if isinstance(additional, dict):
+        result['txid'] = additional.get('05')
+    if 'amount' in result:
+        try:
+            result['amount'] = float(result['amount'])
+        except ValueError:
+            raise BRCodeError('Valor inválido')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PIX BR Code')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='Gera um payload copia e cola')
+    generate.add_argument('pix_key')
+    generate.add_argument('merchant_name')
+    generate.add_argument('merchant_city')
+    generate.add_argument('--amount', type=float)
+    generate.add_argument('--txid')
+
+    parse = commands.add_parser('parse', help='Valida e decodifica um payload')
+    parse.add_argument('payload')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        template = MerchantTemplate(args.pix_key, args.merchant_name, args.merchant_city)
+        print(template.payload(args.amount, args.txid))
+    else:
+        try:
+            print(json.dumps(parse_payload(args.payload), ensure_ascii=False, indent=2))
+        except BRCodeError as e:
+            print(f'inválido: {e}', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Filtro de senhas vazadas (Bloom filter em arquivo, mapeado com mmap)
+
+O filtro é construído offline a partir de uma lista de hashes SHA-1 (o
+formato do Have I Been Pwned: `HEX` ou `HEX:ocorrências` por linha) e
+consultado em tempo de execução sem carregar o arquivo na memória: cada
+consulta lê k bits das páginas mapeadas. Falsos positivos são possíveis
+(taxa escolhida na construção); falsos negativos, não.
+
+Arquivo: cabeçalho `<8s magic, u64 bits, u32 hashes, u64 itens>` seguido
+do vetor de bits. As posições vêm de double hashing sobre o próprio SHA-1
+(já uniforme): posição_i = (h1 + i * h2) mod bits.
+
+Uso: python breach_filter.py build pwned-passwords-sha1.txt senhas_vazadas.bloom --fp-rate 0.001
+     python breach_filter.py check senhas_vazadas.bloom 'Senha@123'
+"""
+import os
+import sys
+import math
+import mmap
+import struct
+import hashlib
+import argparse
+
+MAGIC = b'VBLOOM1\x00'
+HEADER = struct.Struct('<8sQIQ')
+DEFAULT_FP_RATE = 0.001
+
+
+def filter_parameters(items, fp_rate):
+    """(bits, hashes) ótimos para a quantidade de itens e a taxa de falso positivo"""
+    items = max(items, 1)
+    bits = int(math.ceil(-items * math.log(fp_rate) / (math.log(2) ** 2)))
+    bits = (bits + 7) // 8 * 8
+    hashes = max(1, int(round(bits / items * math.log(2))))
+    return bits, hashes
+
+
+def _positions(digest, bits, hashes):
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:16], 'little') | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+def _digest_from_line(line):
+    value = line.split(':', 1)[0].strip()
+    if len(value) != 40:
+        return None
+    try:
+        return bytes.fromhex(value)
+    except ValueError:
+        return None
+
+
+class BreachFilter:
+    """Consulta de um filtro construído com build_filter"""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.bits, self.hashes, self.items = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f'Arquivo não é um filtro de senhas vazadas: {path}')
+        if len(self._map) < HEADER.size + self.bits // 8:
+            raise ValueError(f'Filtro truncado: {path}')
+
+    def contains_digest(self, digest):
+        data = self._map
+        for position in _positions(digest, self.bits, self.hashes):
+            if not data[HEADER.size + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def contains_sha1(self, hex_digest):
+        return self.contains_digest(bytes.fromhex(hex_digest))
+
+    def contains_password(self, password):
+        """Indica se a senha (provavelmente) está em algum vazamento"""
+        return self.contains_digest(hashlib.sha1(password.encode('utf-8')).digest())
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def build_filter(digests, output, items, fp_rate=DEFAULT_FP_RATE):
+    """Grava o filtro para `items` digests SHA-1 (bytes); retorna (bits, hashes, inseridos)"""
+    bits, hashes = filter_parameters(items, fp_rate)
+    size = HEADER.size + bits // 8
+
+    # O vetor é montado direto no arquivo mapeado: não precisa caber na RAM
+    with open(output + '.tmp', 'w+b') as f:
+        f.truncate(size)
+        data = mmap.mmap(f.fileno(), size)
+        inserted = 0
+        for digest in digests:
+            for position in _positions(digest, bits, hashes):
+                index = HEADER.size + (position >> 3)
+                data[index] |= 1 << (position & 7)
+            inserted += 1
+        data[:HEADER.size] = HEADER.pack(MAGIC, bits, hashes, inserted)
+        data.flush()
+        data.close()
+    os.replace(output + '.tmp', output)
+    return bits, hashes, inserted
+
+
+def _count_lines(path):
+    with open(path, 'rb') as f:
+        return sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 20), b''))
+
+
+def _read_digests(path):
+    with open(path, encoding='ascii', errors='ignore') as f:
+        for line in f:
+            digest = _digest_from_line(line)
+            if digest is not None:
+                yield digest
+
+
+def open_filter_from_env():
+    """Filtro configurado em VALORA_BREACH_FILTER (ou None)"""
+    path = os.environ.get('VALORA_BREACH_FILTER')
+    return BreachFilter(path) if path else None
+
+
+breached_passwords = open_filter_from_env()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Filtro de senhas vazadas')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='Constrói o filtro a partir de uma lista de SHA-1')
+    build.add_argument('hashes')
+    build.add_argument('output')
+    build.add_argument('--fp-rate', type=float, default=DEFAULT_FP_RATE)
+    build.add_argument('--items', type=int, help='Quantidade de hashes (padrão: conta as linhas)')
+
+    check = commands.add_parser('check', help='Consulta uma senha no filtro')
+    check.add_argument('filter')
+    check.add_argument('password')
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        items = args.items or _count_lines(args.hashes)
+        bits, hashes, inserted = build_filter(_read_digests(args.hashes), args.output, items, args.fp_rate)
+        print(f'{inserted} hashes, {bits // 8 / 1e6:.1f} MB, {hashes} funções de hash')
+    else:
+        breach_filter = BreachFilter(args.filter)
+        found = breach_filter.contains_password(args.password)
+        print('vazada' if found else 'não encontrada')
+        sys.exit(1 if found else 0)
+
+
+if __name__ == '__main__':
+    main()
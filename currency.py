@@ -0,0 +1,272 @@
+"""Moedas, tabela de câmbio e conversão para a moeda de liquidação
+
+A tabela (cotações em relação a uma moeda base, ex.: 1 USD = 5.10 BRL) é
+um objeto imutável com a matriz de conversão já calculada, em Decimal
+(conversão de valores de pagamento, arredondada nas casas da moeda) e em
+float (relatórios). Uma nova tabela é montada por inteiro e publicada
+com uma única atribuição: quem lê pega a referência corrente e usa a
+mesma tabela do começo ao fim, sem lock.
+
+As cotações vêm de um arquivo local (JSON `{"base", "as_of", "rates"}`
+ou CSV `moeda,cotação`) ou de um feed HTTP no mesmo formato JSON,
+relidos a cada VALORA_FX_REFRESH_S segundos (padrão 60; o arquivo só é
+relido se mudou). A tabela precisa trazer todas as moedas suportadas;
+uma tabela inválida é descartada e a atual continua valendo. A primeira
+carga de uma fonte configurada precisa dar certo: se falhar, a
+inicialização falha (CurrencyError) em vez de seguir com cotações de
+desenvolvimento. Sem fonte configurada vale a tabela embutida.
+
+convert_many() converte muitos valores de uma vez (relatórios e
+dashboard), com numpy quando instalado.
+
+Variáveis: VALORA_FX_FILE, VALORA_FX_URL, VALORA_FX_REFRESH_S.
+"""
+import os
+import json
+import time
+import threading
+import urllib.request
+from array import array
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+
+from src.routes.worker_pool import is_pool_worker
+
+try:
+    import numpy
+except ImportError:  # numpy é opcional; sem ele a conversão em lote usa array/listas
+    numpy = None
+
+SETTLEMENT_CURRENCY = 'BRL'
+
+# Moeda -> casas decimais (ISO 4217)
+CURRENCIES = {
+    'BRL': 2, 'USD': 2, 'EUR': 2, 'CAD': 2, 'MXN': 2,
+    'ARS': 2, 'CLP': 0, 'COP': 2, 'PEN': 2, 'UYU': 2,
+}
+
+# País (VALID_COUNTRIES) -> moeda local
+COUNTRY_CURRENCIES = {
+    'BR': 'BRL', 'US': 'USD', 'CA': 'CAD', 'MX': 'MXN', 'AR': 'ARS',
+    'CL': 'CLP', 'CO': 'COP', 'PE': 'PEN', 'UY': 'UYU',
+}
+
+# Métodos liquidados apenas em reais (arranjos locais)
+METHOD_CURRENCIES = {
+    'pix': frozenset(['BRL']),
+    'boleto': frozenset(['BRL']),
+}
+
+# Cotações de desenvolvimento (unidades por 1 USD)
+BUILTIN_RATES = {
+    'USD': '1', 'BRL': '5.10', 'EUR': '0.92', 'CAD': '1.37', 'MXN': '17.20',
+    'ARS': '870.00', 'CLP': '940.00', 'COP': '3900.00', 'PEN': '3.75', 'UYU': '39.20',
+}
+
+DEFAULT_REFRESH = 60.0
+
+
+class CurrencyError(ValueError):
+    """Moeda não suportada ou sem cotação"""
+
+
+class RateTable:
+    """Tabela imutável de cotações com a matriz de conversão pronta"""
+
+    def __init__(self, rates, base='USD', as_of=None, source='builtin', version=1):
+        try:
+            rates = {code.upper(): Decimal(str(rate).strip()) for code, rate in rates.items()}
+        except InvalidOperation:
+            raise CurrencyError('Cotação inválida')
+        unknown = sorted(set(rates) - set(CURRENCIES))
+        if unknown:
+            raise CurrencyError(f'Moedas não suportadas na tabela: {", ".join(unknown)}')
+        if base not in rates:
+            rates[base] = Decimal(1)
+        # Tabela parcial derrubaria a conversão (e a liquidação) das moedas que faltam
+        missing = sorted(set(CURRENCIES) - set(rates))
+        if missing:
+            raise CurrencyError(f'Moedas sem cotação na tabela: {", ".join(missing)}')
+        if any(not rate.is_finite() or rate <= 0 for rate in rates.values()):
+            raise CurrencyError('Cotação deve ser um número maior que zero')
+
+        self.base = base
+        self.rates = rates
+        self.as_of = as_of or datetime.utcnow().isoformat()
+        self.source = source
+        self.version = version
+        self.codes = tuple(sorted(rates))
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        # (origem, destino) -> fator; 1 origem = fator destino
+        self.factors = {(source_code, target): rates[target] / rates[source_code]
+                        for source_code in self.codes for target in self.codes}
+        self.float_factors = {pair: float(factor) for pair, factor in self.factors.items()}
+
+    def factor(self, source, target):
+        try:
+            return self.factors[(source, target)]
+        except KeyError:
+            raise CurrencyError(f'Sem cotação para {source}/{target}')
+
+    def convert(self, amount, source, target):
+        """Valor convertido em Decimal, arredondado nas casas da moeda de destino"""
+        quantum = Decimal(1).scaleb(-CURRENCIES[target])
+        return (Decimal(str(amount)) * self.factor(source, target)).quantize(quantum, rounding=ROUND_HALF_EVEN)
+
+    def describe(self):
+        return {'base': self.base, 'as_of': self.as_of, 'source': self.source, 'version': self.version,
+                'rates': {code: str(rate) for code, rate in self.rates.items()}}
+
+
+def parse_rates(text, source):
+    """Tabela a partir de JSON `{"base", "as_of", "rates"}` ou CSV `moeda,cotação`"""
+    text = text.strip()
+    if text.startswith('{'):
+        data = json.loads(text)
+        if not isinstance(data, dict) or not isinstance(data.get('rates'), dict):
+            raise CurrencyError('Tabela de cotações sem o objeto "rates"')
+        return RateTable(data['rates'], data.get('base', 'USD'), data.get('as_of'), source)
+    rates = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        code, _, rate = line.partition(',')
+        if code.strip().lower() in ('currency', 'moeda'):
+            continue
+        rates[code.strip()] = rate.strip()
+    return RateTable(rates, source=source)
+
+
+class FXRates:
+    """Tabela corrente (trocada atomicamente) e recarga periódica da fonte"""
+
+    def __init__(self, table=None, path=None, url=None, refresh=DEFAULT_REFRESH):
+        self.table = table or RateTable(BUILTIN_RATES)
+        self.path = path
+        self.url = url
+        self.refresh = refresh
+        self.stats = {'swaps': 0, 'errors': 0, 'last_error': None}
+        self._mtime = None
+        self._swap_lock = threading.Lock()
+        self._thread = None
+        if (path or url) and not self.reload():
+            # Sem isso a API subiria cobrando com as cotações embutidas
+            raise CurrencyError(f'Falha ao carregar as cotações de {path or url}: {self.stats["last_error"]}')
+
+    def swap(self, table):
+        """Publica uma nova tabela; leitores em andamento seguem com a anterior"""
+        with self._swap_lock:
+            table.version = self.table.version + 1
+            self.table = table
+            self.stats['swaps'] += 1
+        return table
+
+    def reload(self):
+        """Relê o arquivo (se mudou) ou o feed; erros mantêm a tabela atual"""
+        try:
+            if self.path:
+                mtime = os.stat(self.path).st_mtime_ns
+                if mtime == self._mtime:
+                    return False
+                with open(self.path, encoding='utf-8') as f:
+                    table = parse_rates(f.read(), f'file:{self.path}')
+                self._mtime = mtime
+            else:
+                with urllib.request.urlopen(self.url, timeout=10) as response:
+                    table = parse_rates(response.read().decode('utf-8'), f'feed:{self.url}')
+        except (OSError, ValueError, KeyError, TypeError, ArithmeticError) as e:
+            self.stats['errors'] += 1
+            self.stats['last_error'] = str(e)
+            return False
+        self.swap(table)
+        return True
+
+    def start(self):
+        if self._thread is None and (self.path or self.url):
+            self._thread = threading.Thread(target=self._run, name='fx-refresh', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh)
+            try:
+                self.reload()
+            except Exception as e:
+                # A thread de recarga não pode morrer: segue com a tabela atual
+                self.stats['errors'] += 1
+                self.stats['last_error'] = str(e)
+
+    def convert(self, amount, source, target=SETTLEMENT_CURRENCY):
+        return self.table.convert(amount, source, target)
+
+    def settlement(self, amount, source, target=SETTLEMENT_CURRENCY):
+        """Dados de liquidação de um pagamento (uma única tabela para valor e cotação)"""
+        table = self.table
+        return {
+            'currency': target,
+            'amount': float(table.convert(amount, source, target)),
+            'rate': str(table.factor(source, target)),
+            'rate_version': table.version,
+            'rate_as_of': table.as_of
+        }
+
+    def convert_many(self, amounts, sources, target=SETTLEMENT_CURRENCY, decimals=None):
+        """Converte muitos valores; `sources` é uma moeda ou uma por valor
+
+        Devolve floats (array do numpy, se instalado), opcionalmente
+        arredondados em `decimals` casas.
+        """
+        table = self.table
+        if isinstance(sources, str):
+            factor = table.float_factors.get((sources, target))
+            if factor is None:
+                raise CurrencyError(f'Sem cotação para {sources}/{target}')
+            if numpy is not None:
+                result = numpy.asarray(amounts, dtype=float) * factor
+            elif decimals is None:
+                return array('d', [amount * factor for amount in amounts])
+            else:
+                return array('d', [round(amount * factor, decimals) for amount in amounts])
+        else:
+            try:
+                column = [table.float_factors[(code, target)] for code in table.codes]
+                positions = [table.index[code] for code in sources]
+            except KeyError as e:
+                raise CurrencyError(f'Sem cotação para {e.args[0]}/{target}')
+            if numpy is not None:
+                result = numpy.asarray(amounts, dtype=float) * numpy.asarray(column)[numpy.asarray(positions, dtype=numpy.intp)]
+            elif decimals is None:
+                return array('d', [amount * column[position] for amount, position in zip(amounts, positions)])
+            else:
+                return array('d', [round(amount * column[position], decimals)
+                                   for amount, position in zip(amounts, positions)])
+        return result if decimals is None else numpy.round(result, decimals)
+
+
+def currency_errors(currency, payment_method):
+    """Erro de moeda para o método de pagamento (None se aceita)"""
+    if currency not in CURRENCIES:
+        return 'Moeda não suportada'
+    allowed = METHOD_CURRENCIES.get(payment_method)
+    if allowed is not None and currency not in allowed:
+        return f'Moeda {currency} não aceita para {payment_method}'
+    return None
+
+
+def settlement_amount(transaction):
+    """Valor na moeda de liquidação (transações anteriores à conversão: o próprio valor)"""
+    settlement = transaction.get('settlement')
+    return settlement['amount'] if settlement else transaction['amount']
+
+
+def open_rates_from_env():
+    """Tabela de VALORA_FX_FILE / VALORA_FX_URL (ou a embutida); sem recarga nos processos de pool"""
+    rates = FXRates(path=os.environ.get('VALORA_FX_FILE'), url=os.environ.get('VALORA_FX_URL'),
+                    refresh=float(os.environ.get('VALORA_FX_REFRESH_S', DEFAULT_REFRESH)))
+    if not is_pool_worker():
+        rates.start()
+    return rates
+
+
+fx_rates = open_rates_from_env()
@@ -0,0 +1,202 @@
+"""Agregados do dashboard do comerciante, mantidos incrementalmente
+
+Os agregados são separados por comerciante (criados na primeira
+transação de cada um). Cada transição de status atualiza contadores e
+volumes (em centavos da moeda de liquidação) por método, status e
+bandeira, além de séries por minuto, hora e dia em buffers circulares de
+tamanho fixo. Ler o dashboard custa o mesmo independentemente do tamanho
+do histórico.
+
+Em `partially_refunded` e `refunded` o volume por status é o líquido
+(valor menos o já estornado); cada novo estorno parcial atualiza o
+volume mesmo sem mudar o status.
+"""
+import time
+import threading
+
+from src.routes.currency import fx_rates, settlement_amount, SETTLEMENT_CURRENCY, CURRENCIES
+from src.routes.merchants import SANDBOX_MERCHANT_ID
+
+# Granularidade -> (segundos por bucket, buckets mantidos)
+GRANULARITIES = {
+    'minute': (60, 1440),
+    'hour': (3600, 24 * 7),
+    'day': (86400, 90),
+}
+
+
+REFUNDED_STATUSES = ('partially_refunded', 'refunded')
+
+
+def _counter():
+    return [0, 0]  # [quantidade, volume em centavos]
+
+
+def net_cents(transaction, cents):
+    """Volume líquido de estornos, em centavos da moeda de liquidação"""
+    amount_cents = int(round(transaction['amount'] * 100))
+    refunded = transaction.get('refunded_cents', 0)
+    if not refunded or not amount_cents:
+        return cents
+    return cents - int(round(cents * refunded / amount_cents))
+
+
+class TimeSeries:
+    """Buffer circular de buckets de tempo"""
+
+    def __init__(self, seconds, size):
+        self.seconds = seconds
+        self.size = size
+        self.bucket_ids = [None] * size
+        self.slots = [None] * size
+
+    def slot(self, timestamp):
+        bucket_id = int(timestamp // self.seconds)
+        index = bucket_id % self.size
+        if self.bucket_ids[index] != bucket_id:
+            self.bucket_ids[index] = bucket_id
+            self.slots[index] = {}
+        return self.slots[index]
+
+    def series(self, now, count):
+        """Últimos `count` buckets, do mais antigo ao mais recente"""
+        current = int(now // self.seconds)
+        result = []
+        for bucket_id in range(current - min(count, self.size) + 1, current + 1):
+            index = bucket_id % self.size
+            by_status = self.slots[index] if self.bucket_ids[index] == bucket_id else {}
+            result.append({
+                'start': bucket_id * self.seconds,
+                'by_status': {status: {'count': c[0], 'volume': c[1] / 100} for status, c in by_status.items()}
+            })
+        return result
+
+
+class DashboardAggregates:
+    """Agregados incrementais de transações"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.by_status = {}
+            self.by_method = {}
+            self.by_brand = {}
+            self.created = _counter()
+            # Transação -> volume contado no status atual, quando não é o valor cheio (estornos)
+            self.net = {}
+            self.series = {name: TimeSeries(seconds, size) for name, (seconds, size) in GRANULARITIES.items()}
+
+    def record_transition(self, transaction, previous, status, source=None, timestamp=None):
+        """Aplica uma transição de status aos agregados"""
+        if previous == status and status != 'partially_refunded':
+            # Webhook repetido com o mesmo status: não é transição
+            return
+        cents = int(round(settlement_amount(transaction) * 100))
+        held = net_cents(transaction, cents) if status in REFUNDED_STATUSES else cents
+        timestamp = timestamp or time.time()
+
+        with self._lock:
+            # Estado atual: sai do status anterior e entra no novo
+            if previous is not None:
+                counter = self.by_status[previous]
+                counter[0] -= 1
+                counter[1] -= self.net.pop(transaction['id'], cents)
+            counter = self.by_status.get(status)
+            if counter is None:
+                counter = self.by_status[status] = _counter()
+            counter[0] += 1
+            counter[1] += held
+            if held != cents:
+                self.net[transaction['id']] = held
+            if previous == status:
+                # Novo estorno parcial: só o volume líquido muda
+                return
+
+            # Volumes de entrada por método e bandeira contam a criação
+            if previous is None:
+                self.created[0] += 1
+                self.created[1] += cents
+                for index, key in ((self.by_method, transaction['payment_method']),
+                                   (self.by_brand, transaction.get('card_brand'))):
+                    if key is None:
+                        continue
+                    counter = index.get(key)
+                    if counter is None:
+                        counter = index[key] = _counter()
+                    counter[0] += 1
+                    counter[1] += cents
+
+            # Séries temporais: transições para cada status por bucket
+            for series in self.series.values():
+                slot = series.slot(timestamp)
+                counter = slot.get(status)
+                if counter is None:
+                    counter = slot[status] = _counter()
+                counter[0] += 1
+                counter[1] += cents
+
+    def snapshot(self, granularity='hour', buckets=24, now=None):
+        """Totais atuais e a série pedida"""
+        now = now or time.time()
+
+        def export(index):
+            return {key: {'count': c[0], 'volume': c[1] / 100} for key, c in index.items()}
+
+        with self._lock:
+            return {
+                'currency': SETTLEMENT_CURRENCY,
+                'total': {'count': self.created[0], 'volume': self.created[1] / 100},
+                'by_status': export(self.by_status),
+                'by_method': export(self.by_method),
+                'by_brand': export(self.by_brand),
+                'series': {
+                    'granularity': granularity,
+                    'buckets': self.series[granularity].series(now, buckets)
+                }
+            }
+
+
+class MerchantDashboards:
+    """Agregados por comerciante"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.merchants = {}
+
+    def aggregates(self, merchant_id):
+        aggregates = self.merchants.get(merchant_id)
+        if aggregates is None:
+            with self._lock:
+                aggregates = self.merchants.setdefault(merchant_id, DashboardAggregates())
+        return aggregates
+
+    def record_transition(self, transaction, previous, status, source=None, timestamp=None):
+        # Transações anteriores ao cadastro de comerciantes são do comerciante de desenvolvimento
+        self.aggregates(transaction.get('merchant_id', SANDBOX_MERCHANT_ID)).record_transition(
+            transaction, previous, status, source, timestamp
+        )
+
+    def snapshot(self, merchant_id, granularity='hour', buckets=24, now=None):
+        return self.aggregates(merchant_id).snapshot(granularity, buckets, now)
+
+
+def convert_volumes(snapshot, currency, rates=fx_rates):
+    """Converte todos os volumes do snapshot para `currency` em uma única chamada"""
+    volumes = [snapshot['total']]
+    for key in ('by_status', 'by_method', 'by_brand'):
+        volumes.extend(snapshot[key].values())
+    for bucket in snapshot['series']['buckets']:
+        volumes.extend(bucket['by_status'].values())
+
+    converted = rates.convert_many([volume['volume'] for volume in volumes], snapshot['currency'],
+                                   currency, CURRENCIES[currency])
+    for volume, value in zip(volumes, converted):
+        volume['volume'] = float(value)
+    snapshot['currency'] = currency
+    return snapshot
+
+
+dashboard_aggregates = MerchantDashboards()
@@ -0,0 +1,181 @@
+"""Expiração de cobranças PIX, boletos e desafios MFA (timing wheel hierárquica)
+
+Os timers ficam em 4 rodas de 256 posições: a primeira avança um tick
+por vez; quando ela completa uma volta, a posição corrente da roda
+seguinte é redistribuída nas rodas de baixo (cascata). Agendar e
+cancelar são O(1) (um conjunto por posição), independentemente de
+quantos timers estão pendentes; cada timer é cascateado no máximo uma
+vez por nível.
+
+Os handlers são registrados por tipo (`pix`, `boleto`, `mfa`, ...) e
+chamados na thread da roda, fora do lock, com a chave do timer vencido.
+
+Variável: VALORA_EXPIRY_TICK_MS (resolução, padrão 1000 ms).
+"""
+import os
+import time
+import threading
+
+from src.routes.worker_pool import is_pool_worker
+
+WHEEL_BITS = 8
+WHEEL_SIZE = 1 << WHEEL_BITS
+WHEEL_MASK = WHEEL_SIZE - 1
+LEVELS = 4
+# Além do alcance da última roda o timer é limitado a ela (2^32 ticks)
+MAX_DELTA = (1 << (WHEEL_BITS * LEVELS)) - 1
+DEFAULT_TICK = 1.0
+
+
+class Timer:
+    """Timer pendente (tick de vencimento e posição atual na roda)"""
+
+    __slots__ = ('kind', 'key', 'tick', 'bucket')
+
+    def __init__(self, kind, key, tick):
+        self.kind = kind
+        self.key = key
+        self.tick = tick
+        self.bucket = None
+
+
+class TimingWheel:
+    """Roda hierárquica de timers identificados por (tipo, chave)"""
+
+    def __init__(self, tick=DEFAULT_TICK, now=None):
+        self.tick = tick
+        self.current = int((time.time() if now is None else now) / tick)
+        self.wheels = [[set() for _ in range(WHEEL_SIZE)] for _ in range(LEVELS)]
+        self.timers = {}
+        self.handlers = {}
+        self.stats = {'scheduled': 0, 'cancelled': 0, 'expired': 0, 'cascaded': 0, 'errors': 0}
+        self._lock = threading.RLock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return len(self.timers)
+
+    def on_expire(self, kind, handler):
+        """Registra handler(chave) para os timers do tipo"""
+        self.handlers.setdefault(kind, []).append(handler)
+        return handler
+
+    def _place(self, timer):
+        delta = min(timer.tick - self.current, MAX_DELTA)
+        level = 0
+        while delta >= WHEEL_SIZE and level < LEVELS - 1:
+            delta >>= WHEEL_BITS
+            level += 1
+        tick = min(timer.tick, self.current + MAX_DELTA)
+        bucket = self.wheels[level][(tick >> (WHEEL_BITS * level)) & WHEEL_MASK]
+        bucket.add(timer)
+        timer.bucket = bucket
+
+    def schedule(self, kind, key, deadline):
+        """Agenda (ou reagenda) o vencimento de (tipo, chave) no timestamp `deadline`"""
+        with self._lock:
+            self._remove(kind, key)
+            # Nunca no tick corrente (já processado): no mínimo no próximo
+            timer = Timer(kind, key, max(int(-(-deadline // self.tick)), self.current + 1))
+            self.timers[(kind, key)] = timer
+            self._place(timer)
+            self.stats['scheduled'] += 1
+            return timer
+
+    def _remove(self, kind, key):
+        timer = self.timers.pop((kind, key), None)
+        if timer is not None:
+            timer.bucket.discard(timer)
+            timer.bucket = None
+        return timer
+
+    def cancel(self, kind, key):
+        """Cancela o timer; retorna se havia um pendente"""
+        with self._lock:
+            if self._remove(kind, key) is None:
+                return False
+            self.stats['cancelled'] += 1
+            return True
+
+    def _step(self):
+        """Avança um tick e retorna os timers vencidos nele"""
+        self.current += 1
+        current = self.current
+        # Cascata: ao completar uma volta, a posição da roda de cima desce
+        for level in range(1, LEVELS):
+            if (current >> (WHEEL_BITS * (level - 1))) & WHEEL_MASK:
+                break
+            bucket = self.wheels[level][(current >> (WHEEL_BITS * level)) & WHEEL_MASK]
+            if bucket:
+                timers = list(bucket)
+                bucket.clear()
+                for timer in timers:
+                    self._place(timer)
+                self.stats['cascaded'] += len(timers)
+
+        bucket = self.wheels[0][current & WHEEL_MASK]
+        if not bucket:
+            return ()
+        timers = list(bucket)
+        bucket.clear()
+        expired = []
+        for timer in timers:
+            if timer.tick > current:
+                # Limitado a MAX_DELTA no agendamento: volta para a roda
+                self._place(timer)
+                continue
+            del self.timers[(timer.kind, timer.key)]
+            timer.bucket = None
+            expired.append(timer)
+        return expired
+
+    def advance(self, now=None):
+        """Processa os ticks até `now` e chama os handlers dos vencidos; retorna quantos venceram"""
+        target = int((time.time() if now is None else now) / self.tick)
+        expired = []
+        with self._lock:
+            while self.current < target:
+                if not self.timers:
+                    # Nada pendente: salta direto (rodas vazias não precisam de cascata)
+                    self.current = target
+                    break
+                expired.extend(self._step())
+            self.stats['expired'] += len(expired)
+
+        for timer in expired:
+            for handler in self.handlers.get(timer.kind, ()):
+                try:
+                    handler(timer.key)
+                except Exception:
+                    # Um handler com erro não pode impedir as demais expirações
+                    self.stats['errors'] += 1
+        return len(expired)
+
+    def start(self):
+        """Thread que avança a roda a cada tick"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='expiry-wheel', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Acorda no início do próximo tick
+            self._stop.wait(self.tick - time.time() % self.tick)
+            self.advance()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def open_wheel_from_env():
+    """Roda compartilhada; a thread não roda nos processos de pool"""
+    wheel = TimingWheel(int(os.environ.get('VALORA_EXPIRY_TICK_MS', DEFAULT_TICK * 1000)) / 1000)
+    if not is_pool_worker():
+        wheel.start()
+    return wheel
+
+
+expiry_wheel = open_wheel_from_env()
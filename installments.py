@@ -0,0 +1,196 @@
+"""Parcelamento no cartão de crédito: parcelas, totais e taxas do comerciante
+
+Até `interest_free_max` parcelas o cliente paga o valor à vista dividido
+(sem juros; o centavo que sobra vai para a primeira parcela). Acima
+disso as parcelas seguem a Tabela Price com a taxa mensal configurada:
+
+    parcela = valor * i / (1 - (1 + i) ^ -n)
+
+Os coeficientes de cada (taxa, prazo) são calculados uma vez em Decimal
+e guardados como inteiros escalados, então uma grade inteira (1x a 12x)
+é só aritmética inteira em centavos. A configuração de taxas monta um
+modelo da grade (coeficiente e MDR por prazo), descartado quando a
+configuração muda.
+"""
+import threading
+from decimal import Decimal, localcontext
+from functools import lru_cache
+
+SCALE = 10 ** 12
+MAX_BULK_AMOUNTS = 10000
+
+DEFAULT_CONFIG = {
+    'max_installments': 12,
+    'interest_free_max': 3,
+    'monthly_interest_rate': '1.99',    # % a.m. cobrada do cliente acima de interest_free_max
+    'min_installment': '5.00',
+    # MDR (% sobre o valor) por prazo: à vista, 2-6x, 7-12x
+    'mdr': {1: '3.99', 2: '4.59', 7: '5.19'},
+    'fixed_fee': '0.39',
+}
+
+
+class InstallmentError(ValueError):
+    """Parcelamento inválido para o valor ou a configuração"""
+
+
+@lru_cache(maxsize=256)
+def price_coefficients(rate, terms):
+    """Coeficientes da Tabela Price (escalados por SCALE) para 1..terms parcelas"""
+    coefficients = []
+    with localcontext() as context:
+        context.prec = 40
+        i = Decimal(rate) / 100
+        for n in range(1, terms + 1):
+            coefficient = Decimal(1) / n if i == 0 else i / (1 - (1 + i) ** -n)
+            coefficients.append(int((coefficient * SCALE).to_integral_value()))
+    return tuple(coefficients)
+
+
+def _scaled(value, factor):
+    """Inteiro de value * factor; valores não numéricos, NaN e infinitos levantam InstallmentError"""
+    try:
+        scaled = Decimal(str(value).strip()) * factor
+    except ArithmeticError:
+        raise InstallmentError('Valor inválido')
+    if not scaled.is_finite():
+        raise InstallmentError('Valor inválido')
+    return int(scaled.to_integral_value())
+
+
+def _cents(value):
+    return _scaled(value, 100)
+
+
+def _basis_points(value):
+    """Percentual -> centésimos de ponto-base (3.99% -> 39900)"""
+    return _scaled(value, 10000)
+
+
+class InstallmentEngine:
+    """Grade de parcelamento com modelo pré-calculado por configuração"""
+
+    def __init__(self, config=None):
+        self._lock = threading.Lock()
+        self.version = 0
+        self.configure(**(config or DEFAULT_CONFIG))
+
+    def configure(self, **changes):
+        """Aplica mudanças na configuração de taxas e descarta o modelo da grade"""
+        with self._lock:
+            config = dict(self.template['config'] if self.version else DEFAULT_CONFIG)
+            config.update(changes)
+            template = self._build_template(config)
+            # Troca atômica: requisições em andamento terminam com o modelo anterior
+            self.version += 1
+            template['version'] = self.version
+            self.template = template
+            return self.version
+
+    @property
+    def config(self):
+        return self.template['config']
+
+    @staticmethod
+    def _build_template(config):
+        terms = int(config['max_installments'])
+        interest_free = int(config['interest_free_max'])
+        if not 1 <= interest_free <= terms:
+            raise InstallmentError('interest_free_max deve estar entre 1 e max_installments')
+        mdr = {int(start): _basis_points(value) for start, value in config['mdr'].items()}
+        if 1 not in mdr:
+            raise InstallmentError('MDR à vista (1x) é obrigatório')
+
+        coefficients = price_coefficients(str(config['monthly_interest_rate']), terms)
+        rows = []
+        current = mdr[1]
+        for n in range(1, terms + 1):
+            current = mdr.get(n, current)
+            free = n <= interest_free
+            rows.append((n, None if free else coefficients[n - 1], current))
+        return {
+            'config': config,
+            'rows': tuple(rows),
+            'min_installment': _cents(config['min_installment']),
+            'fixed_fee': _cents(config['fixed_fee']),
+            'interest_rate': float(config['monthly_interest_rate']),
+        }
+
+    def grid_cents(self, amount_cents, template=None):
+        """Opções (prazo, parcela, primeira parcela, total, taxa, líquido) em centavos"""
+        template = template or self.template
+        minimum = template['min_installment']
+        fixed = template['fixed_fee']
+        options = []
+        for n, coefficient, mdr in template['rows']:
+            if coefficient is None:
+                installment, first = divmod(amount_cents, n)
+                first += installment
+                total = amount_cents
+            else:
+                installment = (amount_cents * coefficient + SCALE // 2) // SCALE
+                first = installment
+                total = installment * n
+            if n > 1 and installment < minimum:
+                break
+            fee = (amount_cents * mdr + 500000) // 1000000 + fixed
+            options.append((n, installment, first, total, fee, amount_cents - fee, coefficient is None))
+        return options
+
+    def grid(self, amount):
+        """Grade completa para um valor em reais"""
+        template = self.template
+        amount_cents = _cents(amount)
+        if amount_cents <= 0:
+            raise InstallmentError('Valor deve ser maior que zero')
+        return [{
+            'installments': n,
+            'installment_amount': installment / 100,
+            'first_installment_amount': first / 100,
+            'total': total / 100,
+            'interest_free': free,
+            'monthly_interest_rate': 0.0 if free else template['interest_rate'],
+            'customer_interest': (total - amount_cents) / 100,
+            'merchant_fee': fee / 100,
+            'merchant_net': net / 100
+        } for n, installment, first, total, fee, net, free in self.grid_cents(amount_cents, template)]
+
+    def grid_many(self, amounts):
+        """Modo em lote (preços de catálogo): grade compacta por valor, um único modelo"""
+        if len(amounts) > MAX_BULK_AMOUNTS:
+            raise InstallmentError(f'No máximo {MAX_BULK_AMOUNTS} valores por requisição')
+        template = self.template
+        results = []
+        for amount in amounts:
+            amount_cents = _cents(amount)
+            if amount_cents <= 0:
+                raise InstallmentError('Valor deve ser maior que zero')
+            options = self.grid_cents(amount_cents, template)
+            results.append({
+                'amount': amount_cents / 100,
+                # [parcelas, valor da parcela, total, sem juros]
+                'options': [[n, installment / 100, total / 100, free]
+                            for n, installment, _, total, _, _, free in options]
+            })
+        return results
+
+    def plan(self, amount, installments):
+        """Opção escolhida no checkout (levanta InstallmentError se indisponível)"""
+        for option in self.grid(amount):
+            if option['installments'] == installments:
+                return option
+        raise InstallmentError(f'Parcelamento em {installments}x indisponível para este valor')
+
+    def describe(self):
+        template = self.template
+        config = template['config']
+        return {
+            'max': int(config['max_installments']),
+            'interest_free': int(config['interest_free_max']),
+            'monthly_interest_rate': float(config['monthly_interest_rate']),
+            'min_installment': float(config['min_installment']),
+            'version': template['version']
+        }
+
+
+installment_engine = InstallmentEngine()
@@ -3,12 +3,13 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
 from src.models.user import db
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.payment import payment_bp
+from src.static_assets import StaticAssetManifest, asset_response
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'valora_secret_key_2025_secure'
@@ -28,21 +29,22 @@ db.init_app(app)
 with app.app_context():
     db.create_all()
 
+# Manifesto dos arquivos estáticos (Next.js) mantido em memória
+static_manifest = StaticAssetManifest(app.static_folder) if app.static_folder else None
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
+    if static_manifest is None:
             return "Static folder not configured", 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+    asset = static_manifest.lookup(path)
+    if asset is None:
+        asset = static_manifest.index
+    if asset is None:
+        return "index.html not found", 404
+
+    return asset_response(asset)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,345 @@
+"""Cadastro de comerciantes e autenticação por chave de API
+
+Cada comerciante tem chave PIX, nome e cidade do recebedor (BR Code),
+segredo de webhook e uma chave de API `sk_<ambiente>_<12 hex><segredo>`.
+A chave nunca é guardada: o registro tem o HMAC-SHA256 dela (com o
+pepper do servidor) e um identificador público da chave, que leva ao
+comerciante em O(1) pelo índice: o prefixo de KEY_PREFIX_LENGTH
+caracteres, ou `hmac:<início do HMAC>` para chaves sem segredo além do
+prefixo (a chave fixa do sandbox), para que o registro nunca contenha a
+chave inteira. O HMAC da chave apresentada é comparado em tempo
+constante, inclusive quando o identificador não existe.
+
+O contexto resolvido (dados do recebedor, segredo do webhook e o
+template do BR Code já montado) fica em um LRU com TTL; alterações no
+cadastro o descartam na hora.
+
+Com vários workers, cada alteração (cadastro, rotação de chave,
+atualização) também é anexada como uma linha JSON ao log compartilhado
+VALORA_MERCHANT_LOG; os demais workers leem o que foi anexado no máximo
+a cada VALORA_MERCHANT_SYNC_MS (padrão 50 ms) e atualizam registros,
+índice e cache, de modo que uma chave rotacionada deixa de valer em
+todos. Na inicialização o log inteiro é reaplicado sobre o WAL do
+worker.
+
+Variáveis: VALORA_API_KEY_PEPPER, VALORA_MERCHANT_CACHE_SIZE (padrão
+100000), VALORA_MERCHANT_CACHE_TTL (segundos, padrão 60),
+VALORA_MERCHANT_LOG, VALORA_MERCHANT_SYNC_MS.
+"""
+import os
+import hmac
+import json
+import time
+import secrets
+import threading
+from datetime import datetime
+from functools import wraps
+from collections import OrderedDict
+
+from flask import request, jsonify
+
+from src.routes.brcode import MerchantTemplate
+from src.routes.persistence import durable_store
+from src.routes.worker_pool import is_pool_worker
+
+API_KEY_HEADER = 'X-Api-Key'
+KEY_PREFIX_LENGTH = 20    # 'sk_live_' + 12 hex
+MIN_SECRET_LENGTH = 16    # abaixo disso o prefixo seria (quase) a chave inteira
+DEFAULT_CACHE_SIZE = 100000
+DEFAULT_CACHE_TTL = 60.0
+DEFAULT_SYNC_INTERVAL = 0.05
+ENVIRONMENTS = ('sandbox', 'production')
+UPDATABLE_FIELDS = ('name', 'city', 'pix_key', 'webhook_secret', 'active')
+
+API_KEY_PEPPER = os.environ.get('VALORA_API_KEY_PEPPER', 'valora_api_key_pepper_2025').encode('utf-8')
+
+# Comerciante de desenvolvimento (antigo MERCHANT_CONFIG), criado se ainda não existir
+SANDBOX_MERCHANT_ID = 'valora_merchant_001'
+SANDBOX_MERCHANT = {
+    'api_key': 'sk_test_valora_12345',
+    'webhook_secret': 'whsec_valora_67890',
+    'pix_key': 'pix@valorapay.com',
+    'name': 'Valora Pay',
+    'city': 'Sao Paulo',
+    'environment': 'sandbox'
+}
+
+
+class MerchantError(Exception):
+    """Cadastro de comerciante inválido"""
+
+
+class MerchantContext:
+    """Comerciante autenticado (imutável; trocado inteiro quando o cadastro muda)"""
+
+    __slots__ = ('id', 'name', 'city', 'pix_key', 'webhook_secret', 'environment',
+                 'key_digest', 'pix_template', 'expires_at')
+
+    def __init__(self, record, expires_at):
+        self.id = record['id']
+        self.name = record['name']
+        self.city = record['city']
+        self.pix_key = record['pix_key']
+        self.webhook_secret = record['webhook_secret'].encode('utf-8')
+        self.environment = record['environment']
+        self.key_digest = bytes.fromhex(record['api_key_hash'])
+        self.pix_template = MerchantTemplate(self.pix_key, self.name, self.city)
+        self.expires_at = expires_at
+
+
+def generate_api_key(environment):
+    return f"sk_{'live' if environment == 'production' else 'test'}_{secrets.token_hex(6)}{secrets.token_urlsafe(24)}"
+
+
+class MerchantRegistry:
+    """Cadastro persistido, índice por prefixo da chave e cache de contextos"""
+
+    def __init__(self, records=None, pepper=API_KEY_PEPPER, cache_size=DEFAULT_CACHE_SIZE,
+                 ttl=DEFAULT_CACHE_TTL, durable_name=None, log_path=None, sync_interval=DEFAULT_SYNC_INTERVAL):
+        self.records = {} if records is None else records
+        self.pepper = pepper
+        self.cache_size = cache_size
+        self.ttl = ttl
+        # Com nome, o cadastro é recuperado e gravado no WAL
+        self.durable_name = durable_name
+        # Log de alterações compartilhado entre workers
+        self.log_path = log_path
+        self.sync_interval = sync_interval
+        self._log_fd = None
+        self._log_offset = 0
+        self._last_sync = 0.0
+        if durable_name:
+            durable_store.register(durable_name, self.records)
+        for record in list(self.records.values()):
+            if 'api_key_id' not in record:
+                self._save(self._migrate(record))
+        self.key_index = {record['api_key_id']: merchant_id for merchant_id, record in self.records.items()}
+        self.stats = {'hits': 0, 'misses': 0, 'rejected': 0}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # HMAC de referência para identificadores inexistentes (mesmo custo de comparação)
+        self._missing_digest = self.hash_key('')
+        if log_path:
+            self.sync(force=True)
+
+    def hash_key(self, api_key):
+        return hmac.digest(self.pepper, api_key.encode('utf-8'), 'sha256')
+
+    def key_id(self, api_key, digest):
+        """Identificador da chave no índice: o prefixo, ou derivado do HMAC se a chave é curta demais"""
+        if len(api_key) >= KEY_PREFIX_LENGTH + MIN_SECRET_LENGTH:
+            return api_key[:KEY_PREFIX_LENGTH]
+        return f'hmac:{digest.hex()[:32]}'
+
+    def _migrate(self, record):
+        """Registro anterior ao api_key_id (índice pelo prefixo, que na chave do sandbox era a chave inteira)"""
+        record = dict(record)
+        prefix = record.pop('api_key_prefix')
+        digest = self.hash_key(prefix)
+        if hmac.compare_digest(digest, bytes.fromhex(record['api_key_hash'])):
+            record['api_key_id'] = self.key_id(prefix, digest)
+        else:
+            record['api_key_id'] = prefix
+        return record
+
+    def _save(self, record):
+        self.records[record['id']] = record
+        if self.durable_name:
+            durable_store.put(self.durable_name, record['id'], record)
+        if self.log_path:
+            if self._log_fd is None:
+                self._log_fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            # Uma linha por escrita com O_APPEND: linhas de workers diferentes não se misturam
+            os.write(self._log_fd, (json.dumps(record) + '\n').encode('utf-8'))
+
+    def sync(self, force=False):
+        """Aplica as alterações que outros workers anexaram ao log"""
+        if not self.log_path:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_sync < self.sync_interval:
+                return
+            self._last_sync = now
+            try:
+                size = os.path.getsize(self.log_path)
+            except FileNotFoundError:
+                return
+            if size <= self._log_offset:
+                return
+            with open(self.log_path, 'rb') as f:
+                f.seek(self._log_offset)
+                data = f.read(size - self._log_offset)
+            # Só linhas completas (outro worker pode estar no meio de uma escrita)
+            end = data.rfind(b'\n') + 1
+            self._log_offset += end
+            for line in data[:end].splitlines():
+                if line:
+                    self._apply(json.loads(line))
+
+    def _apply(self, record):
+        """Registro vindo do log (chamado com o lock)"""
+        previous = self.records.get(record['id'])
+        if (previous is not None and previous['api_key_id'] != record['api_key_id']
+                and self.key_index.get(previous['api_key_id']) == record['id']):
+            del self.key_index[previous['api_key_id']]
+        self.key_index[record['api_key_id']] = record['id']
+        self.records[record['id']] = record
+        self._cache.pop(record['id'], None)
+
+    def _maybe_sync(self):
+        if self.log_path and time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def register(self, merchant_id, name, city, pix_key, webhook_secret=None, environment='sandbox', api_key=None):
+        """Cadastra o comerciante; devolve (registro, chave de API), a chave só aparece aqui"""
+        if environment not in ENVIRONMENTS:
+            raise MerchantError('Ambiente inválido')
+        self.sync(force=True)
+        with self._lock:
+            if merchant_id in self.records:
+                raise MerchantError('Comerciante já cadastrado')
+            api_key, key_id, digest = self._new_key(environment, api_key)
+            record = {
+                'id': merchant_id,
+                'name': name,
+                'city': city,
+                'pix_key': pix_key,
+                'webhook_secret': webhook_secret or f'whsec_{secrets.token_urlsafe(24)}',
+                'environment': environment,
+                'api_key_id': key_id,
+                'api_key_hash': digest.hex(),
+                'active': True,
+                'created_at': datetime.utcnow().isoformat()
+            }
+            self.key_index[key_id] = merchant_id
+            self._save(record)
+        return record, api_key
+
+    def _new_key(self, environment, api_key=None):
+        """(chave, identificador ainda não usado, HMAC) (chamado com o lock)"""
+        while True:
+            candidate = api_key or generate_api_key(environment)
+            digest = self.hash_key(candidate)
+            key_id = self.key_id(candidate, digest)
+            if len(candidate) >= KEY_PREFIX_LENGTH and key_id not in self.key_index:
+                return candidate, key_id, digest
+            if api_key:
+                raise MerchantError('Prefixo de chave de API já em uso')
+
+    def rotate_key(self, merchant_id):
+        """Nova chave de API; a anterior deixa de valer imediatamente"""
+        self.sync(force=True)
+        with self._lock:
+            record = self.records.get(merchant_id)
+            if record is None:
+                raise MerchantError('Comerciante não encontrado')
+            api_key, key_id, digest = self._new_key(record['environment'])
+            record = dict(record, api_key_id=key_id, api_key_hash=digest.hex())
+            del self.key_index[self.records[merchant_id]['api_key_id']]
+            self.key_index[key_id] = merchant_id
+            self._save(record)
+            self._cache.pop(merchant_id, None)
+        return api_key
+
+    def update(self, merchant_id, **changes):
+        """Altera dados do recebedor, segredo do webhook ou ativação"""
+        unknown = sorted(set(changes) - set(UPDATABLE_FIELDS))
+        if unknown:
+            raise MerchantError(f'Campos não alteráveis: {", ".join(unknown)}')
+        self.sync(force=True)
+        with self._lock:
+            record = self.records.get(merchant_id)
+            if record is None:
+                raise MerchantError('Comerciante não encontrado')
+            record = dict(record, **changes)
+            self._save(record)
+            self._cache.pop(merchant_id, None)
+        return record
+
+    def context(self, merchant_id, now=None):
+        """Contexto do comerciante ativo (LRU com TTL), ou None"""
+        now = now or time.monotonic()
+        self._maybe_sync()
+        with self._lock:
+            context = self._cache.get(merchant_id)
+            if context is not None and context.expires_at > now:
+                self._cache.move_to_end(merchant_id)
+                self.stats['hits'] += 1
+                return context
+        record = self.records.get(merchant_id)
+        if record is None or not record['active']:
+            return None
+        context = MerchantContext(record, now + self.ttl)
+        with self._lock:
+            self.stats['misses'] += 1
+            self._cache[merchant_id] = context
+            self._cache.move_to_end(merchant_id)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return context
+
+    def authenticate(self, api_key, now=None):
+        """Contexto do dono da chave, ou None (comparação em tempo constante)"""
+        if not isinstance(api_key, str) or len(api_key) < KEY_PREFIX_LENGTH:
+            return None
+        digest = self.hash_key(api_key)
+        self._maybe_sync()
+        merchant_id = self.key_index.get(self.key_id(api_key, digest))
+        context = self.context(merchant_id, now) if merchant_id is not None else None
+        expected = context.key_digest if context is not None else self._missing_digest
+        if not hmac.compare_digest(digest, expected) or context is None:
+            self.stats['rejected'] += 1
+            return None
+        return context
+
+    def describe(self, merchant_id):
+        """Registro sem o hash da chave"""
+        self._maybe_sync()
+        record = self.records.get(merchant_id)
+        if record is None:
+            return None
+        data = {key: value for key, value in record.items()
+                if key not in ('api_key_hash', 'api_key_id', 'webhook_secret')}
+        # Só o prefixo público; o identificador derivado do HMAC não é exposto
+        key_id = record['api_key_id']
+        data['api_key_prefix'] = None if key_id.startswith('hmac:') else key_id
+        data['webhook_secret_last4'] = record['webhook_secret'][-4:]
+        return data
+
+
+def open_registry_from_env():
+    # Processos de pool não autenticam nem alteram comerciantes: sem log compartilhado
+    log_path = None if is_pool_worker() else os.environ.get('VALORA_MERCHANT_LOG')
+    registry = MerchantRegistry(cache_size=int(os.environ.get('VALORA_MERCHANT_CACHE_SIZE', DEFAULT_CACHE_SIZE)),
+                                ttl=float(os.environ.get('VALORA_MERCHANT_CACHE_TTL', DEFAULT_CACHE_TTL)),
+                                durable_name='merchants', log_path=log_path,
+                                sync_interval=int(os.environ.get('VALORA_MERCHANT_SYNC_MS',
+                                                                 DEFAULT_SYNC_INTERVAL * 1000)) / 1000)
+    if SANDBOX_MERCHANT_ID not in registry.records:
+        registry.register(SANDBOX_MERCHANT_ID, SANDBOX_MERCHANT['name'], SANDBOX_MERCHANT['city'],
+                          SANDBOX_MERCHANT['pix_key'], SANDBOX_MERCHANT['webhook_secret'],
+                          SANDBOX_MERCHANT['environment'], SANDBOX_MERCHANT['api_key'])
+    return registry
+
+
+merchant_registry = open_registry_from_env()
+
+
+def require_merchant(f):
+    """Decorator para rotas do comerciante (chave de API no cabeçalho X-Api-Key)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        api_key = request.headers.get(API_KEY_HEADER)
+        if not api_key:
+            return jsonify({'success': False, 'error': 'Chave de API requerida'}), 401
+
+        merchant = merchant_registry.authenticate(api_key)
+        if merchant is None:
+            return jsonify({'success': False, 'error': 'Chave de API inválida'}), 401
+
+        # Adicionar comerciante ao contexto da requisição
+        request.merchant = merchant
+        return f(*args, **kwargs)
+
+    return decorated_function
@@ -0,0 +1,259 @@
+"""Motor de MFA: TOTP, OTP por SMS, desafios e proteção contra replay
+
+- Verificadores TOTP (RFC 6238) ficam em um cache LRU por usuário: o
+  segredo base32 é decodificado uma vez e os códigos de cada passo de
+  tempo são calculados uma vez (hmac.digest) e reaproveitados.
+- Um código aceito marca (usuário, passo) como usado; só os passos
+  dentro da janela de validade ficam em memória, então o conjunto é
+  limitado pelo número de verificações em ~90 s.
+- Cada login com MFA gera um desafio: conta tentativas, é consumido na
+  primeira verificação bem-sucedida e guarda o OTP de SMS (apenas o
+  HMAC do código, com TTL próprio e intervalo mínimo entre reenvios).
+- LocalSMSSender é o remetente local de desenvolvimento: guarda as
+  últimas mensagens e, com VALORA_SMS_OUTBOX, anexa cada uma (NDJSON) ao
+  arquivo.
+"""
+import os
+import json
+import time
+import hmac
+import base64
+import secrets
+import threading
+from collections import OrderedDict, deque
+
+TOTP_INTERVAL = 30
+TOTP_DIGITS = 6
+VALID_WINDOW = 1
+MAX_ATTEMPTS = 5
+CHALLENGE_TTL = 300
+SMS_CODE_DIGITS = 6
+SMS_CODE_TTL = 300
+SMS_RESEND_INTERVAL = 30
+VERIFIER_CACHE_SIZE = 100000
+OUTBOX_SIZE = 1000
+
+
+class MFAError(Exception):
+    """Verificação MFA recusada (mensagem e status HTTP)"""
+
+    def __init__(self, message, status=401):
+        super().__init__(message)
+        self.status = status
+
+
+class TOTPVerifier:
+    """Segredo decodificado e códigos dos passos recentes de um usuário"""
+
+    __slots__ = ('secret', 'key', 'codes')
+
+    def __init__(self, secret):
+        self.secret = secret
+        padded = secret.upper() + '=' * (-len(secret) % 8)
+        self.key = base64.b32decode(padded)
+        self.codes = {}
+
+    def code(self, step):
+        code = self.codes.get(step)
+        if code is None:
+            digest = hmac.digest(self.key, step.to_bytes(8, 'big'), 'sha1')
+            offset = digest[-1] & 0x0F
+            value = int.from_bytes(digest[offset:offset + 4], 'big') & 0x7FFFFFFF
+            code = str(value % 10 ** TOTP_DIGITS).zfill(TOTP_DIGITS)
+            # Só os passos da janela atual interessam
+            if len(self.codes) > 2 * VALID_WINDOW + 1:
+                self.codes.clear()
+            self.codes[step] = code
+        return code
+
+    def match(self, code, step, window=VALID_WINDOW):
+        """Passo de tempo em que o código é válido, ou None"""
+        for candidate in range(step - window, step + window + 1):
+            if hmac.compare_digest(self.code(candidate), code):
+                return candidate
+        return None
+
+
+class UsedCodes:
+    """(usuário, passo) já aceitos, apenas para os passos ainda válidos"""
+
+    def __init__(self, window=VALID_WINDOW):
+        self.window = window
+        self.steps = {}
+
+    def __len__(self):
+        return sum(len(users) for users in self.steps.values())
+
+    def use(self, user_id, step, current_step):
+        """Marca o passo como usado; False se o código já tinha sido aceito (replay)"""
+        for old in [old for old in self.steps if old < current_step - self.window]:
+            del self.steps[old]
+        users = self.steps.get(step)
+        if users is None:
+            users = self.steps[step] = set()
+        if user_id in users:
+            return False
+        users.add(user_id)
+        return True
+
+
+class MFAChallenge:
+    """Desafio de um login com MFA"""
+
+    __slots__ = ('id', 'user_id', 'expires_at', 'attempts', 'verified',
+                 'sms_digest', 'sms_expires_at', 'sms_sent_at')
+
+    def __init__(self, challenge_id, user_id, expires_at):
+        self.id = challenge_id
+        self.user_id = user_id
+        self.expires_at = expires_at
+        self.attempts = 0
+        self.verified = False
+        self.sms_digest = None
+        self.sms_expires_at = 0.0
+        self.sms_sent_at = 0.0
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+class LocalSMSSender:
+    """Remetente de SMS local (desenvolvimento): nada sai da máquina"""
+
+    def __init__(self, outbox=None, size=OUTBOX_SIZE):
+        self.outbox = outbox
+        self.messages = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def send(self, phone, message):
+        record = {'phone': phone, 'message': message, 'sent_at': time.time()}
+        with self._lock:
+            self.messages.append(record)
+            if self.outbox:
+                with open(self.outbox, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class MFAEngine:
+    """Desafios, verificadores TOTP em cache e OTP por SMS"""
+
+    def __init__(self, challenges, sms_sender, secret_key, cache_size=VERIFIER_CACHE_SIZE,
+                 challenge_ttl=CHALLENGE_TTL, max_attempts=MAX_ATTEMPTS, on_change=None):
+        self.challenges = challenges
+        self.sms_sender = sms_sender
+        self.secret_key = secret_key.encode('utf-8')
+        self.cache_size = cache_size
+        self.challenge_ttl = challenge_ttl
+        self.max_attempts = max_attempts
+        # on_change(desafio, removido) mantém WAL e timers de expiração em dia
+        self.on_change = on_change or (lambda challenge, removed: None)
+        self.verifiers = OrderedDict()
+        self.used_codes = UsedCodes()
+        self.stats = {'verified': 0, 'rejected': 0, 'replayed': 0, 'locked': 0}
+        self._lock = threading.Lock()
+
+    def verifier(self, user_id, secret):
+        """Verificador em cache (recriado se o segredo do usuário mudou)"""
+        with self._lock:
+            verifier = self.verifiers.get(user_id)
+            if verifier is not None and verifier.secret == secret:
+                self.verifiers.move_to_end(user_id)
+                return verifier
+        verifier = TOTPVerifier(secret)
+        with self._lock:
+            self.verifiers[user_id] = verifier
+            if len(self.verifiers) > self.cache_size:
+                self.verifiers.popitem(last=False)
+        return verifier
+
+    def create_challenge(self, user_id, now=None):
+        now = now or time.time()
+        challenge = MFAChallenge(f'mfa_{secrets.token_hex(8)}', user_id, now + self.challenge_ttl)
+        self.challenges[challenge.id] = challenge
+        self.on_change(challenge, False)
+        return challenge
+
+    def _sms_digest(self, challenge_id, code):
+        return hmac.digest(self.secret_key, f'{challenge_id}:{code}'.encode('utf-8'), 'sha256')
+
+    def send_sms(self, challenge_id, user_id, phone, now=None):
+        """Gera e envia um OTP por SMS para o desafio"""
+        now = now or time.time()
+        challenge = self._open_challenge(challenge_id, user_id, now)
+        if now - challenge.sms_sent_at < SMS_RESEND_INTERVAL:
+            raise MFAError('Aguarde para solicitar um novo código', 429)
+
+        code = str(secrets.randbelow(10 ** SMS_CODE_DIGITS)).zfill(SMS_CODE_DIGITS)
+        challenge.sms_digest = self._sms_digest(challenge.id, code)
+        challenge.sms_expires_at = now + SMS_CODE_TTL
+        challenge.sms_sent_at = now
+        self.on_change(challenge, False)
+        self.sms_sender.send(phone, f'Valora Pay: seu código de verificação é {code}')
+        return challenge.sms_expires_at
+
+    def _open_challenge(self, challenge_id, user_id, now):
+        challenge = self.challenges.get(challenge_id)
+        if (challenge is None or not isinstance(challenge, MFAChallenge)
+                or challenge.user_id != user_id or challenge.expires_at <= now):
+            raise MFAError('Desafio MFA expirado ou inválido')
+        if challenge.verified:
+            raise MFAError('Desafio MFA já utilizado')
+        return challenge
+
+    def _consume(self, challenge):
+        challenge.verified = True
+        del self.challenges[challenge.id]
+        self.on_change(challenge, True)
+
+    def verify(self, challenge_id, user_id, method, code, totp_secret=None, now=None):
+        """Verifica o código e consome o desafio; levanta MFAError se recusado"""
+        now = now or time.time()
+        with self._lock:
+            challenge = self._open_challenge(challenge_id, user_id, now)
+            challenge.attempts += 1
+            if challenge.attempts > self.max_attempts:
+                self.stats['locked'] += 1
+                del self.challenges[challenge.id]
+                self.on_change(challenge, True)
+                raise MFAError('Muitas tentativas; faça login novamente', 429)
+
+        if method == 'authenticator':
+            if not totp_secret:
+                raise MFAError('Autenticador não configurado', 400)
+            current_step = int(now // TOTP_INTERVAL)
+            step = self.verifier(user_id, totp_secret).match(code, current_step)
+            if step is None:
+                self._reject(challenge)
+            with self._lock:
+                if not self.used_codes.use(user_id, step, current_step):
+                    self.stats['replayed'] += 1
+                    self._reject(challenge, 'Código já utilizado')
+        elif method == 'sms':
+            if challenge.sms_digest is None or challenge.sms_expires_at <= now:
+                self._reject(challenge, 'Código SMS expirado ou não solicitado')
+            if not hmac.compare_digest(challenge.sms_digest, self._sms_digest(challenge.id, code)):
+                self._reject(challenge)
+        else:
+            raise MFAError('Método MFA não suportado', 400)
+
+        with self._lock:
+            # Outra requisição pode ter consumido o desafio durante a verificação
+            if challenge.verified or challenge.id not in self.challenges:
+                raise MFAError('Desafio MFA já utilizado')
+            self._consume(challenge)
+            self.stats['verified'] += 1
+
+    def _reject(self, challenge, message='Código inválido'):
+        self.stats['rejected'] += 1
+        # Tentativa contada persiste (limite vale também após reinício)
+        self.on_change(challenge, False)
+        raise MFAError(message)
+
+
+def open_sms_sender_from_env():
+    """Remetente local; com VALORA_SMS_OUTBOX as mensagens também vão para o arquivo"""
+    return LocalSMSSender(os.environ.get('VALORA_SMS_OUTBOX'))
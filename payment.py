@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import uuid
 import hashlib
 import hmac
@@ -10,23 +10,125 @@ from decimal import Decimal
 import qrcode
 from io import BytesIO
 import base64 as b64
+import io
+from src.routes.acquirer import get_acquirer, AcquirerError, AcquirerTimeout
+from src.routes.refunds import (
+    RefundError, to_cents, refundable_cents, reserve_refund,
+    cancel_refund, confirm_refund, list_refunds, transaction_lock
+)
+from src.routes.transaction_status import (
+    on_status_change, record_transaction_created, set_transaction_status, durable_record
+)
+from src.routes.dashboard import dashboard_aggregates, convert_volumes, GRANULARITIES
+from src.routes.reconciliation import reconcile
+from src.routes.risk import risk_store, score_payment
+from src.routes.vault import card_vault, VaultError
+from src.routes.auth import require_auth
+from src.routes.merchants import (
+    merchant_registry, require_merchant, MerchantError, SANDBOX_MERCHANT_ID, ENVIRONMENTS, UPDATABLE_FIELDS
+)
+from src.routes.persistence import durable_store
+from src.routes.validators import field, compile_schema, validation_error
+from src.routes.status_history import status_history
+from src.routes.brcode import normalize_txid, parse_payload, BRCodeError
+from src.routes.expiry import expiry_wheel
+from src.routes.status_stream import status_broker
+from src.routes.tracing import span, traced_route
+from src.routes.currency import fx_rates, currency_errors, CURRENCIES, SETTLEMENT_CURRENCY, CurrencyError
+from src.routes.settlement import settlement_engine, SettlementError
+from src.routes.installments import installment_engine, InstallmentError, MAX_BULK_AMOUNTS, DEFAULT_CONFIG
 
 payment_bp = Blueprint('payment', __name__)
 
-# Simulação de dados de configuração (em produção, usar variáveis de ambiente)
-MERCHANT_CONFIG = {
-    'merchant_id': 'valora_merchant_001',
-    'api_key': 'sk_test_valora_12345',
-    'webhook_secret': 'whsec_valora_67890',
-    'pix_key': 'pix@valorapay.com',
-    'environment': 'sandbox'  # sandbox ou production
-}
-
 # Simulação de base de dados em memória (em produção, usar banco de dados real)
 transactions_db = {}
 pix_payments_db = {}
 boleto_payments_db = {}
 
+PAYMENT_METHODS = ('credit_card', 'debit_card', 'pix', 'boleto')
+NON_DIGITS = re.compile(r'\D')
+
+# Estado recuperado do WAL/snapshot (com VALORA_DATA_DIR definido)
+durable_store.register('transactions', transactions_db)
+durable_store.register('pix_payments', pix_payments_db)
+durable_store.register('boleto_payments', boleto_payments_db)
+
+
+def utc_timestamp(value):
+    """Timestamp de uma data ISO em UTC (formato gravado nas transações)"""
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+def persist_transaction(transaction, previous, status, source):
+    """Grava a transação no WAL a cada criação ou mudança de status"""
+    durable_store.put('transactions', transaction['id'], durable_record(transaction))
+
+
+def cancel_expiry(transaction, previous, status, source):
+    """Cobrança que saiu de `waiting_payment` não expira mais"""
+    if previous == 'waiting_payment' and status != 'waiting_payment':
+        expiry_wheel.cancel(transaction['payment_method'], transaction['id'])
+
+
+def expire_charge(transaction_id):
+    """Cobrança PIX/boleto vencida sem pagamento: status `expired` e dados do PIX descartados"""
+    transaction = transactions_db.get(transaction_id)
+    if transaction is None:
+        return
+    # Checagem e transição sob o lock da transação (o mesmo do webhook e da simulação)
+    with durable_store.batch(), transaction_lock(transaction_id):
+        if transaction['status'] != 'waiting_payment':
+            return
+        set_transaction_status(transaction, 'expired', 'expiry')
+        if pix_payments_db.pop(transaction_id, None) is not None:
+            durable_store.delete('pix_payments', transaction_id)
+
+
+def schedule_expiry(transaction):
+    """Agenda o vencimento da cobrança (expiração do PIX, vencimento do boleto)"""
+    if transaction['payment_method'] == 'pix' and transaction['id'] in pix_payments_db:
+        deadline = pix_payments_db[transaction['id']]['pix_data']['expiration']
+    elif transaction['payment_method'] == 'boleto' and transaction['id'] in boleto_payments_db:
+        deadline = boleto_payments_db[transaction['id']]['boleto_data']['due_date']
+    else:
+        return
+    expiry_wheel.schedule(transaction['payment_method'], transaction['id'], utc_timestamp(deadline))
+
+
+# Agregados do dashboard atualizados a cada transição de status
+on_status_change(dashboard_aggregates.record_transition)
+on_status_change(persist_transaction)
+# Log de eventos somente-anexação com todas as transições
+on_status_change(status_history.record)
+on_status_change(cancel_expiry)
+# Clientes do checkout esperando a transação (SSE/long-poll no modo ASGI)
+on_status_change(status_broker.publish)
+status_broker.transactions = transactions_db
+expiry_wheel.on_expire('pix', expire_charge)
+expiry_wheel.on_expire('boleto', expire_charge)
+
+for _transaction in transactions_db.values():
+    # QR Code fora do registro da transação no WAL (ver durable_record)
+    _payment_data = _transaction.get('payment_data')
+    if _payment_data and 'qr_code' not in _payment_data and _transaction['id'] in pix_payments_db:
+        _payment_data['qr_code'] = pix_payments_db[_transaction['id']]['qr_code']
+    # Reservas de estorno não sobrevivem a um reinício
+    if _transaction.get('refund_pending_cents'):
+        _transaction['refund_pending_cents'] = 0
+    dashboard_aggregates.record_transition(
+        _transaction, None, _transaction['status'], 'recovery', utc_timestamp(_transaction['updated_at'])
+    )
+    # Cobranças vencidas durante a parada expiram no primeiro tick
+    if _transaction['status'] == 'waiting_payment':
+        schedule_expiry(_transaction)
+
+def merchant_transaction(transaction_id):
+    """Transação do comerciante autenticado (None se não existe ou é de outro)"""
+    transaction = transactions_db.get(transaction_id)
+    if transaction is None or transaction.get('merchant_id', SANDBOX_MERCHANT_ID) != request.merchant.id:
+        return None
+    return transaction
+
 @payment_bp.route('/api/v1/payment/methods', methods=['GET'])
 def get_payment_methods():
     """Retorna os métodos de pagamento disponíveis"""
@@ -40,7 +142,8 @@ def get_payment_methods():
             'fees': {
                 'percentage': 3.99,
                 'fixed': 0.39
-            }
+            },
+            'installments': installment_engine.describe()
         },
         'debit_card': {
             'enabled': True,
@@ -81,61 +184,45 @@ def get_payment_methods():
         'data': methods
     })
 
+# Esquema do corpo de criação de pagamento
+validate_payment_body = compile_schema({
+    'amount': field('number', greater_than=0, message='Valor deve ser maior que zero'),
+    'currency': field(choices=CURRENCIES, message='Moeda não suportada'),
+    'payment_method': field(choices=PAYMENT_METHODS, message='Método de pagamento não suportado'),
+    'customer': field('object'),
+    'card': field('object', required=False),
+    'installments': field('number', required=False, message='Número de parcelas inválido'),
+    'description': field(required=False, max_length=255),
+    'metadata': field('object', required=False),
+})
+
 @payment_bp.route('/api/v1/payment/create', methods=['POST'])
+@traced_route('create_payment')
+@require_merchant
 def create_payment():
     """Cria uma nova transação de pagamento"""
     try:
         data = request.get_json()
         
-        # Validação dos dados obrigatórios
-        required_fields = ['amount', 'currency', 'payment_method', 'customer']
-        for field in required_fields:
-            if field not in data:
+        transaction, error = open_payment(data, request.merchant, request.remote_addr)
+        if error:
+            return jsonify(error[0]), error[1]
+        
+        # Processar baseado no método de pagamento
+        with span('payment.process', **{'payment.method': data['payment_method']}):
+            if data['payment_method'] in ['credit_card', 'debit_card']:
+                result = process_card_payment(transaction, data)
+            elif data['payment_method'] == 'pix':
+                result = process_pix_payment(transaction, data)
+            elif data['payment_method'] == 'boleto':
+                result = process_boleto_payment(transaction, data)
+            else:
                 return jsonify({
                     'success': False,
-                    'error': f'Campo obrigatório: {field}'
+                    'error': 'Método de pagamento não suportado'
                 }), 400
         
-        # Validação do valor
-        amount = float(data['amount'])
-        if amount <= 0:
-            return jsonify({
-                'success': False,
-                'error': 'Valor deve ser maior que zero'
-            }), 400
-        
-        # Gerar ID da transação
-        transaction_id = f"tx_{uuid.uuid4().hex[:16]}"
-        
-        # Dados base da transação
-        transaction = {
-            'id': transaction_id,
-            'amount': amount,
-            'currency': data['currency'],
-            'payment_method': data['payment_method'],
-            'customer': data['customer'],
-            'status': 'pending',
-            'created_at': datetime.utcnow().isoformat(),
-            'updated_at': datetime.utcnow().isoformat(),
-            'metadata': data.get('metadata', {})
-        }
-        
-        # Processar baseado no método de pagamento
-        if data['payment_method'] in ['credit_card', 'debit_card']:
-            result = process_card_payment(transaction, data)
-        elif data['payment_method'] == 'pix':
-            result = process_pix_payment(transaction, data)
-        elif data['payment_method'] == 'boleto':
-            result = process_boleto_payment(transaction, data)
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Método de pagamento não suportado'
-            }), 400
-        
-        # Salvar transação
-        transactions_db[transaction_id] = transaction
-        
+        save_transaction(transaction)
         return jsonify(result)
         
     except Exception as e:
@@ -144,39 +231,173 @@ def create_payment():
             'error': f'Erro interno: {str(e)}'
         }), 500
 
+def open_payment(data, merchant, remote_addr):
+    """Valida o corpo e monta a transação; retorna (transação, (erro, status HTTP))"""
+    # Validação do corpo (todos os erros de uma vez)
+    with span('payment.validate'):
+        errors = validate_payment_body(data)
+    if errors:
+        return None, (validation_error(errors), 400)
+    
+    # PIX e boleto só em reais
+    currency_error = currency_errors(data['currency'], data['payment_method'])
+    if currency_error:
+        return None, ({
+            'success': False,
+            'error': currency_error
+        }, 400)
+    
+    amount = float(data['amount'])
+    
+    # Gerar ID da transação
+    transaction_id = f"tx_{uuid.uuid4().hex[:16]}"
+    
+    # Dados base da transação
+    transaction = {
+        'id': transaction_id,
+        'merchant_id': merchant.id,
+        'amount': amount,
+        'currency': data['currency'],
+        'payment_method': data['payment_method'],
+        'customer': data['customer'],
+        'status': 'pending',
+        'created_at': datetime.utcnow().isoformat(),
+        'updated_at': datetime.utcnow().isoformat(),
+        'metadata': data.get('metadata', {})
+    }
+    
+    # Valor na moeda de liquidação, com a cotação usada (fixada na criação)
+    with span('fx.convert'):
+        transaction['settlement'] = fx_rates.settlement(amount, data['currency'])
+    
+    # Análise de risco (velocidade por cliente, cartão e IP)
+    with span('risk.score'):
+        risk_score, risk_factors = score_payment(
+            risk_store,
+            customer_risk_key(data['customer']),
+            card_risk_key(data.get('card')),
+            remote_addr,
+            int(round(transaction['settlement']['amount'] * 100))
+        )
+    transaction['risk'] = {
+        'score': risk_score,
+        'factors': risk_factors
+    }
+    return transaction, None
+
+def save_transaction(transaction):
+    """Salva a transação criada e notifica os ouvintes (WAL, painel, histórico)"""
+    with span('store.write'):
+        transactions_db[transaction['id']] = transaction
+        record_transaction_created(transaction)
+
 def process_card_payment(transaction, data):
     """Processa pagamento com cartão"""
+    error, authorization_request = prepare_card_payment(transaction, data)
+    if error:
+        return error
+    
+    # Autorizar no adquirente
+    try:
+        with span('acquirer.authorize', **{'card.brand': authorization_request['card_brand']}):
+            authorization = get_acquirer().authorize(authorization_request['payload'])
+    except AcquirerError as e:
+        return complete_card_payment(transaction, authorization_request, None, e)
+    
+    return complete_card_payment(transaction, authorization_request, authorization)
+
+def prepare_card_payment(transaction, data):
+    """Valida cartão e parcelamento; retorna (erro, pedido de autorização ao adquirente)"""
     card_data = data.get('card', {})
     
-    # Validação dos dados do cartão
-    required_card_fields = ['number', 'exp_month', 'exp_year', 'cvc', 'holder_name']
-    for field in required_card_fields:
-        if field not in card_data:
+    # Validação dos dados do cartão (inclui Luhn)
+    with span('card.validate'):
+        errors = validate_card_body(card_data)
+    if errors:
+        return validation_error(errors), None
+    
+    # Parcelamento (crédito em reais); a opção vem da grade vigente
+    installments = data.get('installments') or 1
+    plan = None
+    if float(installments) != 1:
+        if (not float(installments).is_integer() or transaction['payment_method'] != 'credit_card'
+                or transaction['currency'] != SETTLEMENT_CURRENCY):
             return {
                 'success': False,
-                'error': f'Dados do cartão incompletos: {field}'
-            }
+                'error': 'Parcelamento disponível apenas no crédito em reais, em número inteiro de parcelas'
+            }, None
+        try:
+            plan = installment_engine.plan(transaction['amount'], int(float(installments)))
+        except InstallmentError as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, None
+        transaction['installments'] = plan
     
-    # Validação do número do cartão (Luhn algorithm)
-    if not validate_card_number(card_data['number']):
+    # Tokenizar dados do cartão (em produção, usar tokenização real)
+    with span('card.tokenize'):
+        card_token = generate_card_token(card_data)
+    card_brand = detect_card_brand(card_data['number'])
+    
+    return None, {
+        'payload': {
+            'idempotency_key': transaction['id'],
+            'transaction_id': transaction['id'],
+            'amount': plan['total'] if plan else transaction['amount'],
+            'currency': transaction['currency'],
+            'payment_method': transaction['payment_method'],
+            'installments': plan['installments'] if plan else 1,
+            'card_token': card_token,
+            'card_brand': card_brand
+        },
+        'plan': plan,
+        'card_token': card_token,
+        'card_brand': card_brand,
+        'card_last4': card_data['number'][-4:]
+    }
+
+def complete_card_payment(transaction, authorization_request, authorization, error=None):
+    """Aplica a resposta do adquirente (ou a falha `error` da chamada) à transação"""
+    if isinstance(error, AcquirerTimeout):
+        # Sem resposta no prazo a autorização pode ter sido feita: não é recusa.
+        # A chave de idempotência (id da transação) permite consultar o resultado depois
+        transaction['status'] = 'pending_review'
+        transaction['decline_reason'] = 'Autorização sem resposta do adquirente'
+        transaction['card_token'] = authorization_request['card_token']
+        transaction['card_last4'] = authorization_request['card_last4']
+        transaction['card_brand'] = authorization_request['card_brand']
+        
         return {
             'success': False,
-            'error': 'Número do cartão inválido'
+            'error': 'Autorização em análise: sem resposta do adquirente no prazo',
+            'data': {
+                'transaction_id': transaction['id'],
+                'status': 'pending_review',
+                'decline_reason': transaction['decline_reason']
+            }
         }
     
-    # Tokenizar dados do cartão (em produção, usar tokenização real)
-    card_token = generate_card_token(card_data)
-    
-    # Simular processamento (em produção, integrar com adquirente)
-    import random
-    success_rate = 0.95  # 95% de aprovação para simulação
+    if error is not None:
+        transaction['status'] = 'failed'
+        transaction['decline_reason'] = 'Adquirente indisponível'
+        
+        return {
+            'success': False,
+            'error': 'Adquirente indisponível',
+            'data': {
+                'transaction_id': transaction['id'],
+                'status': 'failed',
+                'decline_reason': transaction['decline_reason']
+            }
+        }
     
-    if random.random() < success_rate:
+    if authorization['approved']:
         transaction['status'] = 'approved'
-        transaction['authorization_code'] = f"AUTH_{uuid.uuid4().hex[:8].upper()}"
-        transaction['card_token'] = card_token
-        transaction['card_last4'] = card_data['number'][-4:]
-        transaction['card_brand'] = detect_card_brand(card_data['number'])
+        transaction['authorization_code'] = authorization['authorization_code']
+        transaction['card_token'] = authorization_request['card_token']
+        transaction['card_last4'] = authorization_request['card_last4']
+        transaction['card_brand'] = authorization_request['card_brand']
         
         return {
             'success': True,
@@ -187,12 +408,13 @@ def process_card_payment(transaction, data):
                 'amount': transaction['amount'],
                 'currency': transaction['currency'],
                 'card_last4': transaction['card_last4'],
-                'card_brand': transaction['card_brand']
+                'card_brand': transaction['card_brand'],
+                'installments': authorization_request['plan']
             }
         }
     else:
         transaction['status'] = 'declined'
-        transaction['decline_reason'] = 'Cartão recusado pelo banco emissor'
+        transaction['decline_reason'] = authorization.get('decline_reason', 'Cartão recusado pelo banco emissor')
         
         return {
             'success': False,
@@ -207,7 +429,8 @@ def process_card_payment(transaction, data):
 def process_pix_payment(transaction, data):
     """Processa pagamento PIX"""
     # Gerar chave PIX e QR Code
-    pix_key = MERCHANT_CONFIG['pix_key']
+    merchant = request.merchant
+    pix_key = merchant.pix_key
     
     # Dados do PIX (formato simplificado)
     pix_data = {
@@ -217,20 +440,29 @@ def process_pix_payment(transaction, data):
         'transaction_id': transaction['id'],
         'expiration': (datetime.utcnow() + timedelta(minutes=30)).isoformat()
     }
+    # Payload BR Code (copia e cola): prefixo do recebedor + valor e txid da cobrança
+    with span('pix.brcode'):
+        pix_data['txid'] = normalize_txid(transaction['id'])
+        pix_data['brcode'] = merchant.pix_template.payload(transaction['amount'], pix_data['txid'])
     
     # Gerar QR Code
-    qr_code_data = generate_pix_qr_code(pix_data)
+    with span('pix.qr_render'):
+        qr_code_data = generate_pix_qr_code(pix_data)
     
     # Salvar dados do PIX
-    pix_payments_db[transaction['id']] = {
-        'pix_data': pix_data,
-        'qr_code': qr_code_data,
-        'status': 'waiting_payment'
-    }
+    with span('store.write'):
+        pix_payments_db[transaction['id']] = {
+            'pix_data': pix_data,
+            'qr_code': qr_code_data,
+            'status': 'waiting_payment'
+        }
+        durable_store.put('pix_payments', transaction['id'], pix_payments_db[transaction['id']])
+        schedule_expiry(transaction)
     
     transaction['status'] = 'waiting_payment'
     transaction['payment_data'] = {
         'pix_key': pix_key,
+        'brcode': pix_data['brcode'],
         'qr_code': qr_code_data,
         'expiration': pix_data['expiration']
     }
@@ -242,6 +474,7 @@ def process_pix_payment(transaction, data):
             'status': 'waiting_payment',
             'payment_method': 'pix',
             'pix_key': pix_key,
+            'brcode': pix_data['brcode'],
             'qr_code': qr_code_data,
             'amount': transaction['amount'],
             'currency': transaction['currency'],
@@ -254,20 +487,24 @@ def process_boleto_payment(transaction, data):
     # Gerar dados do boleto
     due_date = datetime.utcnow() + timedelta(days=3)
     
-    boleto_data = {
-        'barcode': generate_boleto_barcode(transaction),
-        'digitable_line': generate_digitable_line(transaction),
-        'due_date': due_date.isoformat(),
-        'amount': transaction['amount'],
-        'recipient': MERCHANT_CONFIG['merchant_id'],
-        'payer': data['customer']
-    }
+    with span('boleto.generate'):
+        boleto_data = {
+            'barcode': generate_boleto_barcode(transaction),
+            'digitable_line': generate_digitable_line(transaction),
+            'due_date': due_date.isoformat(),
+            'amount': transaction['amount'],
+            'recipient': transaction['merchant_id'],
+            'payer': data['customer']
+        }
     
     # Salvar dados do boleto
-    boleto_payments_db[transaction['id']] = {
-        'boleto_data': boleto_data,
-        'status': 'waiting_payment'
-    }
+    with span('store.write'):
+        boleto_payments_db[transaction['id']] = {
+            'boleto_data': boleto_data,
+            'status': 'waiting_payment'
+        }
+        durable_store.put('boleto_payments', transaction['id'], boleto_payments_db[transaction['id']])
+        schedule_expiry(transaction)
     
     transaction['status'] = 'waiting_payment'
     transaction['payment_data'] = boleto_data
@@ -288,50 +525,87 @@ def process_boleto_payment(transaction, data):
     }
 
 @payment_bp.route('/api/v1/payment/<transaction_id>', methods=['GET'])
+@require_merchant
 def get_payment_status(transaction_id):
     """Consulta o status de uma transação"""
-    if transaction_id not in transactions_db:
+    transaction = merchant_transaction(transaction_id)
+    if transaction is None:
         return jsonify({
             'success': False,
             'error': 'Transação não encontrada'
         }), 404
     
-    transaction = transactions_db[transaction_id]
-    
-    return jsonify({
+    response = jsonify({
         'success': True,
         'data': {
             'transaction_id': transaction['id'],
             'status': transaction['status'],
+            'version': transaction.get('version', 1),
             'amount': transaction['amount'],
             'currency': transaction['currency'],
             'payment_method': transaction['payment_method'],
+            'settlement': transaction.get('settlement'),
             'created_at': transaction['created_at'],
             'updated_at': transaction['updated_at']
         }
     })
+    # If-None-Match com a versão atual -> 304 sem corpo
+    response.set_etag(str(transaction.get('version', 1)))
+    return response.make_conditional(request)
+
+@payment_bp.route('/api/v1/payment/<transaction_id>/history', methods=['GET'])
+@require_merchant
+def get_payment_history(transaction_id):
+    """Linha do tempo das mudanças de status de uma transação"""
+    transaction = merchant_transaction(transaction_id)
+    if transaction is None:
+        return jsonify({
+            'success': False,
+            'error': 'Transação não encontrada'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'transaction_id': transaction_id,
+            'status': transaction['status'],
+            'history': status_history.history(transaction_id) or []
+        }
+    })
 
 @payment_bp.route('/api/v1/payment/<transaction_id>/capture', methods=['POST'])
+@require_merchant
 def capture_payment(transaction_id):
     """Captura um pagamento pré-autorizado"""
-    if transaction_id not in transactions_db:
+    transaction = merchant_transaction(transaction_id)
+    if transaction is None:
         return jsonify({
             'success': False,
             'error': 'Transação não encontrada'
         }), 404
     
-    transaction = transactions_db[transaction_id]
-    
     if transaction['status'] != 'authorized':
         return jsonify({
             'success': False,
             'error': 'Transação não pode ser capturada'
         }), 400
     
-    # Simular captura
-    transaction['status'] = 'captured'
+    # Capturar no adquirente
+    try:
+        get_acquirer().capture({
+            'idempotency_key': f"{transaction['id']}_capture",
+            'transaction_id': transaction['id'],
+            'authorization_code': transaction.get('authorization_code'),
+            'amount': transaction['amount']
+        })
+    except AcquirerError:
+        return jsonify({
+            'success': False,
+            'error': 'Adquirente indisponível'
+        }), 502
+    
     transaction['captured_at'] = datetime.utcnow().isoformat()
-    transaction['updated_at'] = datetime.utcnow().isoformat()
+    set_transaction_status(transaction, 'captured', 'capture')
     
     return jsonify({
         'success': True,
@@ -342,55 +616,482 @@ def capture_payment(transaction_id):
         }
     })
 
+validate_refund_body = compile_schema({
+    'amount': field('number', required=False, message='Valor do estorno inválido'),
+})
+
 @payment_bp.route('/api/v1/payment/<transaction_id>/refund', methods=['POST'])
+@require_merchant
 def refund_payment(transaction_id):
     """Estorna um pagamento"""
-    if transaction_id not in transactions_db:
+    transaction = merchant_transaction(transaction_id)
+    if transaction is None:
         return jsonify({
             'success': False,
             'error': 'Transação não encontrada'
         }), 404
     
-    transaction = transactions_db[transaction_id]
+    data = request.get_json(silent=True) or {}
+    errors = validate_refund_body(data)
+    if errors:
+        return jsonify(validation_error(errors)), 400
     
-    if transaction['status'] not in ['captured', 'approved']:
+    # Sem valor informado (ou null), estorna todo o saldo restante
+    if data.get('amount') is not None:
+        refund_cents = to_cents(data['amount'])
+    else:
+        refund_cents = refundable_cents(transaction)
+    
+    # Reservar o valor (protege contra estornos paralelos)
+    try:
+        reserve_refund(transaction, refund_cents)
+    except RefundError as e:
         return jsonify({
             'success': False,
-            'error': 'Transação não pode ser estornada'
+            'error': str(e)
         }), 400
     
-    data = request.get_json()
-    refund_amount = data.get('amount', transaction['amount'])
+    # Gerar ID do estorno
+    refund_id = f"ref_{uuid.uuid4().hex[:16]}"
+    
+    # Estornar no adquirente (cartões)
+    if transaction['payment_method'] in ['credit_card', 'debit_card']:
+        try:
+            get_acquirer().refund({
+                'idempotency_key': refund_id,
+                'transaction_id': transaction_id,
+                'authorization_code': transaction.get('authorization_code'),
+                'amount': refund_cents / 100
+            })
+        except AcquirerError:
+            cancel_refund(transaction, refund_cents)
+            return jsonify({
+                'success': False,
+                'error': 'Adquirente indisponível'
+            }), 502
+    
+    # Registrar no livro de estornos e atualizar status da transação
+    refund = confirm_refund(transaction, refund_cents, refund_id)
     
-    if refund_amount > transaction['amount']:
+    return jsonify({
+        'success': True,
+        'data': refund
+    })
+
+@payment_bp.route('/api/v1/payment/<transaction_id>/refunds', methods=['GET'])
+@require_merchant
+def get_payment_refunds(transaction_id):
+    """Lista os estornos de uma transação"""
+    transaction = merchant_transaction(transaction_id)
+    if transaction is None:
+        return jsonify({
+            'success': False,
+            'error': 'Transação não encontrada'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'transaction_id': transaction['id'],
+            'amount': transaction['amount'],
+            'refunded_amount': transaction.get('refunded_cents', 0) / 100,
+            'refundable_amount': refundable_cents(transaction) / 100,
+            'refunds': list_refunds(transaction_id)
+        }
+    })
+
+@payment_bp.route('/api/v1/merchant/dashboard', methods=['GET'])
+@require_merchant
+def get_merchant_dashboard():
+    """Relatório financeiro em tempo real do comerciante"""
+    granularity = request.args.get('granularity', 'hour')
+    if granularity not in GRANULARITIES:
         return jsonify({
             'success': False,
-            'error': 'Valor do estorno maior que o valor da transação'
+            'error': 'Granularidade inválida'
         }), 400
     
-    # Gerar ID do estorno
-    refund_id = f"ref_{uuid.uuid4().hex[:16]}"
+    try:
+        buckets = int(request.args.get('buckets', 24))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Quantidade de buckets inválida'
+        }), 400
     
-    # Simular estorno
-    refund = {
-        'id': refund_id,
-        'transaction_id': transaction_id,
-        'amount': refund_amount,
-        'status': 'approved',
-        'created_at': datetime.utcnow().isoformat()
-    }
+    currency = request.args.get('currency', SETTLEMENT_CURRENCY)
+    if currency not in CURRENCIES:
+        return jsonify({
+            'success': False,
+            'error': 'Moeda não suportada'
+        }), 400
     
-    # Atualizar status da transação
-    if refund_amount == transaction['amount']:
-        transaction['status'] = 'refunded'
-    else:
-        transaction['status'] = 'partially_refunded'
+    snapshot = dashboard_aggregates.snapshot(request.merchant.id, granularity, max(buckets, 1))
+    if currency != snapshot['currency']:
+        # Volumes convertidos de uma vez, pela cotação corrente
+        try:
+            convert_volumes(snapshot, currency, fx_rates)
+        except CurrencyError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+    
+    return jsonify({
+        'success': True,
+        'data': snapshot
+    })
+
+@payment_bp.route('/api/v1/fx/rates', methods=['GET'])
+def get_fx_rates():
+    """Tabela de câmbio em uso (base, data e versão)"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'settlement_currency': SETTLEMENT_CURRENCY,
+            **fx_rates.table.describe()
+        }
+    })
+
+@payment_bp.route('/api/v1/reconciliation/import', methods=['POST'])
+@require_auth
+@require_merchant
+def import_reconciliation_file():
+    """Concilia um arquivo de retorno CNAB ou de liquidação PIX do comerciante da chave (admin)"""
+    if 'admin_access' not in request.current_user['permissions']:
+        return jsonify({'success': False, 'error': 'Acesso negado'}), 403
+    
+    file_format = request.args.get('format')
     
-    transaction['updated_at'] = datetime.utcnow().isoformat()
+    # Lê o corpo em streaming, sem carregar o arquivo inteiro em memória
+    lines = io.TextIOWrapper(io.BufferedReader(request.stream), encoding='latin-1', newline='')
+    
+    try:
+        result = reconcile(lines, transactions_db, boleto_payments_db, file_format, pix_payments=pix_payments_db,
+                           merchant_id=request.merchant.id)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     
     return jsonify({
         'success': True,
-        'data': refund
+        'data': result
+    })
+
+# Limite de cartões por requisição de tokenização em lote
+VAULT_BATCH_LIMIT = 10000
+
+def _within_batch_limit(items):
+    return len(items) <= VAULT_BATCH_LIMIT
+
+validate_tokenize_body = compile_schema({
+    'cards': field('array', test=_within_batch_limit,
+                   message=f'Informe uma lista "cards" com até {VAULT_BATCH_LIMIT} cartões',
+                   required_message=f'Informe uma lista "cards" com até {VAULT_BATCH_LIMIT} cartões'),
+})
+
+validate_detokenize_body = compile_schema({
+    'tokens': field('array', test=_within_batch_limit,
+                    message=f'Informe uma lista "tokens" com até {VAULT_BATCH_LIMIT} tokens',
+                    required_message=f'Informe uma lista "tokens" com até {VAULT_BATCH_LIMIT} tokens'),
+})
+
+@payment_bp.route('/api/v1/vault/tokenize', methods=['POST'])
+@require_auth
+def vault_tokenize():
+    """Tokeniza cartões em lote (migração de cartões salvos)"""
+    if 'admin_access' not in request.current_user['permissions']:
+        return jsonify({'success': False, 'error': 'Acesso negado'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    errors = validate_tokenize_body(data)
+    if errors:
+        return jsonify(validation_error(errors)), 400
+    
+    return jsonify({
+        'success': True,
+        'data': card_vault.tokenize_many(data['cards'])
+    })
+
+@payment_bp.route('/api/v1/vault/detokenize', methods=['POST'])
+@require_auth
+def vault_detokenize():
+    """Recupera cartões a partir dos tokens, em lote"""
+    if 'admin_access' not in request.current_user['permissions']:
+        return jsonify({'success': False, 'error': 'Acesso negado'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    errors = validate_detokenize_body(data)
+    if errors:
+        return jsonify(validation_error(errors)), 400
+    
+    return jsonify({
+        'success': True,
+        'data': card_vault.detokenize_many(data['tokens'])
+    })
+
+# Status que o provedor PIX pode informar (valores livres iriam para o histórico de status)
+PIX_WEBHOOK_STATUSES = ('paid', 'expired', 'failed')
+
+validate_pix_webhook_body = compile_schema({
+    'transaction_id': field(max_length=64),
+    'status': field(choices=PIX_WEBHOOK_STATUSES, message='Status inválido'),
+})
+
+validate_brcode_body = compile_schema({
+    'payload': field(max_length=512),
+})
+
+@payment_bp.route('/api/v1/pix/brcode/parse', methods=['POST'])
+def parse_brcode():
+    """Valida (CRC) e decodifica um payload PIX copia e cola"""
+    data = request.get_json(silent=True)
+    errors = validate_brcode_body(data)
+    if errors:
+        return jsonify(validation_error(errors)), 400
+
+    try:
+        parsed = parse_payload(data['payload'])
+    except BRCodeError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    return jsonify({
+        'success': True,
+        'data': parsed
+    })
+
+validate_installments_bulk_body = compile_schema({
+    'amounts': field('array', test=lambda amounts: 0 < len(amounts) <= MAX_BULK_AMOUNTS,
+                     message=f'Informe uma lista "amounts" com até {MAX_BULK_AMOUNTS} valores'),
+})
+
+@payment_bp.route('/api/v1/payment/installments', methods=['GET'])
+def get_installment_grid():
+    """Grade de parcelamento (1x a 12x) para um valor"""
+    try:
+        amount = float(request.args.get('amount', ''))
+        grid = installment_engine.grid(amount)
+    except (ValueError, InstallmentError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e) if isinstance(e, InstallmentError) else 'Valor inválido'
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'amount': amount,
+            'currency': SETTLEMENT_CURRENCY,
+            'options': grid
+        }
+    })
+
+@payment_bp.route('/api/v1/payment/installments', methods=['POST'])
+def get_installment_grids():
+    """Grades em lote para preços de catálogo"""
+    data = request.get_json(silent=True)
+    errors = validate_installments_bulk_body(data)
+    if errors:
+        return jsonify(validation_error(errors)), 400
+    
+    try:
+        grids = installment_engine.grid_many([float(amount) for amount in data['amounts']])
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e) if isinstance(e, InstallmentError) else 'Valor inválido'
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'currency': SETTLEMENT_CURRENCY,
+            'fields': ['installments', 'installment_amount', 'total', 'interest_free'],
+            'grids': grids
+        }
+    })
+
+@payment_bp.route('/api/v1/payment/installments/config', methods=['PUT'])
+@require_auth
+def update_installment_config():
+    """Atualiza taxas e limites do parcelamento (a grade em cache é descartada)"""
+    if 'admin_access' not in request.current_user['permissions']:
+        return jsonify({'success': False, 'error': 'Acesso negado'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    unknown = sorted(set(data) - set(DEFAULT_CONFIG))
+    if unknown or not data:
+        return jsonify({
+            'success': False,
+            'error': f'Campos aceitos: {", ".join(DEFAULT_CONFIG)}'
+        }), 400
+    
+    try:
+        installment_engine.configure(**data)
+    except (TypeError, ValueError, ArithmeticError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e) if isinstance(e, InstallmentError) else 'Configuração inválida'
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'data': installment_engine.describe()
+    })
+
+def parse_cutoff(value):
+    """Horário de corte ISO 8601 em UTC naive (None se ausente ou inválido)"""
+    if not isinstance(value, str):
+        return None
+    try:
+        cutoff = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if cutoff.tzinfo is not None:
+        cutoff = cutoff.astimezone(timezone.utc).replace(tzinfo=None)
+    return cutoff
+
+validate_settlement_body = compile_schema({
+    'cutoff': field(test=parse_cutoff, message='cutoff deve ser uma data ISO 8601 (UTC)', required=False),
+    'batch_id': field(max_length=64, pattern=r'^[A-Za-z0-9_\-]+$', required=False),
+})
+
+@payment_bp.route('/api/v1/settlement/run', methods=['POST'])
+@require_auth
+def run_settlement():
+    """Liquida a janela até o corte e gera os arquivos de repasse (idempotente)"""
+    if 'admin_access' not in request.current_user['permissions']:
+        return jsonify({'success': False, 'error': 'Acesso negado'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    errors = validate_settlement_body(data)
+    if errors:
+        return jsonify(validation_error(errors)), 400
+    
+    try:
+        batch = settlement_engine.run(transactions_db, parse_cutoff(data.get('cutoff')), data.get('batch_id'))
+    except SettlementError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'data': batch
+    })
+
+@payment_bp.route('/api/v1/settlement/<batch_id>', methods=['GET'])
+@require_auth
+def get_settlement(batch_id):
+    """Resumo e manifesto de um lote de repasse"""
+    if 'admin_access' not in request.current_user['permissions']:
+        return jsonify({'success': False, 'error': 'Acesso negado'}), 403
+    
+    batch = settlement_engine.batches.get(batch_id)
+    if batch is None:
+        return jsonify({
+            'success': False,
+            'error': 'Lote não encontrado'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': batch
+    })
+
+validate_merchant_body = compile_schema({
+    'merchant_id': field(max_length=64, pattern=r'^[A-Za-z0-9_\-]+$'),
+    'name': field(max_length=25),
+    'city': field(max_length=15),
+    'pix_key': field(max_length=77),
+    'webhook_secret': field(max_length=128, required=False),
+    'environment': field(choices=ENVIRONMENTS, required=False),
+})
+
+validate_merchant_update_body = compile_schema({
+    'name': field(max_length=25, required=False),
+    'city': field(max_length=15, required=False),
+    'pix_key': field(max_length=77, required=False),
+    'webhook_secret': field(max_length=128, required=False),
+    'active': field('boolean', required=False),
+})
+
+@payment_bp.route('/api/v1/merchants', methods=['POST'])
+@require_auth
+def create_merchant():
+    """Cadastra um comerciante (a chave de API só é exibida nesta resposta)"""
+    if 'admin_access' not in request.current_user['permissions']:
+        return jsonify({'success': False, 'error': 'Acesso negado'}), 403
+    
+    data = request.get_json(silent=True)
+    errors = validate_merchant_body(data)
+    if errors:
+        return jsonify(validation_error(errors)), 400
+    
+    try:
+        _, api_key = merchant_registry.register(data['merchant_id'], data['name'], data['city'], data['pix_key'],
+                                                data.get('webhook_secret'), data.get('environment', 'sandbox'))
+    except MerchantError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
+    
+    return jsonify({
+        'success': True,
+        'data': dict(merchant_registry.describe(data['merchant_id']), api_key=api_key)
+    }), 201
+
+@payment_bp.route('/api/v1/merchants/<merchant_id>', methods=['GET', 'PATCH'])
+@require_auth
+def manage_merchant(merchant_id):
+    """Consulta ou altera o cadastro de um comerciante"""
+    if 'admin_access' not in request.current_user['permissions']:
+        return jsonify({'success': False, 'error': 'Acesso negado'}), 403
+    
+    if merchant_id not in merchant_registry.records:
+        return jsonify({
+            'success': False,
+            'error': 'Comerciante não encontrado'
+        }), 404
+    
+    if request.method == 'PATCH':
+        data = request.get_json(silent=True) or {}
+        errors = validate_merchant_update_body(data)
+        if errors:
+            return jsonify(validation_error(errors)), 400
+        merchant_registry.update(merchant_id, **{key: data[key] for key in UPDATABLE_FIELDS
+                                                 if data.get(key) is not None})
+    
+    return jsonify({
+        'success': True,
+        'data': merchant_registry.describe(merchant_id)
+    })
+
+@payment_bp.route('/api/v1/merchants/<merchant_id>/api-key', methods=['POST'])
+@require_auth
+def rotate_merchant_key(merchant_id):
+    """Gera uma nova chave de API (a anterior deixa de valer)"""
+    if 'admin_access' not in request.current_user['permissions']:
+        return jsonify({'success': False, 'error': 'Acesso negado'}), 403
+    
+    try:
+        api_key = merchant_registry.rotate_key(merchant_id)
+    except MerchantError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': dict(merchant_registry.describe(merchant_id), api_key=api_key)
     })
 
 @payment_bp.route('/api/v1/webhook/pix', methods=['POST'])
@@ -399,20 +1100,25 @@ def pix_webhook():
     try:
         data = request.get_json()
         
-        # Validar assinatura do webhook (em produção)
-        if not validate_webhook_signature(request):
+        # Assinatura com o segredo do comerciante (X-Merchant-Id; sem ele, o de desenvolvimento)
+        merchant = merchant_registry.context(request.headers.get('X-Merchant-Id', SANDBOX_MERCHANT_ID))
+        if not validate_webhook_signature(request, merchant):
             return jsonify({'error': 'Assinatura inválida'}), 401
         
+        errors = validate_pix_webhook_body(data)
+        if errors:
+            return jsonify(validation_error(errors)), 400
+        
         transaction_id = data.get('transaction_id')
         status = data.get('status')
         
-        if transaction_id in transactions_db:
-            transaction = transactions_db[transaction_id]
-            transaction['status'] = status
-            transaction['updated_at'] = datetime.utcnow().isoformat()
-            
-            if status == 'paid':
-                transaction['paid_at'] = datetime.utcnow().isoformat()
+        transaction = transactions_db.get(transaction_id)
+        if transaction is not None and transaction.get('merchant_id', SANDBOX_MERCHANT_ID) == merchant.id:
+            with durable_store.batch(), transaction_lock(transaction_id):
+                if status == 'paid':
+                    transaction['paid_at'] = datetime.utcnow().isoformat()
+                
+                set_transaction_status(transaction, status, 'webhook')
         
         return jsonify({'success': True})
         
@@ -423,7 +1129,7 @@ def pix_webhook():
 
 def validate_card_number(number):
     """Valida número do cartão usando algoritmo de Luhn"""
-    number = re.sub(r'\D', '', number)
+    number = NON_DIGITS.sub('', number)
     
     if len(number) < 13 or len(number) > 19:
         return False
@@ -441,9 +1147,18 @@ def validate_card_number(number):
     
     return total % 10 == 0
 
+# Esquema dos dados do cartão (mensagens no formato já usado pelo checkout)
+validate_card_body = compile_schema({
+    'number': field(test=validate_card_number, message='Número do cartão inválido'),
+    'exp_month': field('number'),
+    'exp_year': field('number'),
+    'cvc': field('number'),
+    'holder_name': field(max_length=100),
+}, required_message='Dados do cartão incompletos: {field}')
+
 def detect_card_brand(number):
     """Detecta a bandeira do cartão"""
-    number = re.sub(r'\D', '', number)
+    number = NON_DIGITS.sub('', number)
     
     if number.startswith('4'):
         return 'visa'
@@ -457,21 +1172,28 @@ def detect_card_brand(number):
         return 'unknown'
 
 def generate_card_token(card_data):
-    """Gera token para dados do cartão"""
-    # Em produção, usar tokenização real com HSM
-    card_hash = hashlib.sha256(
-        f"{card_data['number']}{card_data['exp_month']}{card_data['exp_year']}".encode()
-    ).hexdigest()
-    return f"tok_{card_hash[:16]}"
+    """Gera token para dados do cartão (armazenado cifrado no cofre)"""
+    return card_vault.tokenize(card_data)
+
+def customer_risk_key(customer):
+    """Chave do cliente para a análise de risco"""
+    if isinstance(customer, dict):
+        return customer.get('id') or customer.get('document') or customer.get('email')
+    return str(customer) if customer else None
+
+def card_risk_key(card_data):
+    """Chave do cartão para a análise de risco (token, nunca o número)"""
+    if not card_data or not all(field in card_data for field in ['number', 'exp_month', 'exp_year']):
+        return None
+    try:
+        return card_vault.token_for(card_data)
+    except VaultError:
+        return None
 
 def generate_pix_qr_code(pix_data):
-    """Gera QR Code PIX"""
-    # Formato simplificado do PIX (em produção, usar formato oficial)
-    pix_string = f"PIX|{pix_data['key']}|{pix_data['amount']}|{pix_data['transaction_id']}"
-    
-    # Gerar QR Code
+    """Gera QR Code PIX com o payload BR Code"""
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(pix_string)
+    qr.add_data(pix_data['brcode'])
     qr.make(fit=True)
     
     img = qr.make_image(fill_color="black", back_color="white")
@@ -494,16 +1216,15 @@ def generate_digitable_line(transaction):
     # Simplificado - em produção, calcular dígitos verificadores
     return f"{barcode[:5]}.{barcode[5:10]} {barcode[10:15]}.{barcode[15:21]} {barcode[21:26]}.{barcode[26:32]} {barcode[32]} {barcode[33:]}"
 
-def validate_webhook_signature(request):
-    """Valida assinatura do webhook"""
-    # Em produção, implementar validação real
+def validate_webhook_signature(request, merchant):
+    """Valida assinatura do webhook com o segredo do comerciante"""
     signature = request.headers.get('X-Webhook-Signature')
-    if not signature:
+    if not signature or merchant is None:
         return False
     
     # Validar HMAC
     expected_signature = hmac.new(
-        MERCHANT_CONFIG['webhook_secret'].encode(),
+        merchant.webhook_secret,
         request.get_data(),
         hashlib.sha256
     ).hexdigest()
@@ -511,25 +1232,37 @@ def validate_webhook_signature(request):
     return hmac.compare_digest(signature, expected_signature)
 
 @payment_bp.route('/api/v1/payment/simulate/pix/<transaction_id>', methods=['POST'])
+@require_merchant
 def simulate_pix_payment(transaction_id):
     """Simula recebimento de pagamento PIX (apenas para testes)"""
-    if transaction_id not in transactions_db:
+    if request.merchant.environment != 'sandbox':
+        return jsonify({
+            'success': False,
+            'error': 'Simulação disponível apenas no sandbox'
+        }), 403
+    
+    transaction = merchant_transaction(transaction_id)
+    if transaction is None:
         return jsonify({
             'success': False,
             'error': 'Transação não encontrada'
         }), 404
     
-    transaction = transactions_db[transaction_id]
-    
     if transaction['payment_method'] != 'pix':
         return jsonify({
             'success': False,
             'error': 'Transação não é PIX'
         }), 400
     
-    transaction['status'] = 'paid'
-    transaction['paid_at'] = datetime.utcnow().isoformat()
-    transaction['updated_at'] = datetime.utcnow().isoformat()
+    with durable_store.batch(), transaction_lock(transaction['id']):
+        if transaction['status'] != 'waiting_payment':
+            return jsonify({
+                'success': False,
+                'error': 'Transação não está aguardando pagamento'
+            }), 400
+        
+        transaction['paid_at'] = datetime.utcnow().isoformat()
+        set_transaction_status(transaction, 'paid', 'simulate')
     
     return jsonify({
         'success': True,
@@ -541,25 +1274,37 @@ def simulate_pix_payment(transaction_id):
     })
 
 @payment_bp.route('/api/v1/payment/simulate/boleto/<transaction_id>', methods=['POST'])
+@require_merchant
 def simulate_boleto_payment(transaction_id):
     """Simula recebimento de pagamento por boleto (apenas para testes)"""
-    if transaction_id not in transactions_db:
+    if request.merchant.environment != 'sandbox':
+        return jsonify({
+            'success': False,
+            'error': 'Simulação disponível apenas no sandbox'
+        }), 403
+    
+    transaction = merchant_transaction(transaction_id)
+    if transaction is None:
         return jsonify({
             'success': False,
             'error': 'Transação não encontrada'
         }), 404
     
-    transaction = transactions_db[transaction_id]
-    
     if transaction['payment_method'] != 'boleto':
         return jsonify({
             'success': False,
             'error': 'Transação não é boleto'
         }), 400
     
-    transaction['status'] = 'paid'
-    transaction['paid_at'] = datetime.utcnow().isoformat()
-    transaction['updated_at'] = datetime.utcnow().isoformat()
+    with durable_store.batch(), transaction_lock(transaction['id']):
+        if transaction['status'] != 'waiting_payment':
+            return jsonify({
+                'success': False,
+                'error': 'Transação não está aguardando pagamento'
+            }), 400
+        
+        transaction['paid_at'] = datetime.utcnow().isoformat()
+        set_transaction_status(transaction, 'paid', 'simulate')
     
     return jsonify({
         'success': True,
@@ -0,0 +1,129 @@
+"""Criação de pagamentos com cartão atendida direto no loop asyncio (modo ASGI)
+
+`POST /api/v1/payment/create` com credit_card/debit_card passa a maior
+parte do tempo esperando o adquirente. No modo ASGI (asgi.py) essa rota
+não passa pelo Flask: as etapas síncronas (validação, câmbio, risco,
+tokenização, gravação no WAL) rodam em uma thread do pool, uma de cada
+vez, e a autorização é aguardada no loop com authorize_async() do
+gateway, sem ocupar thread. Mesmas funções, respostas e spans da rota
+Flask (payment.py).
+
+Os demais métodos de pagamento, corpos inválidos e chaves de API
+ausentes/inválidas seguem para o app Flask, que dá as mesmas respostas
+de erro do modo WSGI.
+"""
+import json
+import asyncio
+
+from werkzeug.datastructures import Headers
+
+from src.routes.acquirer import get_acquirer, AcquirerError
+from src.routes.merchants import merchant_registry, API_KEY_HEADER
+from src.routes.payment import open_payment, prepare_card_payment, complete_card_payment, save_transaction
+from src.routes.tracing import tracer, span, NULL_SPAN
+
+CREATE_PATH = '/api/v1/payment/create'
+CARD_METHODS = ('credit_card', 'debit_card')
+
+
+def _replay(body, receive):
+    """`receive` que entrega de novo o corpo já lido (para o app Flask)"""
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if sent:
+            return await receive()
+        sent = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+    return replay
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] != 'http.request':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _authorize(authorization_request):
+    gateway = get_acquirer()
+    with span('acquirer.authorize', **{'card.brand': authorization_request['card_brand']}):
+        if hasattr(gateway, 'authorize_async'):
+            return await gateway.authorize_async(authorization_request['payload'])
+        # Gateway só síncrono (ex.: substituído em testes): espera em uma thread
+        return await asyncio.to_thread(gateway.authorize, authorization_request['payload'])
+
+
+async def _create_card_payment(data, merchant, remote_addr):
+    """(corpo, status HTTP) da criação do pagamento com cartão"""
+    try:
+        transaction, error = await asyncio.to_thread(open_payment, data, merchant, remote_addr)
+        if error:
+            return error
+        with span('payment.process', **{'payment.method': data['payment_method']}):
+            error, authorization_request = await asyncio.to_thread(prepare_card_payment, transaction, data)
+            if error:
+                return error, 200
+            try:
+                authorization = await _authorize(authorization_request)
+            except AcquirerError as e:
+                result = complete_card_payment(transaction, authorization_request, None, e)
+            else:
+                result = complete_card_payment(transaction, authorization_request, authorization)
+        await asyncio.to_thread(save_transaction, transaction)
+        return result, 200
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'Erro interno: {str(e)}'
+        }, 500
+
+
+async def handle_create_payment(scope, receive, send, fallback):
+    """Rota ASGI POST /api/v1/payment/create; `fallback` é o app Flask via ASGI"""
+    body = await _read_body(receive)
+    if body is None:
+        return
+
+    headers = Headers([(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']])
+    merchant = merchant_registry.authenticate(headers.get(API_KEY_HEADER)) if headers.get(API_KEY_HEADER) else None
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        data = None
+    if (scope['method'] != 'POST' or merchant is None or not isinstance(data, dict)
+            or data.get('payment_method') not in CARD_METHODS):
+        await fallback(scope, _replay(body, receive), send)
+        return
+
+    root, request_id = tracer.start_request('create_payment', headers)
+    remote_addr = (scope.get('client') or (None,))[0]
+    if root is NULL_SPAN:
+        result, status = await _create_card_payment(data, merchant, remote_addr)
+    else:
+        root.set_attribute('http.method', 'POST')
+        root.set_attribute('http.route', CREATE_PATH)
+        with root:
+            result, status = await _create_card_payment(data, merchant, remote_addr)
+            root.set_attribute('http.status_code', status)
+            if status >= 500:
+                root.error = f'HTTP {status}'
+
+    payload = json.dumps(result).encode('utf-8')
+    response_headers = [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(payload)).encode()),
+                        (b'x-request-id', request_id.encode('latin-1'))]
+    if root is not NULL_SPAN:
+        response_headers.append((b'traceparent', root.traceparent.encode('latin-1')))
+    # Mesmo CORS do app Flask (flask_cors com origins='*': devolve a origem, ou '*' sem ela)
+    origin = headers.get('Origin')
+    response_headers.append((b'access-control-allow-origin', (origin or '*').encode('latin-1')))
+    if origin:
+        response_headers.append((b'vary', b'Origin'))
+    await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+    await send({'type': 'http.response.body', 'body': payload})
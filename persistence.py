@@ -0,0 +1,333 @@
+"""Durabilidade opcional para as bases em memória
+
+Com VALORA_DATA_DIR definido, toda mutação registrada via put/delete é
+anexada a um write-ahead log binário. Políticas de fsync
+(VALORA_WAL_FSYNC): `always` (fsync por registro), `group` (group commit:
+quem escreve espera o próximo fsync em lote) ou `none` (só o cache do SO).
+Uma thread em segundo plano compacta periodicamente o último snapshot e
+os segmentos fechados do WAL em um novo snapshot (lidos do disco, sem
+tocar nas bases vivas) e descarta os segmentos cobertos; falhas vão para
+o log `valora.persistence`. Na inicialização, o snapshot é carregado e a
+cauda do WAL é reaplicada.
+
+Bases persistidas: transações (a cada criação ou mudança de status, sem
+o QR Code PIX, que fica só em pix_payments), dados de PIX e boleto,
+estornos, lotes de liquidação, usuários, sessões, desafios MFA,
+comerciantes e o cofre de cartões. Tentativas de login e eventos de
+segurança não passam pelo WAL: vão para a trilha de auditoria (audit.py).
+
+Registro do WAL: cabeçalho <tamanho u32, crc32 u32, lsn u64> + payload
+pickle de (operação, base, chave, valor).
+"""
+import gc
+import os
+import glob
+import logging
+import time
+import zlib
+import pickle
+import struct
+import threading
+from contextlib import contextmanager, nullcontext
+
+from src.routes.worker_pool import is_pool_worker, claim_path
+
+HEADER = struct.Struct('<IIQ')
+OP_PUT = 1
+OP_DELETE = 2
+
+FSYNC_POLICIES = ('always', 'group', 'none')
+DEFAULT_GROUP_COMMIT_INTERVAL = 0.0
+DEFAULT_SNAPSHOT_INTERVAL = 300.0
+
+logger = logging.getLogger('valora.persistence')
+
+
+class NullStore:
+    """Persistência desativada: mantém apenas as bases em memória"""
+
+    enabled = False
+
+    def register(self, name, mapping):
+        return mapping
+
+    def put(self, name, key, value):
+        pass
+
+    def delete(self, name, key):
+        pass
+
+    def batch(self):
+        return nullcontext()
+
+    def close(self):
+        pass
+
+
+class DurableStore:
+    """WAL + snapshots para um conjunto de dicionários nomeados"""
+
+    enabled = True
+
+    def __init__(self, directory, fsync='group', group_commit_interval=DEFAULT_GROUP_COMMIT_INTERVAL,
+                 snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f'Política de fsync inválida: {fsync}')
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fsync = fsync
+        self.group_commit_interval = group_commit_interval
+        self.snapshot_interval = snapshot_interval
+        self.stores = {}
+
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._durable = threading.Condition(self._lock)
+        self._local = threading.local()
+        self._closed = False
+
+        self.recovered, self.lsn = self._recover()
+        self.durable_lsn = self.lsn
+        self._open_segment(self.lsn + 1)
+
+        self._threads = []
+        if fsync != 'always':
+            self._start(self._flush_loop, 'wal-flush')
+        if snapshot_interval:
+            self._start(self._snapshot_loop, 'wal-snapshot')
+
+    # Registro das bases
+
+    def register(self, name, mapping):
+        """Associa uma base ao nome e aplica o estado recuperado"""
+        mapping.update(self.recovered.pop(name, {}))
+        self.stores[name] = mapping
+        return mapping
+
+    # Escrita
+
+    def put(self, name, key, value):
+        self._append(pickle.dumps((OP_PUT, name, key, value), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def delete(self, name, key):
+        self._append(pickle.dumps((OP_DELETE, name, key, None), protocol=pickle.HIGHEST_PROTOCOL))
+
+    @contextmanager
+    def batch(self):
+        """Agrupa várias escritas da thread atual e espera a durabilidade uma vez só"""
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            last_lsn = getattr(self._local, 'last_lsn', 0)
+            if depth == 0 and last_lsn:
+                self._local.last_lsn = 0
+                with self._lock:
+                    self._wait_durable(last_lsn)
+
+    def _append(self, payload):
+        with self._lock:
+            self.lsn += 1
+            lsn = self.lsn
+            self._file.write(HEADER.pack(len(payload), zlib.crc32(payload), lsn) + payload)
+
+            if getattr(self._local, 'depth', 0):
+                self._local.last_lsn = lsn
+            else:
+                self._wait_durable(lsn)
+
+    def _wait_durable(self, lsn):
+        if self.durable_lsn >= lsn:
+            return
+        if self.fsync == 'always':
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.durable_lsn = self.lsn
+        elif self.fsync == 'group':
+            # Group commit: aguarda o fsync em lote que cobre este registro
+            self._durable.notify_all()
+            while self.durable_lsn < lsn and not self._closed:
+                self._durable.wait()
+        else:
+            # Sem fsync: a thread de flush só esvazia o buffer para o SO
+            self._durable.notify_all()
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                while self.durable_lsn == self.lsn and not self._closed:
+                    self._durable.wait()
+                if self._closed:
+                    return
+            if self.group_commit_interval:
+                # Janela opcional para agrupar mais escritas concorrentes
+                time.sleep(self.group_commit_interval)
+            with self._lock:
+                self._file.flush()
+                target = self.lsn
+                fd = os.dup(self._file.fileno()) if self.fsync == 'group' else None
+            if fd is not None:
+                # fsync fora do lock: novas escritas se acumulam para o próximo lote
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            with self._lock:
+                self.durable_lsn = max(self.durable_lsn, target)
+                self._durable.notify_all()
+
+    # Segmentos e snapshots
+
+    def _segment_path(self, start_lsn):
+        return os.path.join(self.directory, f'wal-{start_lsn:020d}.log')
+
+    def _open_segment(self, start_lsn):
+        self._file = open(self._segment_path(start_lsn), 'ab', buffering=1024 * 1024)
+        self._segment_start = start_lsn
+
+    def snapshot(self):
+        """Compacta o último snapshot e os segmentos fechados em um novo snapshot
+
+        O estado vem do disco (o que já foi gravado no WAL), não das bases
+        vivas: nada é lido enquanto outras threads alteram os registros.
+        Erros de leitura/escrita sobem para quem chamou.
+        """
+        with self._snapshot_lock:
+            with self._lock:
+                # Novo segmento: tudo a partir daqui é reaplicado sobre o snapshot
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self.durable_lsn = self.lsn
+                self._durable.notify_all()
+                start_lsn = self.lsn + 1
+                self._open_segment(start_lsn)
+
+            state, _ = self._recover(until_lsn=start_lsn)
+            data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+            del state
+
+            path = os.path.join(self.directory, f'snapshot-{start_lsn - 1:020d}.pkl')
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+
+            for old in glob.glob(os.path.join(self.directory, 'snapshot-*.pkl')):
+                if old != path:
+                    os.remove(old)
+            for segment in glob.glob(os.path.join(self.directory, 'wal-*.log')):
+                if self._lsn_from_path(segment) < start_lsn:
+                    os.remove(segment)
+            return path
+
+    def _snapshot_loop(self):
+        while True:
+            with self._lock:
+                self._durable.wait_for(lambda: self._closed, timeout=self.snapshot_interval)
+                if self._closed:
+                    return
+            try:
+                self.snapshot()
+            except Exception:
+                # O WAL continua completo; a próxima rodada tenta de novo
+                logger.exception('Falha ao gravar o snapshot em %s', self.directory)
+
+    # Recuperação
+
+    @staticmethod
+    def _lsn_from_path(path):
+        return int(os.path.basename(path).split('-')[1].split('.')[0])
+
+    def _recover(self, until_lsn=None):
+        # Milhões de dicts recém-criados: o GC cíclico só atrasaria a carga
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._load(until_lsn)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _load(self, until_lsn=None):
+        """Estado do último snapshot + WAL (só os segmentos iniciados antes de `until_lsn`, se dado)"""
+        state = {}
+        snapshot_lsn = 0
+        snapshots = sorted(glob.glob(os.path.join(self.directory, 'snapshot-*.pkl')), key=self._lsn_from_path)
+        if snapshots:
+            with open(snapshots[-1], 'rb') as f:
+                state = pickle.load(f)
+            snapshot_lsn = self._lsn_from_path(snapshots[-1])
+
+        last_lsn = snapshot_lsn
+        segments = sorted(glob.glob(os.path.join(self.directory, 'wal-*.log')), key=self._lsn_from_path)
+        for segment in segments:
+            if until_lsn is not None and self._lsn_from_path(segment) >= until_lsn:
+                # Segmento ativo: ainda recebendo escritas
+                continue
+            last_lsn = max(last_lsn, self._replay_segment(segment, state, snapshot_lsn))
+        return state, last_lsn
+
+    @staticmethod
+    def _replay_segment(path, state, after_lsn):
+        last_lsn = 0
+        with open(path, 'r+b') as f:
+            data = f.read()
+            offset = 0
+            while offset + HEADER.size <= len(data):
+                length, crc, lsn = HEADER.unpack_from(data, offset)
+                payload = data[offset + HEADER.size:offset + HEADER.size + length]
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                offset += HEADER.size + length
+                last_lsn = lsn
+                if lsn <= after_lsn:
+                    continue
+                op, name, key, value = pickle.loads(payload)
+                if op == OP_PUT:
+                    state.setdefault(name, {})[key] = value
+                else:
+                    state.get(name, {}).pop(key, None)
+            if offset < len(data):
+                # Cauda incompleta (queda durante a escrita): descarta
+                f.truncate(offset)
+        return last_lsn
+
+    def _start(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._file.flush()
+            if self.fsync != 'none':
+                os.fsync(self._file.fileno())
+            self.durable_lsn = self.lsn
+            self._durable.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._file.close()
+
+
+def open_store_from_env():
+    """Abre a persistência conforme VALORA_DATA_DIR (ou desativada)"""
+    directory = os.environ.get('VALORA_DATA_DIR')
+    # Processos de pool (bcrypt, liquidação) reimportam os módulos, mas não escrevem no WAL
+    if not directory or is_pool_worker():
+        return NullStore()
+    return DurableStore(
+        # Cada worker do servidor tem suas bases: WAL próprio (VALORA_DATA_DIR, .1, .2...)
+        claim_path(directory),
+        fsync=os.environ.get('VALORA_WAL_FSYNC', 'group'),
+        snapshot_interval=float(os.environ.get('VALORA_SNAPSHOT_INTERVAL', DEFAULT_SNAPSHOT_INTERVAL))
+    )
+
+
+durable_store = open_store_from_env()
@@ -0,0 +1,303 @@
+"""Conciliação bancária de PIX e boletos
+
+Lê arquivos de retorno CNAB 240/400 e CSVs de liquidação PIX linha a
+linha, faz hash join com as transações (id, código de barras e valor) e
+aplica a transição para `paid` em lotes (sob o lock da transação, só se
+ela ainda aguarda pagamento). Registros sem correspondência,
+duplicados ou com valor divergente são reportados como exceções.
+
+Leiaute (posições 1-based, como nos manuais FEBRABAN):
+- CNAB 240, segmento T: identificação do título na empresa 106-130
+  (id da transação); segmento U: valor pago 78-92, data do crédito 146-153
+- CNAB 400, registro 1: uso da empresa 38-62 (id da transação), valor
+  pago 254-266, data do crédito 296-301
+- CSV PIX: colunas txid (id da transação ou txid do BR Code) ou
+  transaction_id, amount, paid_at e, opcionalmente, end_to_end_id e barcode
+
+Uso: python reconciliation.py retorno.ret --format cnab240 --exceptions excecoes.ndjson
+"""
+import csv
+import json
+import math
+import argparse
+from datetime import datetime
+
+from src.routes.refunds import to_cents, transaction_lock
+from src.routes.transaction_status import set_transaction_status
+from src.routes.persistence import durable_store
+from src.routes.merchants import SANDBOX_MERCHANT_ID
+
+RECONCILABLE_METHODS = ('pix', 'boleto')
+APPLY_BATCH_SIZE = 1000
+MAX_REPORTED_EXCEPTIONS = 100
+
+
+def _cnab_date(value):
+    value = value.strip()
+    if not value or not value.strip('0'):
+        return None
+    fmt = '%d%m%Y' if len(value) == 8 else '%d%m%y'
+    try:
+        return datetime.strptime(value, fmt).isoformat()
+    except ValueError:
+        return None
+
+
+def _cnab_amount(value):
+    """Valor em centavos de um campo numérico CNAB (None se malformado)"""
+    value = value.strip()
+    if not value:
+        return 0
+    try:
+        amount = int(value)
+    except ValueError:
+        return None
+    return amount if amount >= 0 else None
+
+
+def _csv_amount(value):
+    """Valor em reais do CSV -> centavos (None se malformado)"""
+    try:
+        amount = float(value or 0)
+    except ValueError:
+        return None
+    return to_cents(amount) if math.isfinite(amount) else None
+
+
+def parse_cnab240(lines):
+    """Registros de pagamento de um retorno CNAB 240 (segmentos T + U)"""
+    pending = None
+    for line_number, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if len(line) < 240 or line[7] != '3':
+            continue
+        segment = line[13]
+        if segment == 'T':
+            pending = (line_number, line[105:130].strip())
+        elif segment == 'U' and pending is not None:
+            t_line, transaction_id = pending
+            pending = None
+            yield {
+                'line': t_line,
+                'transaction_id': transaction_id,
+                'barcode': None,
+                'amount_cents': _cnab_amount(line[77:92]),
+                'paid_at': _cnab_date(line[145:153])
+            }
+
+
+def parse_cnab400(lines):
+    """Registros de pagamento de um retorno CNAB 400 (registro tipo 1)"""
+    for line_number, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if len(line) < 400 or line[0] != '1':
+            continue
+        yield {
+            'line': line_number,
+            'transaction_id': line[37:62].strip(),
+            'barcode': None,
+            'amount_cents': _cnab_amount(line[253:266]),
+            'paid_at': _cnab_date(line[295:301])
+        }
+
+
+def parse_pix_csv(lines):
+    """Registros de um CSV de liquidação PIX"""
+    reader = csv.DictReader(lines)
+    for line_number, row in enumerate(reader, 2):
+        yield {
+            'line': line_number,
+            'transaction_id': (row.get('txid') or row.get('transaction_id') or '').strip() or None,
+            'barcode': (row.get('barcode') or '').strip() or None,
+            'amount_cents': _csv_amount(row.get('amount')),
+            'paid_at': (row.get('paid_at') or '').strip() or None
+        }
+
+
+PARSERS = {
+    'cnab240': parse_cnab240,
+    'cnab400': parse_cnab400,
+    'pix_csv': parse_pix_csv,
+}
+
+
+def detect_format(first_line):
+    """Detecta o formato pelo primeiro registro"""
+    stripped = first_line.rstrip('\r\n')
+    if ',' in stripped or ';' in stripped:
+        return 'pix_csv'
+    if len(stripped) == 400:
+        return 'cnab400'
+    return 'cnab240'
+
+
+class ReconciliationJob:
+    """Conciliação de um arquivo contra o repositório de transações"""
+
+    def __init__(self, transactions, boleto_payments=None, exceptions_output=None,
+                 batch_size=APPLY_BATCH_SIZE, pix_payments=None, merchant_id=None):
+        self.transactions = transactions
+        # Com merchant_id, só casa transações desse comerciante
+        self.merchant_id = merchant_id
+        self.boleto_payments = boleto_payments or {}
+        self.pix_payments = pix_payments or {}
+        self.exceptions_output = exceptions_output
+        self.batch_size = batch_size
+        self.barcode_index = None
+        self.txid_index = None
+        self.seen = set()
+        self.batch = []
+        self.summary = {
+            'records': 0,
+            'matched': 0,
+            'unmatched': 0,
+            'duplicate': 0,
+            'amount_mismatch': 0,
+            'malformed': 0
+        }
+        self.exceptions = []
+
+    def build_barcode_index(self):
+        """Lado de construção do join por código de barras"""
+        index = {}
+        for transaction_id, boleto in self.boleto_payments.items():
+            index.setdefault(boleto['boleto_data']['barcode'], []).append(transaction_id)
+        self.barcode_index = index
+
+    def build_txid_index(self):
+        """txid do BR Code (id sem caracteres não alfanuméricos) -> id da transação"""
+        self.txid_index = {
+            pix['pix_data']['txid']: transaction_id
+            for transaction_id, pix in self.pix_payments.items()
+            if pix['pix_data'].get('txid')
+        }
+
+    def resolve(self, record):
+        """Encontra a transação do registro"""
+        transaction = self.transactions.get(record['transaction_id']) if record['transaction_id'] else None
+        if transaction is None and record['transaction_id'] and self.pix_payments:
+            if self.txid_index is None:
+                self.build_txid_index()
+            transaction = self.transactions.get(self.txid_index.get(record['transaction_id']))
+        if transaction is not None or not record['barcode']:
+            return transaction
+
+        if self.barcode_index is None:
+            self.build_barcode_index()
+        candidates = self.barcode_index.get(record['barcode'], ())
+        # Código de barras pode se repetir: prioriza o título em aberto com o mesmo valor
+        for transaction_id in candidates:
+            candidate = self.transactions.get(transaction_id)
+            if (candidate is not None and candidate['status'] == 'waiting_payment'
+                    and transaction_id not in self.seen
+                    and to_cents(candidate['amount']) == record['amount_cents']):
+                return candidate
+        return self.transactions.get(candidates[0]) if candidates else None
+
+    def process(self, records):
+        for record in records:
+            self.summary['records'] += 1
+            if record['amount_cents'] is None:
+                # Linha malformada vira exceção; os lotes seguem sendo aplicados
+                self.flag('malformed', record)
+                continue
+            transaction = self.resolve(record)
+            if (transaction is not None and self.merchant_id is not None
+                    and transaction.get('merchant_id', SANDBOX_MERCHANT_ID) != self.merchant_id):
+                transaction = None
+
+            if transaction is None or transaction['payment_method'] not in RECONCILABLE_METHODS:
+                self.flag('unmatched', record)
+            elif transaction['id'] in self.seen or transaction['status'] == 'paid':
+                self.flag('duplicate', record, transaction)
+            elif to_cents(transaction['amount']) != record['amount_cents']:
+                self.flag('amount_mismatch', record, transaction)
+            elif transaction['status'] != 'waiting_payment':
+                self.flag('unmatched', record, transaction)
+            else:
+                self.seen.add(transaction['id'])
+                self.summary['matched'] += 1
+                self.batch.append((transaction, record))
+                if len(self.batch) >= self.batch_size:
+                    self.apply()
+
+        self.apply()
+        return self.summary
+
+    def flag(self, kind, record, transaction=None):
+        self.summary[kind] += 1
+        exception = {
+            'type': kind,
+            'line': record['line'],
+            'transaction_id': transaction['id'] if transaction else record['transaction_id'],
+            'amount': record['amount_cents'] / 100 if record['amount_cents'] is not None else None
+        }
+        if transaction is not None:
+            exception['expected_amount'] = transaction['amount']
+            exception['status'] = transaction['status']
+
+        if self.exceptions_output is not None:
+            self.exceptions_output.write(json.dumps(exception) + '\n')
+        if len(self.exceptions) < MAX_REPORTED_EXCEPTIONS:
+            self.exceptions.append(exception)
+
+    def apply(self):
+        """Aplica em lote as transições para `paid`"""
+        now = datetime.utcnow().isoformat()
+        # Um único group commit por lote no WAL
+        with durable_store.batch():
+            for transaction, record in self.batch:
+                # Webhook, expiração ou cancelamento podem ter mudado o status desde o casamento
+                with transaction_lock(transaction['id']):
+                    status = transaction['status']
+                    if status == 'waiting_payment':
+                        transaction['paid_at'] = record['paid_at'] or now
+                        set_transaction_status(transaction, 'paid', 'reconciliation')
+                        continue
+                self.summary['matched'] -= 1
+                self.flag('duplicate' if status == 'paid' else 'unmatched', record, transaction)
+        self.batch = []
+
+
+def reconcile(lines, transactions, boleto_payments=None, file_format=None, exceptions_output=None,
+              pix_payments=None, merchant_id=None):
+    """Concilia um arquivo (iterável de linhas) e retorna o resumo"""
+    lines = iter(lines)
+    first_line = next(lines, '')
+    file_format = file_format or detect_format(first_line)
+    if file_format not in PARSERS:
+        raise ValueError(f'Formato de arquivo não suportado: {file_format}')
+
+    def all_lines():
+        yield first_line
+        yield from lines
+
+    job = ReconciliationJob(transactions, boleto_payments, exceptions_output, pix_payments=pix_payments,
+                            merchant_id=merchant_id)
+    job.process(PARSERS[file_format](all_lines()))
+    return {
+        'format': file_format,
+        'summary': job.summary,
+        'exceptions': job.exceptions
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Valida um arquivo de retorno (sem transações carregadas)')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=sorted(PARSERS))
+    parser.add_argument('--exceptions', help='Arquivo NDJSON com todas as exceções')
+    args = parser.parse_args()
+
+    exceptions_output = open(args.exceptions, 'w') if args.exceptions else None
+    try:
+        with open(args.path, encoding='latin-1', newline='') as f:
+            result = reconcile(f, {}, file_format=args.format, exceptions_output=exceptions_output)
+    finally:
+        if exceptions_output is not None:
+            exceptions_output.close()
+    print(json.dumps({'format': result['format'], 'summary': result['summary']}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Livro de estornos indexado por transação
+
+Cada transação guarda o total estornado em centavos, então validar um novo
+estorno parcial é O(1). Estornos em andamento (aguardando o adquirente)
+ficam reservados para que requisições paralelas não ultrapassem o saldo.
+"""
+import uuid
+import threading
+from datetime import datetime
+
+from src.routes.transaction_status import set_transaction_status
+from src.routes.persistence import durable_store
+
+REFUNDABLE_STATUSES = ('captured', 'approved', 'partially_refunded')
+
+# Simulação de base de dados em memória
+refunds_db = {}
+refunds_by_transaction = {}
+
+durable_store.register('refunds', refunds_db)
+# O índice não vai para o WAL: é reconstruído dos estornos (em ordem de criação)
+for _refund in refunds_db.values():
+    refunds_by_transaction.setdefault(_refund['transaction_id'], []).append(_refund['id'])
+
+# Locks por faixa de transação (evita um lock por transação)
+_LOCK_STRIPES = 256
+_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+
+class RefundError(Exception):
+    """Estorno inválido para a transação"""
+
+
+def to_cents(amount):
+    """Converte valor monetário para centavos inteiros"""
+    return int(round(float(amount) * 100))
+
+
+def transaction_lock(transaction_id):
+    """Lock da faixa à qual a transação pertence"""
+    return _locks[hash(transaction_id) % _LOCK_STRIPES]
+
+
+def refundable_cents(transaction):
+    """Saldo ainda disponível para estorno, em centavos"""
+    return (
+        to_cents(transaction['amount'])
+        - transaction.get('refunded_cents', 0)
+        - transaction.get('refund_pending_cents', 0)
+    )
+
+
+def reserve_refund(transaction, amount_cents):
+    """Valida e reserva o valor de um estorno; levanta RefundError se inválido"""
+    with transaction_lock(transaction['id']):
+        if transaction['status'] not in REFUNDABLE_STATUSES:
+            raise RefundError('Transação não pode ser estornada')
+
+        if amount_cents <= 0:
+            raise RefundError('Valor do estorno deve ser maior que zero')
+
+        if amount_cents > refundable_cents(transaction):
+            raise RefundError('Valor do estorno maior que o saldo disponível da transação')
+
+        transaction['refund_pending_cents'] = transaction.get('refund_pending_cents', 0) + amount_cents
+
+
+def cancel_refund(transaction, amount_cents):
+    """Libera uma reserva de estorno que não foi concluída"""
+    with transaction_lock(transaction['id']):
+        transaction['refund_pending_cents'] -= amount_cents
+
+
+def confirm_refund(transaction, amount_cents, refund_id=None):
+    """Efetiva um estorno reservado e o registra no livro"""
+    refund_id = refund_id or f"ref_{uuid.uuid4().hex[:16]}"
+    now = datetime.utcnow().isoformat()
+
+    refund = {
+        'id': refund_id,
+        'transaction_id': transaction['id'],
+        'amount': amount_cents / 100,
+        'status': 'approved',
+        'created_at': now
+    }
+
+    # Transação e estorno entram no WAL com uma única espera de fsync. Os
+    # ouvintes da transição rodam com o lock seguro (ver transaction_status.py)
+    with durable_store.batch(), transaction_lock(transaction['id']):
+        transaction['refund_pending_cents'] -= amount_cents
+        transaction['refunded_cents'] = transaction.get('refunded_cents', 0) + amount_cents
+        transaction['refunded_amount'] = transaction['refunded_cents'] / 100
+
+        if transaction['refunded_cents'] >= to_cents(transaction['amount']):
+            set_transaction_status(transaction, 'refunded', 'refund')
+        else:
+            set_transaction_status(transaction, 'partially_refunded', 'refund')
+
+        refunds_db[refund_id] = refund
+        refunds_by_transaction.setdefault(transaction['id'], []).append(refund_id)
+        durable_store.put('refunds', refund_id, refund)
+
+    return refund
+
+
+def list_refunds(transaction_id):
+    """Estornos de uma transação, em ordem de criação"""
+    return [refunds_db[refund_id] for refund_id in refunds_by_transaction.get(transaction_id, [])]
@@ -0,0 +1,278 @@
+"""Lista de revogação de tokens JWT (jti), compartilhada entre workers
+
+Cada token revogado vira uma impressão digital de 64 bits (BLAKE2b do
+jti) guardada em uma tabela de endereçamento aberto sobre um bytearray
+(8 bytes por posição, sem objetos Python por entrada). As tabelas são
+separadas por janela de expiração (dia do `exp` do token): a consulta
+usa o `exp` já decodificado do JWT e olha uma única tabela, e janelas
+vencidas são descartadas inteiras, sem varrer entradas.
+
+Com VALORA_REVOCATION_DIR definido, cada revogação também é anexada
+(O_APPEND, registro de 16 bytes `<u64 impressão, u64 exp>`) ao arquivo
+da sua janela; os demais workers leem o que foi anexado no máximo a cada
+VALORA_REVOCATION_SYNC_MS (padrão 50 ms). Arquivos de janelas vencidas
+são removidos.
+
+Revogar um usuário (logout, que encerra todas as sessões) grava o
+instante da revogação, em ms, para a impressão digital do id do usuário
+(`users.bin`, mesmo registro de 16 bytes): todo token dele emitido até
+esse instante deixa de valer, em qualquer worker, sem precisar conhecer
+os jti de cada sessão.
+"""
+import os
+import time
+import struct
+import hashlib
+import threading
+
+from src.routes.worker_pool import is_pool_worker
+
+WINDOW = 86400
+RECORD = struct.Struct('<QQ')
+USERS_FILE = 'users.bin'
+INITIAL_SLOTS = 1 << 10
+MAX_LOAD = 0.75
+DEFAULT_SYNC_INTERVAL = 0.05
+
+
+def fingerprint(jti):
+    """Impressão digital de 64 bits, nunca zero (zero marca posição vazia)"""
+    return int.from_bytes(hashlib.blake2b(jti.encode('utf-8'), digest_size=8).digest(), 'little') | 1
+
+
+class FingerprintTable:
+    """Conjunto de inteiros de 64 bits com sondagem linear
+
+    Inserções acontecem com o lock da RevocationList; consultas não usam
+    lock. Por isso (posições, máscara) é publicado em uma única atribuição
+    de tupla, só depois da tabela nova estar completa, e a view antiga
+    nunca é liberada (um leitor pode ainda estar sondando nela).
+    """
+
+    def __init__(self, expected=0):
+        slots = INITIAL_SLOTS
+        while slots * MAX_LOAD < expected:
+            slots <<= 1
+        self.buffer, self.table = self._allocate(slots)
+        self.count = 0
+
+    @staticmethod
+    def _allocate(slots):
+        buffer = bytearray(slots * 8)
+        return buffer, (memoryview(buffer).cast('Q'), slots - 1)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, value):
+        slots, mask = self.table
+        index = value & mask
+        while True:
+            current = slots[index]
+            if current == value:
+                return True
+            if not current:
+                return False
+            index = (index + 1) & mask
+
+    def add(self, value):
+        """Insere; retorna False se já existia"""
+        slots, mask = self.table
+        index = value & mask
+        while True:
+            current = slots[index]
+            if current == value:
+                return False
+            if not current:
+                break
+            index = (index + 1) & mask
+        slots[index] = value
+        self.count += 1
+        if self.count > (mask + 1) * MAX_LOAD:
+            self._grow()
+        return True
+
+    def _grow(self):
+        old, old_mask = self.table
+        buffer, table = self._allocate((old_mask + 1) * 2)
+        slots, mask = table
+        for value in old:
+            if not value:
+                continue
+            index = value & mask
+            while slots[index]:
+                index = (index + 1) & mask
+            slots[index] = value
+        self.buffer, self.table = buffer, table
+
+    @property
+    def nbytes(self):
+        return len(self.buffer)
+
+
+class RevocationList:
+    """Revogações por jti, agrupadas por janela de expiração"""
+
+    def __init__(self, directory=None, window=WINDOW, sync_interval=DEFAULT_SYNC_INTERVAL):
+        self.directory = directory
+        self.window = window
+        self.sync_interval = sync_interval
+        self.tables = {}
+        # Impressão digital do usuário -> ms da última revogação de todos os tokens dele
+        self.user_epochs = {}
+        self._offsets = {}
+        self._users_offset = 0
+        self._users_fd = None
+        self._fds = {}
+        self._last_sync = 0.0
+        self._current_window = None
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.sync(force=True)
+
+    def __len__(self):
+        return sum(len(table) for table in self.tables.values())
+
+    @property
+    def nbytes(self):
+        return sum(table.nbytes for table in self.tables.values())
+
+    def _path(self, window):
+        return os.path.join(self.directory, f'revoked-{window}.bin')
+
+    def _table(self, window):
+        table = self.tables.get(window)
+        if table is None:
+            table = self.tables[window] = FingerprintTable()
+        return table
+
+    def revoke(self, jti, expires_at):
+        """Revoga o token até `expires_at` (timestamp do exp; depois disso o JWT já é rejeitado)"""
+        if not jti or expires_at <= time.time():
+            return
+        value = fingerprint(jti)
+        window = int(expires_at) // self.window
+        with self._lock:
+            current = int(time.time()) // self.window
+            if current != self._current_window:
+                # Virada de janela: tabelas vencidas saem da memória
+                self._current_window = current
+                self.expire(current)
+            self._table(window).add(value)
+            if self.directory:
+                fd = self._fds.get(window)
+                if fd is None:
+                    fd = self._fds[window] = os.open(self._path(window), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                # Registro pequeno com O_APPEND: escrita atômica mesmo com vários workers
+                os.write(fd, RECORD.pack(value, int(expires_at)))
+
+    def is_revoked(self, jti, expires_at):
+        """Consulta O(1): uma tabela (a da janela do exp), uma sondagem"""
+        if not jti:
+            return False
+        if self.directory and time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+        table = self.tables.get(int(expires_at) // self.window)
+        return table is not None and fingerprint(jti) in table
+
+    def revoke_user(self, user_id, revoked_at_ms=None):
+        """Revoga todos os tokens do usuário emitidos até agora (ou até `revoked_at_ms`)"""
+        revoked_at_ms = int(revoked_at_ms if revoked_at_ms is not None else time.time() * 1000)
+        value = fingerprint(user_id)
+        with self._lock:
+            self._set_user_epoch(value, revoked_at_ms)
+            if self.directory:
+                if self._users_fd is None:
+                    self._users_fd = os.open(os.path.join(self.directory, USERS_FILE),
+                                             os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                os.write(self._users_fd, RECORD.pack(value, revoked_at_ms))
+
+    def is_user_revoked(self, user_id, issued_at_ms):
+        """Indica se o token do usuário emitido em `issued_at_ms` foi revogado em bloco"""
+        if self.directory and time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+        return issued_at_ms <= self.user_epochs.get(fingerprint(user_id), -1)
+
+    def _set_user_epoch(self, value, revoked_at_ms):
+        if revoked_at_ms > self.user_epochs.get(value, -1):
+            self.user_epochs[value] = revoked_at_ms
+
+    def sync(self, force=False):
+        """Lê o que outros workers anexaram e descarta janelas vencidas"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_sync < self.sync_interval:
+                return
+            self._last_sync = now
+            current = int(time.time()) // self.window
+            self.expire(current)
+
+            for name in os.listdir(self.directory):
+                if not (name.startswith('revoked-') and name.endswith('.bin')):
+                    continue
+                try:
+                    window = int(name[8:-4])
+                except ValueError:
+                    continue
+                path = os.path.join(self.directory, name)
+                if window < current:
+                    # Janela vencida: nenhum token dela ainda é aceito
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    continue
+                self._read_new(window, path)
+
+            records, self._users_offset = self._read_records(os.path.join(self.directory, USERS_FILE),
+                                                             self._users_offset)
+            for value, revoked_at_ms in records:
+                self._set_user_epoch(value, revoked_at_ms)
+
+    def _read_new(self, window, path):
+        records, size = self._read_records(path, self._offsets.get(window, 0))
+        if records:
+            table = self._table(window)
+            for value, _ in records:
+                table.add(value)
+        self._offsets[window] = size
+
+    @staticmethod
+    def _read_records(path, offset):
+        """Registros anexados a partir de `offset`; devolve (registros, novo offset)"""
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return (), offset
+        # Só registros completos (outro worker pode estar no meio de uma escrita)
+        size -= (size - offset) % RECORD.size
+        if size <= offset:
+            return (), offset
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(size - offset)
+        return RECORD.iter_unpack(data), size
+
+    def expire(self, current_window=None):
+        """Descarta as tabelas de janelas já vencidas"""
+        if current_window is None:
+            current_window = int(time.time()) // self.window
+        for window in [window for window in self.tables if window < current_window]:
+            del self.tables[window]
+            self._offsets.pop(window, None)
+            fd = self._fds.pop(window, None)
+            if fd is not None:
+                os.close(fd)
+
+
+def open_revocations_from_env():
+    """Lista em VALORA_REVOCATION_DIR (ou apenas em memória)"""
+    directory = os.environ.get('VALORA_REVOCATION_DIR')
+    if is_pool_worker():
+        directory = None
+    sync_interval = int(os.environ.get('VALORA_REVOCATION_SYNC_MS', DEFAULT_SYNC_INTERVAL * 1000)) / 1000
+    return RevocationList(directory, sync_interval=sync_interval)
+
+
+revoked_tokens = open_revocations_from_env()
@@ -0,0 +1,235 @@
+"""Feature store de risco: contadores de velocidade por cliente, cartão e IP
+
+Cada chave mantém contagem e valor em janelas deslizantes de 1 minuto,
+1 hora e 24 horas (buckets circulares com somas correntes) e uma contagem
+aproximada de contrapartes distintas (HyperLogLog pequeno). Atualizar e
+consultar são O(1); o número de chaves por dimensão é limitado (LRU).
+"""
+import math
+import time
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+
+# (janela, segundos por bucket, quantidade de buckets)
+WINDOWS = (
+    ('1m', 10, 6),
+    ('1h', 300, 12),
+    ('24h', 3600, 24),
+)
+
+HLL_REGISTERS = 64
+HLL_ALPHA = 0.709
+# As contrapartes distintas são contadas em gerações de 12h (duas gerações ~ 24h)
+HLL_GENERATION_SECONDS = 43200
+
+DEFAULT_MAX_KEYS = 100000
+
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(64)]
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class KeyFeatures:
+    """Contadores deslizantes e HLL de uma chave"""
+
+    __slots__ = ('last_buckets', 'counts', 'amounts', 'totals', 'hll', 'hll_previous',
+                 'hll_generation', 'distinct_cache')
+
+    def __init__(self):
+        slots = sum(size for _, _, size in WINDOWS)
+        self.last_buckets = array('q', [-1]) * len(WINDOWS)
+        self.counts = array('q', [0]) * slots
+        self.amounts = array('q', [0]) * slots
+        # [contagem, valor] por janela
+        self.totals = array('q', [0]) * (2 * len(WINDOWS))
+        self.hll = bytearray(HLL_REGISTERS)
+        self.hll_previous = bytearray(HLL_REGISTERS)
+        self.hll_generation = 0
+        self.distinct_cache = 0
+
+    def advance(self, now):
+        """Expira os buckets que saíram de cada janela desde o último evento"""
+        offset = 0
+        for window, (_, seconds, size) in enumerate(WINDOWS):
+            current = int(now // seconds)
+            last = self.last_buckets[window]
+            if current != last:
+                if last >= 0:
+                    for bucket in range(max(last + 1, current - size + 1), current + 1):
+                        index = offset + bucket % size
+                        self.totals[2 * window] -= self.counts[index]
+                        self.totals[2 * window + 1] -= self.amounts[index]
+                        self.counts[index] = 0
+                        self.amounts[index] = 0
+                self.last_buckets[window] = current
+            offset += size
+
+        generation = int(now // HLL_GENERATION_SECONDS)
+        if generation != self.hll_generation:
+            if generation == self.hll_generation + 1:
+                self.hll_previous = self.hll
+            else:
+                self.hll_previous = bytearray(HLL_REGISTERS)
+            self.hll = bytearray(HLL_REGISTERS)
+            self.hll_generation = generation
+            self.distinct_cache = None
+
+    def add(self, now, amount_cents):
+        offset = 0
+        for window, (_, seconds, size) in enumerate(WINDOWS):
+            index = offset + int(now // seconds) % size
+            self.counts[index] += 1
+            self.amounts[index] += amount_cents
+            self.totals[2 * window] += 1
+            self.totals[2 * window + 1] += amount_cents
+            offset += size
+
+    def add_distinct(self, counterpart):
+        value = _hash64(counterpart)
+        register = value & (HLL_REGISTERS - 1)
+        rest = value >> 6
+        rank = 1
+        while rest & 1 == 0 and rank < 58:
+            rank += 1
+            rest >>= 1
+        if rank > self.hll[register]:
+            self.hll[register] = rank
+            self.distinct_cache = None
+
+    def distinct(self):
+        """Estimativa de contrapartes distintas nas duas últimas gerações"""
+        if self.distinct_cache is not None:
+            return self.distinct_cache
+        zeros = 0
+        harmonic = 0.0
+        for current, previous in zip(self.hll, self.hll_previous):
+            rank = current if current > previous else previous
+            if rank == 0:
+                zeros += 1
+            harmonic += _INVERSE_POWERS[rank]
+        estimate = HLL_ALPHA * HLL_REGISTERS * HLL_REGISTERS / harmonic
+        if estimate <= 2.5 * HLL_REGISTERS and zeros:
+            # Correção para cardinalidades pequenas (linear counting)
+            estimate = HLL_REGISTERS * math.log(HLL_REGISTERS / zeros)
+        self.distinct_cache = int(round(estimate))
+        return self.distinct_cache
+
+    def snapshot(self):
+        features = {}
+        for window, (name, _, _) in enumerate(WINDOWS):
+            features[f'count_{name}'] = self.totals[2 * window]
+            features[f'amount_{name}'] = self.totals[2 * window + 1] / 100
+        features['distinct_24h'] = self.distinct()
+        return features
+
+
+class RiskFeatureStore:
+    """Features de velocidade por dimensão (cliente, cartão, IP...)"""
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self.dimensions = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, dimension, key, create):
+        keys = self.dimensions.get(dimension)
+        if keys is None:
+            if not create:
+                return None
+            keys = self.dimensions[dimension] = OrderedDict()
+        entry = keys.get(key)
+        if entry is None:
+            if not create:
+                return None
+            entry = keys[key] = KeyFeatures()
+            if len(keys) > self.max_keys:
+                keys.popitem(last=False)
+        else:
+            keys.move_to_end(key)
+        return entry
+
+    def record(self, dimension, key, amount_cents=0, counterpart=None, now=None):
+        """Registra um evento para a chave e retorna suas features atualizadas"""
+        if not key:
+            return None
+        now = now or time.time()
+        with self._lock:
+            entry = self._entry(dimension, key, create=True)
+            entry.advance(now)
+            entry.add(now, amount_cents)
+            if counterpart:
+                entry.add_distinct(counterpart)
+            return entry.snapshot()
+
+    def features(self, dimension, key, now=None):
+        """Features atuais da chave (sem registrar evento)"""
+        now = now or time.time()
+        with self._lock:
+            entry = self._entry(dimension, key, create=False) if key else None
+            if entry is None:
+                return None
+            entry.advance(now)
+            return entry.snapshot()
+
+
+# Limites usados na pontuação (por janela)
+PAYMENT_RULES = (
+    ('customer', 'count_1m', 5, 20, 'customer_velocity'),
+    ('customer', 'amount_24h', 20000.00, 15, 'customer_amount'),
+    ('card', 'count_1h', 10, 20, 'card_velocity'),
+    ('card', 'distinct_24h', 3, 25, 'card_shared_by_customers'),
+    ('ip', 'count_1m', 10, 15, 'ip_velocity'),
+    ('ip', 'distinct_24h', 5, 15, 'ip_many_customers'),
+)
+
+LOGIN_RULES = (
+    ('login_ip', 'count_1m', 10, 1, 'ip_login_velocity'),
+    ('login_ip', 'distinct_24h', 5, 1, 'ip_many_accounts'),
+    ('login_user', 'count_1h', 10, 1, 'user_login_velocity'),
+)
+
+
+def _apply_rules(rules, features_by_dimension):
+    score = 0
+    factors = []
+    for dimension, feature, limit, weight, factor in rules:
+        features = features_by_dimension.get(dimension)
+        if features is not None and features[feature] > limit:
+            score += weight
+            factors.append(factor)
+    return score, factors
+
+
+def score_payment(store, customer_key, card_key, ip_address, amount_cents, now=None):
+    """Registra a tentativa de pagamento e retorna (score 0-100, fatores)"""
+    now = now or time.time()
+    features = {
+        'customer': store.record('customer', customer_key, amount_cents, card_key, now),
+        'card': store.record('card', card_key, amount_cents, customer_key, now),
+        'ip': store.record('ip', ip_address, amount_cents, customer_key, now),
+    }
+    score, factors = _apply_rules(PAYMENT_RULES, features)
+    return min(score, 100), factors
+
+
+def record_login(store, email, ip_address, now=None):
+    """Registra uma tentativa de login (com ou sem sucesso)"""
+    now = now or time.time()
+    store.record('login_user', email, 0, ip_address, now)
+    store.record('login_ip', ip_address, 0, email, now)
+
+
+def login_risk_factors(store, email, ip_address, now=None):
+    """Fatores de risco de velocidade para o login"""
+    features = {
+        'login_user': store.features('login_user', email, now),
+        'login_ip': store.features('login_ip', ip_address, now),
+    }
+    return _apply_rules(LOGIN_RULES, features)[1]
+
+
+risk_store = RiskFeatureStore()
@@ -0,0 +1,259 @@
+"""Liquidação para os comerciantes: lotes de repasse por janela de corte
+
+Um lote reúne tudo o que ficou elegível até o horário de corte:
+
+- vendas aprovadas, capturadas ou pagas ainda não liquidadas (bruto e
+  taxa, na moeda de liquidação);
+- estornos feitos desde o último repasse da transação (debitados no lote).
+
+O processo principal percorre as transações uma vez e monta, por
+partição de comerciantes, colunas compactas (array) em centavos
+inteiros. Cada partição é somada por um processo do pool, que grava o
+seu arquivo de repasse (CSV, uma linha por comerciante). Depois as
+transações são marcadas com o lote em group commits no WAL e o lote é
+registrado com o manifesto dos arquivos.
+
+O lote é idempotente: o id vem do horário de corte, um lote já
+registrado não é refeito, e uma execução interrompida pode ser repetida
+com o mesmo id (as transações já marcadas com ele entram de novo, com os
+mesmos valores).
+
+Variáveis: VALORA_PAYOUT_DIR (padrão payouts), VALORA_SETTLEMENT_WORKERS
+(padrão: núcleos da máquina).
+"""
+import os
+import csv
+import json
+import hashlib
+import threading
+from array import array
+from datetime import datetime
+
+from src.routes.refunds import to_cents
+from src.routes.currency import SETTLEMENT_CURRENCY, settlement_amount
+from src.routes.persistence import durable_store
+from src.routes.transaction_status import durable_record
+from src.routes.merchants import SANDBOX_MERCHANT_ID
+from src.routes.worker_pool import create_process_pool
+
+SETTLEABLE_STATUSES = ('approved', 'captured', 'paid', 'partially_refunded', 'refunded')
+MARK_BATCH_SIZE = 1000
+PAYOUT_FIELDS = ('merchant_id', 'transactions', 'gross_cents', 'fee_cents', 'refund_cents', 'net_cents')
+
+# Taxas por método (as de /api/v1/payment/methods): centésimos de ponto-base e fixo em centavos
+METHOD_CODES = {'credit_card': 0, 'debit_card': 1, 'pix': 2, 'boleto': 3}
+FEE_RATES = array('q', [39900, 29900, 9900, 0])
+FEE_FIXED = array('q', [39, 39, 0, 350])
+
+settlement_batches = {}
+durable_store.register('settlement_batches', settlement_batches)
+
+_pool = None
+
+
+class SettlementError(Exception):
+    """Lote de liquidação inválido"""
+
+
+def batch_id_for(cutoff):
+    return f'stl_{cutoff:%Y%m%d%H%M%S}'
+
+
+def eligible_at(transaction):
+    """Momento em que a venda passa a ser liquidável"""
+    return transaction.get('paid_at') or transaction.get('captured_at') or transaction['created_at']
+
+
+class Partition:
+    """Colunas de uma partição: comerciante (índice local), método, bruto, taxa fixada, estorno"""
+
+    def __init__(self):
+        self.merchants = []
+        self.index = {}
+        self.columns = (array('l'), array('b'), array('q'), array('q'), array('q'))
+
+    def append(self, merchant_id, method, gross, fee, refund):
+        local = self.index.get(merchant_id)
+        if local is None:
+            local = self.index[merchant_id] = len(self.merchants)
+            self.merchants.append(merchant_id)
+        merchants, methods, grosses, fees, refunds = self.columns
+        merchants.append(local)
+        methods.append(method)
+        grosses.append(gross)
+        fees.append(fee)
+        refunds.append(refund)
+
+
+def settle_partition(task):
+    """Soma uma partição e grava seu arquivo de repasse (executado no pool)
+
+    `chunks` é um iterável de colunas (comerciante, método, bruto, taxa,
+    estorno); taxa < 0 usa a tabela do método.
+    """
+    path, merchant_ids, chunks = task
+    size = len(merchant_ids)
+    counts = array('q', bytes(8 * size))
+    gross_totals = array('q', bytes(8 * size))
+    fee_totals = array('q', bytes(8 * size))
+    refund_totals = array('q', bytes(8 * size))
+    rates, fixed = FEE_RATES, FEE_FIXED
+
+    for merchants, methods, grosses, fees, refunds in chunks:
+        for merchant, method, gross, fee, refund in zip(merchants, methods, grosses, fees, refunds):
+            if gross:
+                if fee < 0:
+                    fee = (gross * rates[method] + 500000) // 1000000 + fixed[method]
+                counts[merchant] += 1
+                gross_totals[merchant] += gross
+                fee_totals[merchant] += fee
+            refund_totals[merchant] += refund
+
+    digest = hashlib.sha256()
+    totals = {'merchants': 0, 'transactions': 0, 'gross_cents': 0, 'fee_cents': 0,
+              'refund_cents': 0, 'net_cents': 0}
+    temporary = path + '.tmp'
+    with open(temporary, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(PAYOUT_FIELDS)
+        for local in sorted(range(size), key=merchant_ids.__getitem__):
+            if not counts[local] and not refund_totals[local]:
+                continue
+            net = gross_totals[local] - fee_totals[local] - refund_totals[local]
+            writer.writerow((merchant_ids[local], counts[local], gross_totals[local], fee_totals[local],
+                             refund_totals[local], net))
+            totals['merchants'] += 1
+            totals['transactions'] += counts[local]
+            totals['gross_cents'] += gross_totals[local]
+            totals['fee_cents'] += fee_totals[local]
+            totals['refund_cents'] += refund_totals[local]
+            totals['net_cents'] += net
+    with open(temporary, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    os.replace(temporary, path)
+    totals['file'] = os.path.basename(path)
+    totals['sha256'] = digest.hexdigest()
+    return totals
+
+
+def get_settlement_pool(workers):
+    """Pool de processos compartilhado (processos marcados: não abrem os recursos do servidor)"""
+    global _pool
+    if _pool is None:
+        _pool = create_process_pool(workers)
+    return _pool
+
+
+def run_partitions(tasks, workers):
+    """Executa as partições no pool (em linha com um único processo)"""
+    if workers <= 1 or len(tasks) <= 1:
+        return [settle_partition(task) for task in tasks]
+    return list(get_settlement_pool(workers).map(settle_partition, tasks))
+
+
+class SettlementEngine:
+    """Monta, soma e registra lotes de repasse"""
+
+    def __init__(self, directory, workers=None, batches=None):
+        self.directory = directory
+        self.workers = workers or os.cpu_count() or 1
+        self.batches = settlement_batches if batches is None else batches
+        self._lock = threading.Lock()
+
+    def collect(self, transactions, batch_id, cutoff, partitions):
+        """Partições em colunas e as marcações a aplicar nas transações"""
+        cutoff = cutoff.isoformat()
+        parts = [Partition() for _ in range(partitions)]
+        routing = {}
+        marks = []
+        # Cópia da lista: pagamentos novos podem entrar durante a varredura
+        for transaction in list(transactions.values()):
+            if transaction['status'] not in SETTLEABLE_STATUSES:
+                continue
+            sale = transaction.get('payout_batch') in (None, batch_id) and eligible_at(transaction) <= cutoff
+            if transaction.get('payout_refund_batch') == batch_id:
+                refund_base = transaction['payout_refund_base']
+            else:
+                refund_base = transaction.get('payout_refund_cents', 0)
+            refunded = transaction.get('refunded_cents', 0)
+            if not sale and refunded <= refund_base:
+                continue
+            if transaction.get('payout_batch') is None and not sale:
+                continue    # estorno de venda ainda não liquidada: sai junto com ela
+
+            merchant_id = transaction.get('merchant_id', SANDBOX_MERCHANT_ID)
+            part = routing.get(merchant_id)
+            if part is None:
+                part = routing[merchant_id] = parts[len(routing) % partitions]
+            gross = to_cents(settlement_amount(transaction))
+            amount = to_cents(transaction['amount'])
+            # Estornos na moeda da transação -> moeda de liquidação, pela cotação fixada
+            refund = refunded - refund_base
+            if refund and amount != gross:
+                refund = (refund * gross + amount // 2) // amount if amount else 0
+            plan = transaction.get('installments')
+            fee = to_cents(plan['merchant_fee']) if plan else -1
+            part.append(merchant_id, METHOD_CODES.get(transaction['payment_method'], 0),
+                        gross if sale else 0, fee, refund)
+            marks.append((transaction, sale, refund_base, refunded if refunded > refund_base else None))
+        return parts, marks
+
+    def mark(self, marks, batch_id, settled_at):
+        """Marca as transações com o lote (group commit a cada MARK_BATCH_SIZE)"""
+        for start in range(0, len(marks), MARK_BATCH_SIZE):
+            with durable_store.batch():
+                for transaction, sale, refund_base, refunded in marks[start:start + MARK_BATCH_SIZE]:
+                    if sale:
+                        transaction['payout_batch'] = batch_id
+                        transaction['settled_at'] = settled_at
+                    if refunded is not None:
+                        transaction['payout_refund_batch'] = batch_id
+                        transaction['payout_refund_base'] = refund_base
+                        transaction['payout_refund_cents'] = refunded
+                    durable_store.put('transactions', transaction['id'], durable_record(transaction))
+
+    def run(self, transactions, cutoff=None, batch_id=None):
+        """Liquida a janela até `cutoff`; um lote já registrado é devolvido sem refazer"""
+        now = datetime.utcnow()
+        cutoff = cutoff or now
+        if cutoff > now:
+            raise SettlementError('Horário de corte no futuro')
+        batch_id = batch_id or batch_id_for(cutoff)
+        with self._lock:
+            if batch_id in self.batches:
+                return self.batches[batch_id]
+
+            directory = os.path.join(self.directory, batch_id)
+            os.makedirs(directory, exist_ok=True)
+            parts, marks = self.collect(transactions, batch_id, cutoff, self.workers)
+            tasks = [(os.path.join(directory, f'payouts-{number:03d}.csv'), part.merchants, [part.columns])
+                     for number, part in enumerate(parts) if part.merchants]
+            files = run_partitions(tasks, self.workers)
+
+            settled_at = datetime.utcnow().isoformat()
+            self.mark(marks, batch_id, settled_at)
+            batch = {
+                'id': batch_id,
+                'cutoff': cutoff.isoformat(),
+                'settled_at': settled_at,
+                'currency': SETTLEMENT_CURRENCY,
+                'totals': {key: sum(part[key] for part in files)
+                           for key in ('merchants', 'transactions', 'gross_cents', 'fee_cents',
+                                       'refund_cents', 'net_cents')},
+                'files': [{'file': part['file'], 'sha256': part['sha256'], 'merchants': part['merchants']}
+                          for part in files]
+            }
+            with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+                json.dump(batch, f, indent=2)
+            self.batches[batch_id] = batch
+            durable_store.put('settlement_batches', batch_id, batch)
+            return batch
+
+
+def open_engine_from_env():
+    workers = int(os.environ.get('VALORA_SETTLEMENT_WORKERS', 0)) or None
+    return SettlementEngine(os.environ.get('VALORA_PAYOUT_DIR', 'payouts'), workers)
+
+
+settlement_engine = open_engine_from_env()
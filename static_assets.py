@@ -0,0 +1,263 @@
+"""Arquivos estáticos do frontend (export do Next.js) servidos de memória
+
+StaticAssetManifest lê a pasta uma vez: tipo, ETag (sha256 do conteúdo),
+Cache-Control (imutável para `_next/static/`) e o corpo dos arquivos de
+até MAX_INLINE_SIZE, com variantes br/gzip (as pré-geradas no build,
+`arquivo.br`/`arquivo.gz`, ou comprimidas na carga). Arquivos e
+variantes maiores que o limite ficam no disco e são enviados com
+send_file. asset_response() negocia Accept-Encoding e responde 304 a
+If-None-Match.
+
+O build de produção não muda com o servidor no ar, então a pasta não é
+vigiada. Em desenvolvimento, VALORA_STATIC_RELOAD_S=2 liga uma thread
+que confere a pasta a esse intervalo e recarrega o manifesto quando algo
+muda, fora do caminho das requisições.
+"""
+import os
+import gzip
+import logging
+import hashlib
+import mimetypes
+import threading
+import time
+
+from flask import Response, request, send_file
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele servimos apenas gzip
+    brotli = None
+
+# Arquivos com hash no nome (build do Next.js) nunca mudam de conteúdo
+IMMUTABLE_PREFIXES = ('_next/static/',)
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'no-cache'
+
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+    'application/manifest+json',
+)
+
+# Limites para manter o manifesto em memória
+MAX_INLINE_SIZE = 1024 * 1024
+MIN_COMPRESS_SIZE = 512
+
+# Intervalo da verificação de mudanças na pasta (desligada sem a variável)
+RELOAD_INTERVAL = float(os.environ.get('VALORA_STATIC_RELOAD_S') or 0) or None
+
+logger = logging.getLogger('valora.static')
+
+
+class StaticAsset:
+    """Metadados e variantes pré-comprimidas de um arquivo estático"""
+
+    __slots__ = ('path', 'full_path', 'size', 'mtime', 'etag', 'mimetype',
+                 'cache_control', 'body', 'variants', 'variant_files')
+
+    def __init__(self, path, full_path, size, mtime, etag, mimetype, cache_control, body, variants,
+                 variant_files=None):
+        self.path = path
+        self.full_path = full_path
+        self.size = size
+        self.mtime = mtime
+        self.etag = etag
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.body = body
+        self.variants = variants
+        # Variantes pré-geradas maiores que MAX_INLINE_SIZE: codificação -> caminho
+        self.variant_files = variant_files or {}
+
+    def encodings(self):
+        return self.variants.keys() | self.variant_files.keys()
+
+
+class StaticAssetManifest:
+    """Manifesto em memória da pasta estática (recarregado em segundo plano, se pedido)"""
+
+    def __init__(self, root, reload_interval=RELOAD_INTERVAL):
+        self.root = root
+        self.reload_interval = reload_interval
+        self.assets = {}
+        self.index = None
+        self._signature = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self.reload()
+        if reload_interval:
+            self._thread = threading.Thread(target=self._watch, name='static-reload', daemon=True)
+            self._thread.start()
+
+    def reload(self):
+        """Reconstrói o manifesto a partir do disco"""
+        with self._lock:
+            assets = {}
+            signature = self._compute_signature()
+
+            for rel_path, full_path, stat in self._walk():
+                # Variantes .gz/.br geradas no build são anexadas ao arquivo original
+                if rel_path.endswith(('.gz', '.br')) and rel_path[:-3] in signature:
+                    continue
+                assets[rel_path] = self._build_asset(rel_path, full_path, stat)
+
+            # Publicação por atribuição: requisições em andamento seguem com o manifesto anterior
+            self.assets = assets
+            self.index = assets.get('index.html')
+            self._signature = signature
+
+    def lookup(self, path):
+        """Retorna o asset para o caminho ou None"""
+        return self.assets.get(path)
+
+    def _watch(self):
+        while True:
+            time.sleep(self.reload_interval)
+            try:
+                if self._compute_signature() != self._signature:
+                    self.reload()
+            except Exception:
+                # A thread não pode morrer: segue com o manifesto atual
+                logger.exception('Falha ao recarregar os arquivos estáticos de %s', self.root)
+
+    def _walk(self):
+        if not os.path.isdir(self.root):
+            return
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(full_path)
+                except OSError:
+                    continue
+                rel_path = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                yield rel_path, full_path, stat
+
+    def _compute_signature(self):
+        """Mapa caminho -> (tamanho, mtime) usado para detectar mudanças"""
+        return {
+            rel_path: (stat.st_size, stat.st_mtime_ns)
+            for rel_path, _, stat in self._walk()
+        }
+
+    def _build_asset(self, rel_path, full_path, stat):
+        mimetype = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+        cache_control = IMMUTABLE_CACHE_CONTROL if rel_path.startswith(IMMUTABLE_PREFIXES) else DEFAULT_CACHE_CONTROL
+
+        hasher = hashlib.sha256()
+        body = None
+        with open(full_path, 'rb') as f:
+            if stat.st_size <= MAX_INLINE_SIZE:
+                body = f.read()
+                hasher.update(body)
+            else:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    hasher.update(chunk)
+
+        variants = {}
+        variant_files = {}
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            prebuilt = full_path + suffix
+            try:
+                prebuilt_size = os.stat(prebuilt).st_size
+            except OSError:
+                continue
+            if prebuilt_size >= stat.st_size:
+                continue
+            if prebuilt_size > MAX_INLINE_SIZE:
+                variant_files[encoding] = prebuilt
+                continue
+            with open(prebuilt, 'rb') as f:
+                variants[encoding] = f.read()
+
+        if body is not None and len(body) >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES):
+            if 'gzip' not in variants:
+                variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if 'br' not in variants and brotli is not None:
+                variants['br'] = brotli.compress(body)
+
+        # Descarta variantes que não compensam
+        variants = {enc: data for enc, data in variants.items() if len(data) < stat.st_size}
+
+        return StaticAsset(
+            path=rel_path,
+            full_path=full_path,
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            etag=hasher.hexdigest()[:32],
+            mimetype=mimetype,
+            cache_control=cache_control,
+            body=body,
+            variants=variants,
+            variant_files=variant_files
+        )
+
+
+def accepted_encodings(header):
+    """Extrai as codificações aceitas (q > 0) do cabeçalho Accept-Encoding"""
+    accepted = set()
+    for part in header.split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        params = params.replace(' ', '')
+        if params.startswith('q=') and params[2:] in ('0', '0.0', '0.00', '0.000'):
+            continue
+        accepted.add(token)
+    return accepted
+
+
+def etag_matches(header, etag):
+    """If-None-Match: lista separada por vírgulas, comparação fraca (ignora `W/`), `*` casa com tudo"""
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def asset_response(asset):
+    """Monta a resposta HTTP para um asset do manifesto"""
+    encoding = None
+    available = asset.encodings()
+    if available:
+        encodings = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        for candidate in ('br', 'gzip'):
+            if candidate in available and candidate in encodings:
+                encoding = candidate
+                break
+
+    # Cada codificação é uma representação diferente: ETag própria
+    etag = f'"{asset.etag}-{encoding}"' if encoding else f'"{asset.etag}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': asset.cache_control,
+        'Vary': 'Accept-Encoding'
+    }
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status=304, headers=headers)
+
+    if encoding:
+        headers['Content-Encoding'] = encoding
+        if encoding in asset.variants:
+            return Response(asset.variants[encoding], mimetype=asset.mimetype, headers=headers)
+        response = send_file(asset.variant_files[encoding], mimetype=asset.mimetype, etag=False, conditional=False)
+        response.headers.update(headers)
+        return response
+
+    if asset.body is None:
+        response = send_file(asset.full_path, mimetype=asset.mimetype, etag=False, conditional=False)
+        response.headers.update(headers)
+        return response
+
+    return Response(asset.body, mimetype=asset.mimetype, headers=headers)
@@ -0,0 +1,237 @@
+"""Histórico de status das transações (event sourcing)
+
+Cada transição vira um evento imutável de 20 bytes:
+`<u32 transação, u32 evento anterior da mesma transação (+1; 0 = nenhum),
+u8 status anterior, u8 status, u8 origem, pad, u64 ms>`. Ids de transação,
+status e origens são internados em tabelas (códigos pequenos); as
+definições vão para um arquivo lateral `.names`, uma por linha (`t`, `s`
+ou `o` + tab + valor como string JSON, então tab e quebra de linha no
+valor não corrompem o arquivo), sempre antes do primeiro evento que as
+usa.
+
+O estado atual de cada transação é o último evento dela; o histórico é a
+cadeia de eventos anteriores. Por isso o replay não precisa decodificar
+evento a evento: mapeia o arquivo e só descobre o último evento de cada
+transação.
+
+Com VALORA_HISTORY_PATH definido, os eventos são anexados a esse arquivo
+e reaplicados na inicialização.
+
+Uso: python status_history.py /var/lib/valora/status.events --materialize
+"""
+import os
+import sys
+import mmap
+import json
+import time
+import struct
+import argparse
+import threading
+from datetime import datetime, timezone
+
+from src.routes.worker_pool import is_pool_worker, claim_path
+
+EVENT = struct.Struct('<IIBBBxQ')
+EVENT_WORDS = EVENT.size // 4
+KINDS = ('t', 's', 'o')
+MAX_CODES = 255
+# Status/origens além da capacidade de u8 (ex.: valores livres vindos de webhook)
+OVERFLOW_NAME = '<outro>'
+
+
+def _isoformat(timestamp_ms):
+    return datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+class StatusHistory:
+    """Log de eventos de status encadeados por transação"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.names = {kind: [] for kind in KINDS}
+        self.codes = {kind: {} for kind in KINDS}
+        # Código 0 = sem status anterior / origem desconhecida
+        for kind in ('s', 'o'):
+            self.names[kind].append(None)
+        # Último evento de cada transação (código -> índice global)
+        self.heads = {}
+        # Eventos reaplicados (arquivo mapeado) + eventos novos em memória
+        self._base = b''
+        self._base_count = 0
+        self._tail = bytearray()
+        self._lock = threading.Lock()
+        self._events = None
+        self._names_file = None
+
+        if path:
+            if os.path.exists(path):
+                self.replay()
+            self._events = open(path, 'ab')
+            self._names_file = open(path + '.names', 'a', encoding='utf-8')
+
+    @property
+    def event_count(self):
+        return self._base_count + len(self._tail) // EVENT.size
+
+    def _code(self, kind, value, new_names):
+        code = self.codes[kind].get(value)
+        if code is None:
+            if kind != 't' and len(self.names[kind]) >= MAX_CODES and value != OVERFLOW_NAME:
+                return self._code(kind, OVERFLOW_NAME, new_names)
+            code = len(self.names[kind])
+            self.names[kind].append(value)
+            self.codes[kind][value] = code
+            new_names.append(f'{kind}\t{json.dumps(value)}\n')
+        return code
+
+    def record(self, transaction, previous, status, source=None, timestamp=None):
+        """Anexa a transição ao log (ouvinte de set_transaction_status)"""
+        timestamp_ms = int((timestamp or time.time()) * 1000)
+        with self._lock:
+            new_names = []
+            transaction_code = self._code('t', transaction['id'], new_names)
+            index = self.event_count
+            event = EVENT.pack(
+                transaction_code,
+                self.heads.get(transaction_code, -1) + 1,
+                self._code('s', previous, new_names) if previous is not None else 0,
+                self._code('s', status, new_names),
+                self._code('o', source, new_names) if source is not None else 0,
+                timestamp_ms
+            )
+            self._tail += event
+            self.heads[transaction_code] = index
+
+            if self._events is not None:
+                if new_names:
+                    # Definições antes do evento: o replay nunca encontra código desconhecido
+                    self._names_file.write(''.join(new_names))
+                    self._names_file.flush()
+                self._events.write(event)
+                self._events.flush()
+
+    def _event(self, index):
+        if index < self._base_count:
+            return EVENT.unpack_from(self._base, index * EVENT.size)
+        return EVENT.unpack_from(self._tail, (index - self._base_count) * EVENT.size)
+
+    def history(self, transaction_id):
+        """Transições da transação, da mais antiga à mais recente (None se não houver)"""
+        code = self.codes['t'].get(transaction_id)
+        index = self.heads.get(code)
+        if index is None:
+            return None
+
+        names = self.names
+        events = []
+        while True:
+            _, back, previous, status, source, timestamp_ms = self._event(index)
+            events.append({
+                'from': names['s'][previous],
+                'to': names['s'][status],
+                'source': names['o'][source],
+                'at': _isoformat(timestamp_ms)
+            })
+            if not back:
+                break
+            index = back - 1
+        events.reverse()
+        return events
+
+    def current(self, transaction_id):
+        """Estado atual materializado a partir do último evento"""
+        index = self.heads.get(self.codes['t'].get(transaction_id))
+        if index is None:
+            return None
+        _, _, _, status, _, timestamp_ms = self._event(index)
+        return {'status': self.names['s'][status], 'updated_at': _isoformat(timestamp_ms)}
+
+    def materialize(self):
+        """Estado atual de todas as transações: {id: (status, ms do último evento)}"""
+        names = self.names
+        transaction_names = names['t']
+        status_names = names['s']
+        states = {}
+        for code, index in self.heads.items():
+            _, _, _, status, _, timestamp_ms = self._event(index)
+            states[transaction_names[code]] = (status_names[status], timestamp_ms)
+        return states
+
+    def replay(self):
+        """Reconstrói tabelas e últimos eventos a partir dos arquivos; retorna o total de eventos"""
+        names_path = self.path + '.names'
+        if os.path.exists(names_path):
+            with open(names_path, 'rb') as f:
+                data = f.read()
+            complete = data.rfind(b'\n') + 1
+            if complete < len(data):
+                # Definição incompleta (queda durante a escrita): nenhum evento a usa
+                with open(names_path, 'r+b') as f:
+                    f.truncate(complete)
+            for line in data[:complete].decode('utf-8').split('\n')[:-1]:
+                kind, value = line.split('\t', 1)
+                # Arquivos antigos têm o valor cru
+                if value.startswith('"'):
+                    value = json.loads(value)
+                self.codes[kind][value] = len(self.names[kind])
+                self.names[kind].append(value)
+
+        size = os.path.getsize(self.path)
+        # Evento incompleto no fim do arquivo (queda durante a escrita) é descartado
+        usable = size - size % EVENT.size
+        if usable < size:
+            with open(self.path, 'r+b') as f:
+                f.truncate(usable)
+        if not usable:
+            return 0
+
+        with open(self.path, 'rb') as f:
+            self._base = mmap.mmap(f.fileno(), usable, access=mmap.ACCESS_READ)
+        self._base_count = usable // EVENT.size
+
+        # Primeira palavra de cada evento = código da transação; o dict guarda o último índice
+        if sys.byteorder == 'little':
+            codes = memoryview(self._base).cast('I')[::EVENT_WORDS].tolist()
+        else:
+            codes = [EVENT.unpack_from(self._base, i * EVENT.size)[0] for i in range(self._base_count)]
+        self.heads = dict(zip(codes, range(self._base_count)))
+        return self._base_count
+
+    def close(self):
+        if self._events is not None:
+            self._events.close()
+            self._names_file.close()
+
+
+def open_history_from_env():
+    """Histórico em VALORA_HISTORY_PATH (ou apenas em memória)"""
+    path = os.environ.get('VALORA_HISTORY_PATH')
+    if not path or is_pool_worker():
+        return StatusHistory()
+    # Log de um único escritor: cada worker do servidor fica com o seu
+    return StatusHistory(claim_path(path))
+
+
+status_history = open_history_from_env()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay do histórico de status')
+    parser.add_argument('path')
+    parser.add_argument('--materialize', action='store_true', help='Imprime o estado atual (NDJSON)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    history = StatusHistory()
+    history.path = args.path
+    events = history.replay()
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'events': events, 'transactions': len(history.heads), 'seconds': round(elapsed, 2)}))
+
+    if args.materialize:
+        for transaction_id, (status, timestamp_ms) in history.materialize().items():
+            print(json.dumps({'transaction_id': transaction_id, 'status': status, 'updated_at': _isoformat(timestamp_ms)}))
+
+
+if __name__ == '__main__':
+    main()
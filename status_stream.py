@@ -0,0 +1,236 @@
+"""Stream de status das transações para o checkout (SSE e long-poll)
+
+Substitui o polling de `GET /api/v1/payment/<id>` enquanto um PIX ou
+boleto aguarda pagamento. Toda transição de status (webhook, simulação,
+captura, estorno, conciliação, expiração) é publicada no StatusBroker,
+que acorda os clientes esperando aquela transação.
+
+Os clientes são atendidos direto no loop asyncio do modo ASGI (asgi.py):
+cada espera é um Future registrado no broker, sem thread por conexão. As
+publicações vêm das threads do pool WSGI e chegam ao loop em lote: um
+único call_soon_threadsafe (uma escrita no self-pipe) por rajada, não
+um por cliente.
+
+    GET /api/v1/payment/<id>/stream?version=N&timeout=30
+        long-poll: responde assim que a versão passar de N (ou com
+        `changed: false` no timeout)
+    GET /api/v1/payment/<id>/stream  (Accept: text/event-stream)
+        SSE: um evento `status` por versão, até sair de pending/
+        waiting_payment; Last-Event-ID retoma de uma versão
+
+Como as demais rotas de pagamento, exige a chave de API do comerciante
+dono da transação (X-Api-Key).
+
+Variáveis: VALORA_STREAM_TIMEOUT (máximo de espera do long-poll, padrão
+30 s), VALORA_STREAM_MAX_DURATION (duração máxima de um SSE, padrão
+300 s).
+"""
+import os
+import re
+import json
+import asyncio
+import threading
+from urllib.parse import parse_qs
+
+from src.routes.merchants import merchant_registry, SANDBOX_MERCHANT_ID
+
+STREAM_PATH = re.compile(r'^/api/v1/payment/([A-Za-z0-9_\-]{1,64})/stream$')
+OPEN_STATUSES = frozenset(('pending', 'waiting_payment'))
+LONG_POLL_TIMEOUT = float(os.environ.get('VALORA_STREAM_TIMEOUT', 30))
+SSE_MAX_DURATION = float(os.environ.get('VALORA_STREAM_MAX_DURATION', 300))
+SSE_HEARTBEAT = 15.0
+
+
+def transaction_version(transaction):
+    return transaction.get('version', 1)
+
+
+def status_snapshot(transaction):
+    """Estado enviado ao checkout (mesmos campos da consulta de status + versão)"""
+    return {
+        'transaction_id': transaction['id'],
+        'status': transaction['status'],
+        'version': transaction_version(transaction),
+        'updated_at': transaction['updated_at'],
+        'paid_at': transaction.get('paid_at')
+    }
+
+
+class StatusBroker:
+    """Pub/sub em processo: transação -> clientes esperando uma nova versão"""
+
+    def __init__(self):
+        self.transactions = {}
+        self.waiters = {}
+        self.stats = {'published': 0, 'delivered': 0, 'wakeups': 0}
+        self._lock = threading.Lock()
+        # Resoluções ainda não entregues, por loop
+        self._pending = {}
+
+    def subscribe(self, transaction_id, loop=None):
+        """Future resolvido com o snapshot na próxima transição da transação"""
+        loop = loop or asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self.waiters.setdefault(transaction_id, set()).add((loop, future))
+        return future
+
+    def unsubscribe(self, transaction_id, future):
+        with self._lock:
+            waiting = self.waiters.get(transaction_id)
+            if waiting is None:
+                return
+            waiting.discard((future.get_loop(), future))
+            if not waiting:
+                del self.waiters[transaction_id]
+
+    def publish(self, transaction, previous=None, status=None, source=None):
+        """Ouvinte de set_transaction_status: acorda quem espera a transação"""
+        with self._lock:
+            self.stats['published'] += 1
+            waiting = self.waiters.pop(transaction['id'], None)
+            if not waiting:
+                return
+            self.stats['delivered'] += len(waiting)
+            snapshot = status_snapshot(transaction)
+            wake = []
+            for loop, future in waiting:
+                pending = self._pending.get(loop)
+                if pending is None:
+                    pending = self._pending[loop] = []
+                    wake.append(loop)
+                pending.append((future, snapshot))
+            self.stats['wakeups'] += len(wake)
+        for loop in wake:
+            loop.call_soon_threadsafe(self._drain, loop)
+
+    def _drain(self, loop):
+        with self._lock:
+            pending = self._pending.pop(loop, ())
+        for future, snapshot in pending:
+            if not future.done():
+                future.set_result(snapshot)
+
+    @property
+    def waiting(self):
+        with self._lock:
+            return sum(len(waiting) for waiting in self.waiters.values())
+
+
+status_broker = StatusBroker()
+
+
+async def _send_json(send, status, body, headers=()):
+    payload = json.dumps(body).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(payload)).encode()),
+                    (b'cache-control', b'no-store')] + list(headers)
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def _wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def _wait_version(broker, transaction_id, version, timeout, disconnected):
+    """Snapshot com versão > `version`, ou None no timeout/desconexão"""
+    transaction = broker.transactions.get(transaction_id)
+    if transaction is None:
+        return None
+    if transaction_version(transaction) > version:
+        return status_snapshot(transaction)
+
+    future = broker.subscribe(transaction_id)
+    try:
+        # Transição entre a leitura e a inscrição não pode ser perdida
+        if transaction_version(transaction) > version:
+            return status_snapshot(transaction)
+        done, _ = await asyncio.wait((future, disconnected), timeout=timeout,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        return future.result() if future in done else None
+    finally:
+        broker.unsubscribe(transaction_id, future)
+        future.cancel()
+
+
+def _headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+
+
+def _int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+async def handle_stream(scope, receive, send, broker=status_broker):
+    """Rota ASGI GET /api/v1/payment/<id>/stream"""
+    transaction_id = STREAM_PATH.match(scope['path']).group(1)
+    if scope['method'] != 'GET':
+        await _send_json(send, 405, {'success': False, 'error': 'Método não permitido'})
+        return
+
+    headers = _headers(scope)
+    merchant = merchant_registry.authenticate(headers.get('x-api-key'))
+    if merchant is None:
+        await _send_json(send, 401, {'success': False, 'error': 'Chave de API inválida'})
+        return
+
+    transaction = broker.transactions.get(transaction_id)
+    if transaction is None or transaction.get('merchant_id', SANDBOX_MERCHANT_ID) != merchant.id:
+        await _send_json(send, 404, {'success': False, 'error': 'Transação não encontrada'})
+        return
+
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        if 'text/event-stream' in headers.get('accept', ''):
+            version = _int(headers.get('last-event-id'), _int(query.get('version', [None])[0], 0))
+            await _stream_events(broker, transaction_id, version, send, disconnected)
+        else:
+            version = _int(query.get('version', [None])[0], 0)
+            timeout = min(max(float(_int(query.get('timeout', [None])[0], LONG_POLL_TIMEOUT)), 0), LONG_POLL_TIMEOUT)
+            snapshot = await _wait_version(broker, transaction_id, version, timeout, disconnected)
+            if disconnected.done():
+                return
+            changed = snapshot is not None
+            snapshot = snapshot or status_snapshot(broker.transactions[transaction_id])
+            await _send_json(send, 200, {'success': True, 'changed': changed, 'data': snapshot},
+                             [(b'etag', f'"{snapshot["version"]}"'.encode())])
+    finally:
+        disconnected.cancel()
+
+
+async def _stream_events(broker, transaction_id, version, send, disconnected):
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-store'),
+                    (b'x-accel-buffering', b'no')]
+    })
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SSE_MAX_DURATION
+    while not disconnected.done() and loop.time() < deadline:
+        snapshot = await _wait_version(broker, transaction_id, version, min(SSE_HEARTBEAT, deadline - loop.time()),
+                                       disconnected)
+        if disconnected.done():
+            return
+        if snapshot is None:
+            # Comentário SSE mantém proxies e balanceadores com a conexão aberta
+            await send({'type': 'http.response.body', 'body': b': keep-alive\n\n', 'more_body': True})
+            continue
+        version = snapshot['version']
+        event = f'id: {version}\nevent: status\ndata: {json.dumps(snapshot)}\n\n'
+        await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+        if snapshot['status'] not in OPEN_STATUSES:
+            break
+    await send({'type': 'http.response.body', 'body': b''})
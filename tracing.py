@@ -0,0 +1,265 @@
+"""Tracing das requisições: spans aninhados, amostragem e exportação OTLP/JSON
+
+    @traced_route('create_payment')        # span raiz da requisição
+    def create_payment(): ...
+
+    with span('card.tokenize'):            # etapa dentro da requisição
+        ...
+
+O contexto chega pelos cabeçalhos `traceparent` (W3C Trace Context; a
+decisão de amostragem do chamador é respeitada) e `X-Request-Id` (usado
+como trace id quando tem 32 dígitos hexadecimais). A resposta sempre
+devolve `X-Request-Id` e, se amostrada, o `traceparent` do span raiz;
+chamadas ao adquirente levam o `traceparent` do span corrente.
+
+Requisição não amostrada não cria spans: `span()` só consulta uma
+ContextVar e devolve um objeto nulo compartilhado.
+
+Os spans terminados são gravados em lote, uma linha JSON por lote no
+formato OTLP (`resourceSpans`, o mesmo do file exporter do OpenTelemetry
+Collector), por uma thread de fundo.
+
+Variáveis: VALORA_TRACE_PATH (arquivo; sem ele o tracing fica
+desligado), VALORA_TRACE_SAMPLE_RATE (fração das requisições sem
+traceparent, padrão 0.01), VALORA_TRACE_FLUSH_MS (padrão 1000).
+"""
+import os
+import re
+import json
+import time
+import atexit
+import random
+import threading
+import contextvars
+from functools import wraps
+
+from flask import request, make_response
+
+from src.routes.worker_pool import is_pool_worker, claim_path
+
+SERVICE_NAME = 'valora-payment-api'
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+STATUS_ERROR = 2
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+REQUEST_ID = re.compile(r'^[A-Za-z0-9._\-]{1,128}$')
+HEX_TRACE_ID = re.compile(r'^[0-9a-f]{32}$')
+DEFAULT_SAMPLE_RATE = 0.01
+DEFAULT_FLUSH_INTERVAL = 1.0
+MAX_BATCH = 512
+
+_current = contextvars.ContextVar('valora_span', default=None)
+
+
+class Span:
+    """Span amostrado (tempos em nanossegundos desde a época)"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'start', 'end',
+                 'attributes', 'error', 'tracer', '_token')
+
+    def __init__(self, tracer, name, trace_id, parent_id, kind=KIND_INTERNAL, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.error = None
+        self.start = self.end = 0
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start = time.time_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.time_ns()
+        _current.reset(self._token)
+        if exc is not None:
+            self.error = f'{exc_type.__name__}: {exc}'
+        self.tracer.exporter.export(self)
+        return False
+
+    @property
+    def traceparent(self):
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+
+class NullSpan:
+    """Span de requisição não amostrada: não registra nada"""
+
+    __slots__ = ()
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+
+def otlp_span(span):
+    """Span no formato OTLP/JSON"""
+    data = {
+        'traceId': span.trace_id,
+        'spanId': span.span_id,
+        'name': span.name,
+        'kind': span.kind,
+        'startTimeUnixNano': str(span.start),
+        'endTimeUnixNano': str(span.end),
+        'attributes': [_attribute(key, value) for key, value in span.attributes.items()],
+    }
+    if span.parent_id:
+        data['parentSpanId'] = span.parent_id
+    if span.error:
+        data['status'] = {'code': STATUS_ERROR, 'message': span.error}
+    return data
+
+
+class FileSpanExporter:
+    """Grava os spans em lote no arquivo (uma linha OTLP/JSON por lote)"""
+
+    def __init__(self, path, flush_interval=DEFAULT_FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.stats = {'exported': 0, 'batches': 0}
+        self._spans = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._file = open(path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def export(self, span):
+        with self._lock:
+            self._spans.append(span)
+            full = len(self._spans) >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            spans, self._spans = self._spans, []
+        if not spans:
+            return
+        line = json.dumps({'resourceSpans': [{
+            'resource': {'attributes': [_attribute('service.name', SERVICE_NAME),
+                                        _attribute('process.pid', os.getpid())]},
+            'scopeSpans': [{'scope': {'name': 'valora.tracing'}, 'spans': [otlp_span(span) for span in spans]}]
+        }]}, separators=(',', ':'))
+        with self._write_lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            self.stats['exported'] += len(spans)
+            self.stats['batches'] += 1
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+class Tracer:
+    """Decide a amostragem na entrada da requisição e cria os spans"""
+
+    def __init__(self, exporter=None, sample_rate=DEFAULT_SAMPLE_RATE):
+        self.exporter = exporter
+        self.sample_rate = sample_rate if exporter is not None else 0.0
+
+    def start_request(self, name, headers):
+        """(span raiz ou NULL_SPAN, request id) a partir dos cabeçalhos de entrada"""
+        request_id = headers.get('X-Request-Id')
+        if not request_id or not REQUEST_ID.match(request_id):
+            request_id = f'{random.getrandbits(128):032x}'
+        if self.exporter is None:
+            return NULL_SPAN, request_id
+
+        parent = TRACEPARENT.match(headers.get('traceparent', ''))
+        if parent:
+            trace_id, parent_id, flags = parent.groups()
+            if not int(flags, 16) & 1:
+                return NULL_SPAN, request_id
+        else:
+            if random.random() >= self.sample_rate:
+                return NULL_SPAN, request_id
+            trace_id = request_id if HEX_TRACE_ID.match(request_id) else f'{random.getrandbits(128):032x}'
+            parent_id = None
+        return Span(self, name, trace_id, parent_id, KIND_SERVER, {'request.id': request_id}), request_id
+
+
+def open_tracer_from_env():
+    """Tracer com exportação para VALORA_TRACE_PATH (desligado sem a variável)"""
+    path = os.environ.get('VALORA_TRACE_PATH')
+    if not path or is_pool_worker():
+        return Tracer()
+    exporter = FileSpanExporter(claim_path(path), int(os.environ.get('VALORA_TRACE_FLUSH_MS', DEFAULT_FLUSH_INTERVAL * 1000)) / 1000)
+    return Tracer(exporter, float(os.environ.get('VALORA_TRACE_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)))
+
+
+tracer = open_tracer_from_env()
+
+
+def span(name, **attributes):
+    """Span filho do span corrente (nulo se a requisição não foi amostrada)"""
+    parent = _current.get()
+    if parent is None:
+        return NULL_SPAN
+    return Span(parent.tracer, name, parent.trace_id, parent.span_id, KIND_INTERNAL, attributes)
+
+
+def current_span():
+    return _current.get() or NULL_SPAN
+
+
+def propagation_headers():
+    """Cabeçalho traceparent para chamadas de saída (vazio fora de um trace)"""
+    current = _current.get()
+    return {'traceparent': current.traceparent} if current is not None else {}
+
+
+def traced_route(name):
+    """Span raiz da rota; devolve X-Request-Id (e traceparent, se amostrada)"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            root, request_id = tracer.start_request(name, request.headers)
+            if root is NULL_SPAN:
+                response = make_response(f(*args, **kwargs))
+            else:
+                root.set_attribute('http.method', request.method)
+                root.set_attribute('http.route', request.url_rule.rule if request.url_rule else request.path)
+                with root:
+                    response = make_response(f(*args, **kwargs))
+                    root.set_attribute('http.status_code', response.status_code)
+                    if response.status_code >= 500:
+                        root.error = f'HTTP {response.status_code}'
+                response.headers['traceparent'] = root.traceparent
+            response.headers['X-Request-Id'] = request_id
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,53 @@
+"""Transições de status das transações
+
+Todas as mudanças de status passam por set_transaction_status, que avisa
+os ouvintes registrados (agregados do dashboard, etc.). Cada transição
+incrementa `version` (ETag da consulta de status e cursor do stream).
+
+Os ouvintes rodam na thread de quem muda o status, em geral com o
+transaction_lock(id) da transação seguro (refunds.py, webhook, captura,
+expiração, conciliação). Esse lock não é reentrante e as faixas são
+compartilhadas entre transações: um ouvinte não pode tomar
+transaction_lock de nenhuma transação nem esperar outra thread que o
+tome. Só locks internos e curtos (agregados do dashboard, histórico,
+WAL, broker, roda de expiração) são permitidos.
+"""
+from datetime import datetime
+
+_listeners = []
+
+
+def on_status_change(listener):
+    """Registra um ouvinte listener(transaction, previous, status, source)"""
+    _listeners.append(listener)
+    return listener
+
+
+def _notify(transaction, previous, status, source):
+    for listener in _listeners:
+        listener(transaction, previous, status, source)
+
+
+def durable_record(transaction):
+    """Forma gravada no WAL: sem o QR Code PIX (PNG em base64), gravado uma vez em pix_payments"""
+    payment_data = transaction.get('payment_data')
+    if not payment_data or 'qr_code' not in payment_data:
+        return transaction
+    record = dict(transaction)
+    record['payment_data'] = {key: value for key, value in payment_data.items() if key != 'qr_code'}
+    return record
+
+
+def record_transaction_created(transaction):
+    """Notifica a criação de uma transação com seu status inicial"""
+    transaction.setdefault('version', 1)
+    _notify(transaction, None, transaction['status'], 'create')
+
+
+def set_transaction_status(transaction, status, source):
+    """Atualiza o status da transação e notifica os ouvintes"""
+    previous = transaction['status']
+    transaction['status'] = status
+    transaction['version'] = transaction.get('version', 1) + 1
+    transaction['updated_at'] = datetime.utcnow().isoformat()
+    _notify(transaction, previous, status, source)
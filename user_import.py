@@ -0,0 +1,154 @@
+"""Importação em massa de usuários (onboarding de parceiros)
+
+Lê um CSV ou NDJSON em streaming, valida cada linha com as mesmas regras
+do registro, calcula os hashes bcrypt em um pool de processos e insere os
+usuários em lotes. Cada linha gera um resultado no relatório NDJSON,
+emitido conforme os lotes terminam.
+"""
+import os
+import csv
+import json
+
+import bcrypt
+
+from src.routes.validators import error_details
+from src.routes.worker_pool import create_process_pool
+
+IMPORT_BATCH_SIZE = 256
+BCRYPT_ROUNDS = 12
+BOOLEAN_COLUMNS = ('accept_terms', 'accept_privacy', 'marketing_consent')
+
+_hash_pool = None
+
+
+def hash_password(password, rounds=BCRYPT_ROUNDS):
+    """Hash bcrypt (executado nos processos do pool)"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _hash_many(passwords, rounds):
+    return [hash_password(password, rounds) for password in passwords]
+
+
+def get_hash_pool():
+    """Pool de processos compartilhado para bcrypt (VALORA_IMPORT_WORKERS)"""
+    global _hash_pool
+    if _hash_pool is None:
+        workers = int(os.environ.get('VALORA_IMPORT_WORKERS', 0)) or os.cpu_count()
+        _hash_pool = create_process_pool(workers)
+    return _hash_pool
+
+
+def _csv_row(row):
+    """Linha de CSV no formato do corpo JSON (sem vazios, booleanos convertidos)"""
+    data = {}
+    for key, value in row.items():
+        if key is None or value is None:
+            continue
+        value = value.strip()
+        if not value:
+            continue
+        if key in BOOLEAN_COLUMNS:
+            value = value.lower() in ('true', '1', 'sim', 'yes')
+        data[key.strip()] = value
+    return data
+
+
+def read_rows(lines, file_format):
+    """Gera (linha, dados ou None, erro de leitura) para CSV ou NDJSON"""
+    if file_format == 'csv':
+        for line_number, row in enumerate(csv.DictReader(lines), 2):
+            yield line_number, _csv_row(row), None
+        return
+
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield line_number, None, 'JSON inválido'
+            continue
+        yield line_number, data, None
+
+
+class UserImporter:
+    """Importa linhas validadas para a base de usuários, em lotes"""
+
+    def __init__(self, users, validate, build_user, insert_batch, executor=None,
+                 batch_size=IMPORT_BATCH_SIZE, rounds=BCRYPT_ROUNDS):
+        self.users = users
+        self.validate = validate
+        self.build_user = build_user
+        self.insert_batch = insert_batch
+        self.executor = executor
+        self.batch_size = batch_size
+        self.rounds = rounds
+        self.seen = set()
+        self.summary = {'rows': 0, 'created': 0, 'failed': 0}
+
+    def run(self, rows):
+        """Processa as linhas e gera um resultado por linha, na ordem de entrada"""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield from self._process(batch)
+                batch = []
+        if batch:
+            yield from self._process(batch)
+
+    def _process(self, batch):
+        results = []
+        valid = []
+        for line_number, data, read_error in batch:
+            self.summary['rows'] += 1
+            if read_error:
+                results.append({'line': line_number, 'status': 'failed', 'error': read_error})
+                continue
+
+            errors = self.validate(data)
+            if errors:
+                results.append({
+                    'line': line_number,
+                    'email': data.get('email') if isinstance(data, dict) else None,
+                    'status': 'failed',
+                    'error': errors[0]['message'],
+                    'details': error_details(errors)
+                })
+            elif data['email'] in self.users or data['email'] in self.seen:
+                results.append({'line': line_number, 'email': data['email'], 'status': 'failed',
+                                'error': 'E-mail já cadastrado'})
+            else:
+                self.seen.add(data['email'])
+                result = {'line': line_number, 'email': data['email']}
+                results.append(result)
+                valid.append((result, data))
+
+        if valid:
+            hashes = self._hash([data['password'] for _, data in valid])
+            users = []
+            for (result, data), password_hash in zip(valid, hashes):
+                user = self.build_user(data, password_hash)
+                users.append(user)
+                result['status'] = 'created'
+                result['user_id'] = user['id']
+            self.insert_batch(users)
+
+        for result in results:
+            self.summary['created' if result['status'] == 'created' else 'failed'] += 1
+        return results
+
+    def _hash(self, passwords):
+        if self.executor is None:
+            return _hash_many(passwords, self.rounds)
+
+        # Um pedaço por processo do pool
+        workers = getattr(self.executor, '_max_workers', 1)
+        size = max(1, -(-len(passwords) // workers))
+        chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+        futures = [self.executor.submit(_hash_many, chunk, self.rounds) for chunk in chunks]
+        hashes = []
+        for future in futures:
+            hashes.extend(future.result())
+        return hashes
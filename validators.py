@@ -0,0 +1,203 @@
+"""Validação declarativa dos corpos das requisições
+
+Cada endpoint descreve seu corpo como um dicionário {campo: field(...)},
+compilado uma única vez na importação em uma função que percorre os
+campos e devolve todos os erros de uma vez. Os campos seguem os tipos de
+enhanced.d.ts (em snake_case, como a API recebe).
+"""
+import re
+import math
+
+from src.routes.breach_filter import breached_passwords
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+PHONE_PATTERN = re.compile(r'^\+?[1-9]\d{1,14}$')
+
+VALID_COUNTRIES = frozenset(['BR', 'US', 'CA', 'MX', 'AR', 'CL', 'CO', 'PE', 'UY'])
+
+# Tipos de enhanced.d.ts
+BUSINESS_TYPES = ('individual', 'small_business', 'medium_business', 'large_enterprise', 'non_profit', 'government')
+MFA_METHODS = ('sms', 'email', 'authenticator', 'biometric', 'backup_codes')
+
+PASSWORD_MIN_LENGTH = 12
+COMMON_PASSWORDS = frozenset(['password', '123456789', 'qwerty123', 'admin123'])
+_LOWERCASE = frozenset('abcdefghijklmnopqrstuvwxyz')
+_UPPERCASE = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+_DIGITS = frozenset('0123456789')
+_SPECIAL = frozenset('@$!%*?&')
+
+_TYPES = {
+    'string': (str,),
+    'boolean': (bool,),
+    'object': (dict,),
+    'array': (list,),
+}
+
+
+def validate_email(email):
+    """Valida formato do e-mail"""
+    return isinstance(email, str) and EMAIL_PATTERN.match(email) is not None
+
+
+def validate_phone(phone):
+    """Valida formato do telefone"""
+    return isinstance(phone, str) and PHONE_PATTERN.match(phone) is not None
+
+
+def validate_country(country):
+    """Valida código do país"""
+    return country in VALID_COUNTRIES
+
+
+def password_errors(password):
+    """Critérios de senha não atendidos (uma única passada pelos caracteres)"""
+    chars = set(password)
+    errors = []
+
+    if len(password) < PASSWORD_MIN_LENGTH:
+        errors.append(f'Senha deve ter pelo menos {PASSWORD_MIN_LENGTH} caracteres')
+    if chars.isdisjoint(_LOWERCASE):
+        errors.append('Senha deve conter pelo menos uma letra minúscula')
+    if chars.isdisjoint(_UPPERCASE):
+        errors.append('Senha deve conter pelo menos uma letra maiúscula')
+    if chars.isdisjoint(_DIGITS):
+        errors.append('Senha deve conter pelo menos um número')
+    if chars.isdisjoint(_SPECIAL):
+        errors.append('Senha deve conter pelo menos um caractere especial')
+    if password.lower() in COMMON_PASSWORDS:
+        errors.append('Senha muito comum')
+    elif breached_passwords is not None and breached_passwords.contains_password(password):
+        errors.append('Senha encontrada em vazamentos de dados')
+
+    return errors
+
+
+def validate_password(password):
+    """Valida força da senha"""
+    errors = password_errors(password)
+    return {
+        'valid': len(errors) == 0,
+        'errors': errors,
+        'strength': 'strong' if len(errors) == 0 else 'weak'
+    }
+
+
+def field(kind='string', required=True, choices=None, max_length=None, pattern=None,
+          test=None, explain=None, greater_than=None, message=None, required_message=None):
+    """Descreve um campo do corpo
+
+    kind: 'string', 'number' (aceita texto numérico), 'boolean', 'object'
+    ou 'array'; test(valor) -> bool; explain(valor) -> lista de erros
+    detalhados (vazia se válido). message substitui a mensagem padrão de
+    campo inválido.
+    """
+    return {
+        'kind': kind,
+        'required': required,
+        'choices': frozenset(choices) if choices is not None else None,
+        'max_length': max_length,
+        'pattern': re.compile(pattern) if isinstance(pattern, str) else pattern,
+        'test': test,
+        'explain': explain,
+        'greater_than': greater_than,
+        'message': message,
+        'required_message': required_message,
+    }
+
+
+def _as_number(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    # NaN e infinitos (1e400, 'inf') não são valores válidos
+    return number if math.isfinite(number) else None
+
+
+def _compile_field(name, spec):
+    """Função (valor) -> erro ou None para um campo, só com as checagens declaradas"""
+    invalid = {'field': name, 'message': spec['message'] or f'Campo inválido: {name}'}
+    predicates = []
+
+    if spec['kind'] == 'number':
+        greater_than = spec['greater_than']
+        if greater_than is None:
+            predicates.append(lambda value: _as_number(value) is not None)
+        else:
+            def above(value):
+                number = _as_number(value)
+                return number is not None and number > greater_than
+            predicates.append(above)
+    else:
+        types = _TYPES[spec['kind']]
+        predicates.append(lambda value: isinstance(value, types))
+
+    if spec['choices'] is not None:
+        predicates.append(spec['choices'].__contains__)
+    if spec['max_length'] is not None:
+        max_length = spec['max_length']
+        predicates.append(lambda value: len(value) <= max_length)
+    if spec['pattern'] is not None:
+        predicates.append(spec['pattern'].match)
+    if spec['test'] is not None:
+        predicates.append(spec['test'])
+    predicates = tuple(predicates)
+    explain = spec['explain']
+
+    def check(value):
+        for predicate in predicates:
+            if not predicate(value):
+                return invalid
+        if explain is not None:
+            details = explain(value)
+            if details:
+                return dict(invalid, details=details)
+        return None
+
+    return check
+
+
+def compile_schema(schema, required_message='Campo obrigatório: {field}'):
+    """Compila um esquema {campo: field(...)} em uma função (dados) -> lista de erros"""
+    compiled = tuple(
+        (name, spec['required'], (spec['required_message'] or required_message).format(field=name),
+         _compile_field(name, spec))
+        for name, spec in schema.items()
+    )
+
+    def validate(data):
+        if not isinstance(data, dict):
+            return [{'field': None, 'message': 'Corpo da requisição inválido'}]
+
+        errors = []
+        for name, required, missing, check in compiled:
+            value = data.get(name)
+            if value is None:
+                if required:
+                    errors.append({'field': name, 'message': missing})
+                continue
+            error = check(value)
+            if error is not None:
+                errors.append(error)
+        return errors
+
+    return validate
+
+
+def error_details(errors):
+    """Lista plana de mensagens (erros detalhados de um campo entram no lugar dele)"""
+    details = []
+    for error in errors:
+        details.extend(error.get('details') or (error['message'],))
+    return details
+
+
+def validation_error(errors):
+    """Resposta padrão: primeiro erro em `error` e todos em `details`"""
+    return {
+        'success': False,
+        'error': errors[0]['message'],
+        'details': error_details(errors)
+    }
@@ -0,0 +1,140 @@
+"""Cofre de tokens de cartão
+
+Tokens determinísticos com HMAC-SHA256 (chave do cofre), PAN cifrado com
+AES-GCM para detokenização em capturas e cobranças recorrentes, LRU em
+memória para tokens quentes e operações em lote para migrações de
+cartões salvos. O CVC nunca é armazenado.
+"""
+import os
+import hmac
+import json
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from src.routes.persistence import durable_store
+
+# Configurações (em produção, usar variáveis de ambiente / HSM)
+VAULT_HMAC_KEY = os.environ.get('CARD_VAULT_HMAC_KEY', 'valora_vault_hmac_key_2025').encode('utf-8')
+VAULT_ENCRYPTION_KEY = (
+    base64.b64decode(os.environ['CARD_VAULT_ENCRYPTION_KEY'])
+    if 'CARD_VAULT_ENCRYPTION_KEY' in os.environ
+    else hashlib.sha256(b'valora_vault_encryption_key_2025').digest()
+)
+
+TOKEN_PREFIX = 'tok_'
+HOT_TOKENS_CACHE_SIZE = 10000
+NONCE_SIZE = 12
+
+
+class VaultError(Exception):
+    """Falha de tokenização ou detokenização"""
+
+
+def normalize_card(card_data):
+    """Campos do cartão que entram no cofre"""
+    try:
+        number = ''.join(ch for ch in str(card_data['number']) if ch.isdigit())
+        exp_month = int(card_data['exp_month'])
+        exp_year = int(card_data['exp_year'])
+    except (KeyError, TypeError, ValueError):
+        raise VaultError('Dados do cartão incompletos')
+    return number, exp_month, exp_year
+
+
+class CardVault:
+    """Cofre de cartões em memória"""
+
+    def __init__(self, hmac_key=VAULT_HMAC_KEY, encryption_key=VAULT_ENCRYPTION_KEY,
+                 cache_size=HOT_TOKENS_CACHE_SIZE, durable_name=None):
+        self._hmac = hmac.new(hmac_key, digestmod=hashlib.sha256)
+        self._aead = AESGCM(encryption_key)
+        self.cache_size = cache_size
+        self.records = {}
+        # Com nome, os registros cifrados são recuperados e gravados no WAL
+        self.durable_name = durable_name
+        if durable_name:
+            durable_store.register(durable_name, self.records)
+        self._hot = OrderedDict()
+        self._lock = threading.Lock()
+
+    def token_for(self, card_data):
+        """Token determinístico do cartão (não armazena nada)"""
+        number, exp_month, exp_year = normalize_card(card_data)
+        mac = self._hmac.copy()
+        mac.update(f'{number}|{exp_month:02d}|{exp_year}'.encode('ascii'))
+        return TOKEN_PREFIX + mac.hexdigest()[:24]
+
+    def tokenize(self, card_data):
+        """Gera o token e guarda o cartão cifrado (se ainda não estiver no cofre)"""
+        token = self.token_for(card_data)
+        if token in self.records:
+            return token
+
+        number, exp_month, exp_year = normalize_card(card_data)
+        plaintext = json.dumps({
+            'number': number,
+            'exp_month': exp_month,
+            'exp_year': exp_year,
+            'holder_name': card_data.get('holder_name')
+        }).encode('utf-8')
+        nonce = os.urandom(NONCE_SIZE)
+        # O token vai como dado associado: o registro só decifra sob o próprio token
+        self.records[token] = nonce + self._aead.encrypt(nonce, plaintext, token.encode('ascii'))
+        if self.durable_name:
+            durable_store.put(self.durable_name, token, self.records[token])
+        return token
+
+    def detokenize(self, token):
+        """Recupera os dados do cartão a partir do token"""
+        if not isinstance(token, str):
+            raise VaultError('Token não encontrado')
+
+        with self._lock:
+            card = self._hot.get(token)
+            if card is not None:
+                self._hot.move_to_end(token)
+                return dict(card)
+
+        record = self.records.get(token)
+        if record is None:
+            raise VaultError('Token não encontrado')
+
+        try:
+            plaintext = self._aead.decrypt(record[:NONCE_SIZE], record[NONCE_SIZE:], token.encode('ascii'))
+        except InvalidTag:
+            raise VaultError('Registro do cofre corrompido')
+        card = json.loads(plaintext)
+
+        with self._lock:
+            self._hot[token] = card
+            if len(self._hot) > self.cache_size:
+                self._hot.popitem(last=False)
+        return dict(card)
+
+    def tokenize_many(self, cards):
+        """Tokeniza em lote; retorna um resultado por cartão, na mesma ordem"""
+        results = []
+        for card_data in cards:
+            try:
+                results.append({'token': self.tokenize(card_data)})
+            except VaultError as e:
+                results.append({'error': str(e)})
+        return results
+
+    def detokenize_many(self, tokens):
+        """Detokeniza em lote; retorna um resultado por token, na mesma ordem"""
+        results = []
+        for token in tokens:
+            try:
+                results.append({'token': token, 'card': self.detokenize(token)})
+            except VaultError as e:
+                results.append({'token': token, 'error': str(e)})
+        return results
+
+
+card_vault = CardVault(durable_name='card_vault')
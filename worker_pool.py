@@ -0,0 +1,83 @@
+"""Processos auxiliares e recursos exclusivos de cada processo servidor
+
+Os pools de processos do sistema (hash bcrypt da importação de usuários,
+somas da liquidação) reimportam os módulos, mas não podem abrir os
+recursos do servidor (WAL, trilha de auditoria, histórico, threads de
+fundo). create_process_pool() marca os processos que cria com
+VALORA_POOL_WORKER=1 no ambiente, e os módulos consultam
+is_pool_worker() ao criar seus singletons. Workers do servidor
+(`uvicorn --workers N`, gunicorn) não são marcados e abrem tudo.
+
+Arquivos com um único escritor (segmentos do WAL, log do histórico de
+status, spans) são reservados com claim_path(): o primeiro processo fica
+com o caminho configurado, os seguintes com `<caminho>.1`, `<caminho>.2`...
+Cada worker do servidor tem suas próprias bases em memória, então cada
+um persiste e recupera a sua partição.
+"""
+import os
+import threading
+from multiprocessing.context import SpawnContext, SpawnProcess
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # sem flock (Windows): um único processo servidor
+    fcntl = None
+
+POOL_WORKER_ENV = 'VALORA_POOL_WORKER'
+MAX_SLOTS = 256
+
+_environ_lock = threading.Lock()
+# Descritores dos locks reservados (mantidos abertos até o fim do processo)
+_claims = {}
+
+
+def is_pool_worker():
+    """Indica se o processo atual é um processo de pool criado por create_process_pool"""
+    return os.environ.get(POOL_WORKER_ENV) == '1'
+
+
+class PoolProcess(SpawnProcess):
+    """Processo spawn que nasce com VALORA_POOL_WORKER=1 no ambiente"""
+
+    def start(self):
+        # O processo filho herda o ambiente no momento da criação
+        with _environ_lock:
+            previous = os.environ.get(POOL_WORKER_ENV)
+            os.environ[POOL_WORKER_ENV] = '1'
+            try:
+                super().start()
+            finally:
+                if previous is None:
+                    del os.environ[POOL_WORKER_ENV]
+                else:
+                    os.environ[POOL_WORKER_ENV] = previous
+
+
+class PoolContext(SpawnContext):
+    Process = PoolProcess
+
+
+def create_process_pool(workers):
+    """ProcessPoolExecutor com processos marcados (spawn: não herdam threads nem estado)"""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=PoolContext())
+
+
+def claim_path(path):
+    """Reserva `path` (ou `<path>.N`) para este processo com flock; devolve o caminho reservado"""
+    if path in _claims:
+        return _claims[path][0]
+    if fcntl is None:
+        _claims[path] = (path, None)
+        return path
+    for slot in range(MAX_SLOTS):
+        candidate = path if slot == 0 else f'{path}.{slot}'
+        fd = os.open(candidate + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            continue
+        _claims[path] = (candidate, fd)
+        return candidate
+    raise RuntimeError(f'Nenhum caminho livre para {path} ({MAX_SLOTS} processos)')